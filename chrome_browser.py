@@ -4,115 +4,514 @@
 import sys
 import os
 import json
+import base64
+import bisect
+import contextlib
+import difflib
+import fnmatch
 import hashlib
+import heapq
+import math
+import pickle
+import re
+import sqlite3
+import tempfile
+import threading
+import time
+import unicodedata
 import urllib.parse
+import uuid
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+
+class StartupProfiler:
+    """Registra intervalos del arranque (fases e imports) como trace-event JSON de Chrome.
+
+    El archivo se abre con chrome://tracing o https://ui.perfetto.dev.
+    Solo existe una instancia, en StartupProfiler.active, cuando se usa
+    --profile-startup; el resto del tiempo startup_span() no hace nada.
+    """
+    active = None
+
+    def __init__(self):
+        self.events = []
+        self._t0 = time.perf_counter()
+        self._pid = os.getpid()
+
+    def now(self):
+        """Microsegundos desde el inicio del perfilado"""
+        return (time.perf_counter() - self._t0) * 1e6
+
+    def add(self, name, category, start, duration):
+        self.events.append({
+            'name': name, 'cat': category, 'ph': 'X', 'ts': start, 'dur': duration,
+            'pid': self._pid, 'tid': threading.get_ident(),
+        })
+
+    def instant(self, name, category='mark'):
+        self.events.append({
+            'name': name, 'cat': category, 'ph': 'i', 's': 'p', 'ts': self.now(),
+            'pid': self._pid, 'tid': threading.get_ident(),
+        })
+
+    @contextlib.contextmanager
+    def span(self, name, category='init'):
+        start = self.now()
+        try:
+            yield
+        finally:
+            self.add(name, category, start, self.now() - start)
+
+    def install_import_hook(self):
+        """Mide cada import que carga un módulo nuevo (los anidados quedan como hijos)"""
+        import builtins
+        original_import = builtins.__import__
+        def profiled_import(name, globals=None, locals=None, fromlist=(), level=0):
+            if level or name in sys.modules:
+                return original_import(name, globals, locals, fromlist, level)
+            start = self.now()
+            try:
+                return original_import(name, globals, locals, fromlist, level)
+            finally:
+                self.add(name, 'import', start, self.now() - start)
+        builtins.__import__ = profiled_import
+
+    def write(self, path):
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump({'traceEvents': self.events, 'displayTimeUnit': 'ms'}, f)
+        print(f"Traza de arranque guardada en: {path}")
+
+def startup_span(name, category='init'):
+    """Intervalo del perfil de arranque, o un contexto vacío si no se está perfilando"""
+    if StartupProfiler.active is None:
+        return contextlib.nullcontext()
+    return StartupProfiler.active.span(name, category)
+
+# Con --profile-startup hay que empezar a medir antes de importar Qt
+if any(arg.split('=', 1)[0] == '--profile-startup' for arg in sys.argv[1:]):
+    StartupProfiler.active = StartupProfiler()
+    StartupProfiler.active.install_import_hook()
+
+def parse_arguments(argv=None):
+    """Argumentos de línea de comandos del navegador"""
+    import argparse
+    parser = argparse.ArgumentParser(description='FoxPy Browser')
+    parser.add_argument('urls', nargs='*', help='URLs que abrir en pestañas nuevas')
+    parser.add_argument('--app', type=str, help='URL de la aplicación web a cargar en modo PWA')
+    parser.add_argument('--new-instance', action='store_true',
+                        help='No reutilizar un proceso del navegador ya en marcha')
+    parser.add_argument('--benchmark-tabs', type=int, metavar='N',
+                        help='Mide la latencia de crear N pestañas, imprime JSON y sale')
+    parser.add_argument('--profile-startup', nargs='?', const='fennex-startup-trace.json', metavar='ARCHIVO',
+                        help='Guarda una traza de arranque (trace-event JSON de Chrome) en ARCHIVO')
+    parser.add_argument('--benchmark-startup', type=int, metavar='N',
+                        help='Mide el arranque en frío y en caliente (N ejecuciones), imprime JSON y sale')
+    parser.add_argument('--startup-probe', action='store_true', help=argparse.SUPPRESS)
+    return parser.parse_args(argv)
+
+def uses_single_instance(args):
+    """Las mediciones y --new-instance siempre arrancan un proceso propio"""
+    return not (args.benchmark_tabs or args.benchmark_startup or args.new_instance
+                or args.profile_startup or args.startup_probe)
+
+def single_instance_name():
+    import getpass
+    return f'fennex-browser-{getpass.getuser()}'
+
+def forward_to_running_instance(message, timeout_ms=500):
+    """Envía message al proceso en marcha; devuelve False si no hay ninguno.
+
+    Solo usa QtNetwork (sin QApplication ni QtWebEngine), así que una
+    segunda invocación puede reenviar sus argumentos y salir enseguida.
+    """
+    from PyQt5.QtNetwork import QLocalSocket
+    socket = QLocalSocket()
+    socket.connectToServer(single_instance_name())
+    if not socket.waitForConnected(timeout_ms):
+        return False
+    socket.write(json.dumps(message).encode('utf-8') + b'\n')
+    sent = socket.waitForBytesWritten(timeout_ms)
+    socket.disconnectFromServer()
+    return sent
+
+# Si ya hay un navegador en marcha, reenviarle los argumentos antes de cargar QtWebEngine
+if __name__ == '__main__':
+    ARGUMENTS = parse_arguments()
+    if uses_single_instance(ARGUMENTS) and forward_to_running_instance(
+            {'app': ARGUMENTS.app, 'urls': ARGUMENTS.urls}):
+        sys.exit(0)
+
 from PyQt5.QtWidgets import (
     QApplication, QMainWindow, QToolBar, QAction, QLineEdit, QTabWidget, QWidget, QVBoxLayout,
     QToolButton, QMenu, QDialog, QLabel, QListWidget, QPushButton, QButtonGroup, QRadioButton,
-    QHBoxLayout, QProgressBar, QListWidgetItem, QSizePolicy
+    QHBoxLayout, QListWidgetItem, QSizePolicy, QListView, QStyledItemDelegate, QStyle,
+    QSpinBox, QCheckBox, QTableView, QHeaderView, QComboBox
+)
+from PyQt5.QtWebEngineWidgets import QWebEngineView, QWebEnginePage, QWebEngineProfile, QWebEngineSettings
+from PyQt5.QtWebEngineCore import QWebEngineUrlRequestInterceptor, QWebEngineUrlRequestInfo
+from PyQt5.QtGui import QIcon, QColor, QFont
+from PyQt5.QtCore import (
+    QUrl, Qt, QTimer, pyqtSignal, pyqtSlot, QObject, QJsonDocument, QAbstractListModel, QAbstractTableModel,
+    QModelIndex, QSize, QSortFilterProxyModel
 )
-from PyQt5.QtWebEngineWidgets import QWebEngineView, QWebEnginePage
-from PyQt5.QtGui import QIcon
-from PyQt5.QtCore import QUrl, Qt, QTimer, pyqtSignal, pyqtSlot, QObject, QJsonDocument
 import json
 import shutil
 import subprocess
 
+def run_async_javascript(page, script, callback, timeout_ms=10000, interval_ms=100):
+    """Ejecuta en la página una expresión que devuelve una Promise y llama a callback con su valor.
+
+    runJavaScript no espera a las promesas, así que el resultado se deja en
+    window.__fennexAsync y se consulta periódicamente. Si la página navega,
+    se cierra o se agota el tiempo, callback recibe None.
+    """
+    run_async_javascript.counter += 1
+    key = f'k{run_async_javascript.counter}'
+    # Entre paréntesis: un 'return' seguido de salto de línea devolvería undefined
+    expression = script.strip().rstrip(';')
+    page.runJavaScript(f'''
+    (function() {{
+        var store = window.__fennexAsync = window.__fennexAsync || {{}};
+        store['{key}'] = {{done: false}};
+        Promise.resolve().then(function() {{ return (
+{expression}
+        ); }}).then(
+            function(value) {{ store['{key}'] = {{done: true, value: value === undefined ? null : value}}; }},
+            function(error) {{ store['{key}'] = {{done: true, value: null, error: String(error)}}; }}
+        );
+    }})();
+    ''')
+    poll_script = f'''
+    (function() {{
+        var store = window.__fennexAsync || {{}};
+        var entry = store['{key}'];
+        if (!entry) return JSON.stringify({{done: true, value: null, error: 'page changed'}});
+        if (!entry.done) return null;
+        delete store['{key}'];
+        return JSON.stringify(entry);
+    }})();
+    '''
+    timer = QTimer(page)  # Muere con la página
+    deadline = time.monotonic() + timeout_ms / 1000
+
+    def finish(value):
+        timer.stop()
+        timer.deleteLater()
+        callback(value)
+
+    def on_poll(result):
+        if not timer.isActive():
+            return  # Ya se resolvió
+        if result:
+            entry = json.loads(result)
+            if entry.get('error'):
+                print(f"[JS] {entry['error']}")
+            finish(entry.get('value'))
+        elif time.monotonic() > deadline:
+            finish(None)
+
+    timer.timeout.connect(lambda: page.runJavaScript(poll_script, on_poll))
+    timer.start(interval_ms)
+
+run_async_javascript.counter = 0
+
+class ManifestCache:
+    """Caché de detección de manifests por origen, con TTL y caché negativa"""
+    TTL = 6 * 3600            # Manifest encontrado
+    NEGATIVE_TTL = 30 * 60    # El origen no declara manifest (o no es válido)
+    MAX_ORIGINS = 500
+
+    def __init__(self):
+        self._entries = OrderedDict()  # origen: (caduca, manifest o None)
+
+    @staticmethod
+    def origin_of(qurl):
+        if qurl.scheme() not in ('http', 'https') or not qurl.host():
+            return None
+        return f'{qurl.scheme()}://{qurl.host()}:{qurl.port(443 if qurl.scheme() == "https" else 80)}'
+
+    def lookup(self, origin):
+        """Devuelve (resuelto, manifest); manifest es None en los resultados negativos"""
+        entry = self._entries.get(origin)
+        if entry is None:
+            return False, None
+        expires, manifest = entry
+        if expires < time.time():
+            del self._entries[origin]
+            return False, None
+        self._entries.move_to_end(origin)
+        return True, manifest
+
+    def store(self, origin, manifest):
+        ttl = self.TTL if manifest else self.NEGATIVE_TTL
+        self._entries[origin] = (time.time() + ttl, manifest or None)
+        self._entries.move_to_end(origin)
+        while len(self._entries) > self.MAX_ORIGINS:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, origin):
+        self._entries.pop(origin, None)
+
 class PWAHandler(QObject):
     """Manejador de PWAs"""
-    manifestFound = pyqtSignal(dict)  # Señal emitida cuando se encuentra un manifest válido
+    # Emitida al resolver el origen actual: el manifest válido o {} si no hay PWA
+    manifestFound = pyqtSignal(dict)
+    cache = ManifestCache()  # Compartida por todas las pestañas
+
+    # Solo lee el manifest declarado en <link rel="manifest">; las rutas
+    # habituales únicamente se prueban si el usuario lo pide (probe=true)
+    DETECT_JS = '''
+    (async function(probe) {
+        async function fetchManifest(url) {
+            try {
+                const response = await fetch(url, {credentials: 'same-origin'});
+                if (!response.ok) return null;
+                const manifest = await response.json();
+                manifest.manifestUrl = response.url || url;
+                return manifest;
+            } catch (e) {
+                return null;
+            }
+        }
+
+        let manifest = null;
+        const link = document.querySelector('link[rel~="manifest"]');
+        if (link && link.href) {
+            manifest = await fetchManifest(link.href);
+        } else if (probe) {
+            const commonPaths = ['/manifest.json', '/manifest.webmanifest', '/app.webmanifest', '/pwa.webmanifest'];
+            for (const path of commonPaths) {
+                manifest = await fetchManifest(new URL(path, window.location.href).href);
+                if (manifest) break;
+            }
+        }
+        if (!manifest) return null;
+
+        const requiredFields = ['name', 'start_url', 'display'];
+        const hasRequiredFields = requiredFields.every(field => manifest[field]);
+        const validDisplay = ['standalone', 'fullscreen', 'minimal-ui'].includes(manifest.display);
+        if (!hasRequiredFields || !validDisplay) return null;
+
+        // Las URLs del manifest son relativas al propio manifest
+        manifest.start_url = new URL(manifest.start_url, manifest.manifestUrl).href;
+        manifest.currentUrl = window.location.href;
+        // Consultar solo el controlador actual: no enumera todos los registros
+        manifest.hasServiceWorker = !!(navigator.serviceWorker && navigator.serviceWorker.controller);
+        return manifest;
+    })(%s)
+    '''
     
     def __init__(self, page):
         super().__init__()
         self.page = page
-        self.checking = False
+        self.checking = None  # Origen que se está comprobando
         
-    def check_pwa_support(self):
-        """Verifica si el sitio actual es una PWA"""
-        if self.checking:
+    def check_pwa_support(self, probe=False):
+        """Verifica si el sitio actual es una PWA (una vez por origen mientras dure la caché)"""
+        origin = ManifestCache.origin_of(self.page.url())
+        if origin is None:
+            self.manifestFound.emit({})
+            return
+        if not probe:
+            resolved, manifest = self.cache.lookup(origin)
+            if resolved:
+                self.manifestFound.emit(dict(manifest or {}))
+                return
+        if self.checking == origin:
             return
             
-        self.checking = True
-        print("Verificando soporte PWA...")  # Depuración
-        
-        # Script mejorado para detectar PWAs
-        self.page.runJavaScript('''
-        (async function checkPWA() {
+        self.checking = origin
+        run_async_javascript(
+            self.page,
+            self.DETECT_JS % ('true' if probe else 'false'),
+            lambda result: self._handle_manifest_result(origin, result)
+        )
+    
+    def _handle_manifest_result(self, origin, result):
+        """Maneja el resultado de la verificación del manifest"""
+        if self.checking == origin:
+            self.checking = None
+        manifest = result if isinstance(result, dict) else None
+        self.cache.store(origin, manifest)
+        # Solo notificar si la página sigue en el mismo origen
+        if ManifestCache.origin_of(self.page.url()) == origin:
+            self.manifestFound.emit(dict(manifest or {}))
+
+class PWAIconInstaller(QObject):
+    """Descarga e instala los iconos de una PWA sin bloquear la interfaz.
+
+    Los iconos se piden con fetch() desde la propia página, así que usan la
+    caché y las cookies de su perfil. Se elige el mejor icono para cada
+    tamaño de hicolor y todos los tamaños se escalan y escriben de una vez
+    en un hilo aparte; el avance se notifica con señales.
+    """
+    HICOLOR_SIZES = (16, 24, 32, 48, 64, 128, 256, 512)
+    MAX_ICON_BYTES = 4 * 1024 * 1024
+    progress = pyqtSignal(int, str)  # Porcentaje, mensaje
+    finished = pyqtSignal(str)       # Nombre del icono instalado ('' si no hay)
+
+    FETCH_JS = '''
+    (async function(urls, maxBytes) {
+        async function load(url) {
             try {
-                // Función para verificar manifest
-                async function fetchManifest(url) {
-                    try {
-                        const response = await fetch(url);
-                        if (!response.ok) return null;
-                        return await response.json();
-                    } catch (e) {
-                        console.log("Error fetching manifest:", e);
-                        return null;
-                    }
-                }
-
-                // 1. Buscar links de manifest en el DOM
-                let manifest = null;
-                const manifestLinks = document.querySelectorAll('link[rel="manifest"]');
-                for (const link of manifestLinks) {
-                    manifest = await fetchManifest(link.href);
-                    if (manifest) break;
-                }
-
-                // 2. Intentar ubicaciones comunes si no se encontró
-                const commonPaths = [
-                    '/manifest.json',
-                    '/manifest.webmanifest',
-                    '/app.webmanifest',
-                    '/pwa.webmanifest'
-                ];
-
-                if (!manifest) {
-                    for (const path of commonPaths) {
-                        manifest = await fetchManifest(new URL(path, window.location.href).href);
-                        if (manifest) break;
-                    }
-                }
-
-                if (!manifest) {
-                    console.log("No manifest found");
-                    return null;
-                }
-
-                // 3. Verificar service worker
-                let hasServiceWorker = false;
-                if ('serviceWorker' in navigator) {
-                    const registrations = await navigator.serviceWorker.getRegistrations();
-                    hasServiceWorker = registrations.length > 0;
+                const response = await fetch(url, {credentials: 'same-origin'});
+                if (!response.ok) return null;
+                const bytes = new Uint8Array(await response.arrayBuffer());
+                if (bytes.length > maxBytes) return null;
+                let binary = '';
+                for (let i = 0; i < bytes.length; i += 0x8000) {
+                    binary += String.fromCharCode.apply(null, bytes.subarray(i, i + 0x8000));
                 }
+                return btoa(binary);
+            } catch (e) {
+                return null;
+            }
+        }
+        const results = {};
+        await Promise.all(urls.map(async url => { results[url] = await load(url); }));
+        return results;
+    })(%s, %d)
+    '''
 
-                // 4. Verificar características mínimas del manifest
-                const requiredFields = ['name', 'start_url', 'display'];
-                const hasRequiredFields = requiredFields.every(field => manifest[field]);
-                const validDisplay = ['standalone', 'fullscreen', 'minimal-ui'].includes(manifest.display);
+    def __init__(self, page, manifest, pwa_id, icons_dir=None, parent=None):
+        super().__init__(parent)
+        self.page = page
+        self.pwa_id = pwa_id
+        self.icons_dir = icons_dir or os.path.expanduser('~/.local/share/icons/hicolor')
+        base_url = manifest.get('manifestUrl') or manifest.get('start_url') or page.url().toString()
+        self.selection = self.select_icons(manifest.get('icons', []), base_url)
+        self._fetching = False
+        # Si la pestaña se cierra durante la descarga, terminar sin iconos
+        page.destroyed.connect(self._on_page_destroyed)
+
+    @staticmethod
+    def parse_sizes(value):
+        """'48x48 96x96' -> [48, 96]; 'any' -> [0] (vectorial)"""
+        sizes = []
+        for token in str(value or '').lower().split():
+            if token == 'any':
+                sizes.append(0)
+                continue
+            width, _, height = token.partition('x')
+            if width.isdigit() and height.isdigit():
+                sizes.append(min(int(width), int(height)))
+        return sizes
+
+    @classmethod
+    def select_icons(cls, icons, base_url):
+        """Devuelve {tamaño de hicolor: URL} ('scalable' para el SVG, si lo hay)"""
+        rasters, vector = [], None
+        for icon in icons:
+            src = icon.get('src') if isinstance(icon, dict) else None
+            if not src:
+                continue
+            purposes = str(icon.get('purpose', 'any')).split()
+            if 'any' not in purposes and 'maskable' not in purposes:
+                continue  # Iconos monocromos
+            url = urllib.parse.urljoin(base_url, src)
+            is_svg = 'svg' in str(icon.get('type', '')) or urllib.parse.urlparse(url).path.endswith('.svg')
+            sizes = cls.parse_sizes(icon.get('sizes'))
+            if is_svg or 0 in sizes:
+                if vector is None or 'any' in purposes:
+                    vector = url
+                continue
+            # Los maskable llevan margen de seguridad: solo si no hay otra opción
+            penalty = 0 if 'any' in purposes else 1
+            for size in sizes or [0]:
+                rasters.append((penalty, size, url))
+        selection = {}
+        for bucket in cls.HICOLOR_SIZES:
+            larger = [c for c in rasters if c[1] >= bucket]
+            if larger:
+                selection[bucket] = min(larger, key=lambda c: (c[0], c[1]))[2]
+            elif vector:
+                selection[bucket] = vector
+            elif rasters:
+                selection[bucket] = max(rasters, key=lambda c: (-c[0], c[1]))[2]
+        if vector:
+            selection['scalable'] = vector
+        return selection
+
+    def start(self):
+        if not self.selection:
+            self.finished.emit('')
+            return
+        urls = sorted(set(self.selection.values()))
+        self._fetching = True
+        self.progress.emit(5, f'Descargando {len(urls)} icono(s)...')
+        run_async_javascript(
+            self.page,
+            self.FETCH_JS % (json.dumps(urls), self.MAX_ICON_BYTES),
+            lambda result: self._on_fetched(urls, result or {}),
+            timeout_ms=30000
+        )
 
-                if (hasRequiredFields && validDisplay) {
-                    manifest.currentUrl = window.location.href;
-                    manifest.hasServiceWorker = hasServiceWorker;
-                    console.log("PWA válida encontrada:", manifest);
-                    return manifest;
-                }
+    def _on_page_destroyed(self):
+        if self._fetching:
+            self._fetching = False
+            self.finished.emit('')
 
-                console.log("Manifest found but missing required fields or invalid display mode");
-                return null;
-            } catch (error) {
-                console.log("Error checking PWA:", error);
-                return null;
-            }
-        })();
-        ''', self._handle_manifest_result)
-    
-    def _handle_manifest_result(self, result):
-        """Maneja el resultado de la verificación del manifest"""
-        self.checking = False
-        if result:
-            print("¡Manifest encontrado!", result)  # Depuración
-            self.manifestFound.emit(result)
+    def _on_fetched(self, urls, result):
+        if not self._fetching:
+            return
+        self._fetching = False
+        self.progress.emit(40, 'Procesando iconos...')
+        threading.Thread(target=self._write_icons, args=(urls, result), daemon=True).start()
+
+    def _write_icons(self, urls, result):
+        """Decodifica, escala y escribe todos los tamaños (hilo de trabajo)"""
+        from PyQt5.QtGui import QImage
+        blobs = {}
+        for url in urls:
+            data = result.get(url)
+            if data:
+                blobs[url] = base64.b64decode(data)
+            else:
+                # fetch() falla con iconos de otro origen sin CORS
+                try:
+                    import requests
+                    response = requests.get(url, timeout=10)
+                    response.raise_for_status()
+                    blobs[url] = response.content[:self.MAX_ICON_BYTES]
+                except Exception as e:
+                    print(f"[ERROR] No se pudo descargar el ícono {url}: {e}")
+        images = {}
+        for url, blob in blobs.items():
+            image = QImage()
+            if image.loadFromData(blob):
+                images[url] = image
+        written = 0
+        total = len(self.selection)
+        for done, (bucket, url) in enumerate(self.selection.items(), 1):
+            try:
+                if bucket == 'scalable':
+                    if url in blobs:
+                        target = os.path.join(self.icons_dir, 'scalable', 'apps', f'{self.pwa_id}.svg')
+                        os.makedirs(os.path.dirname(target), exist_ok=True)
+                        atomic_write(target, blobs[url])
+                        written += 1
+                    continue
+                image = images.get(url)
+                # No ampliar más del doble: quedaría borroso
+                if image is None or max(image.width(), image.height()) * 2 < bucket:
+                    continue
+                scaled = image.scaled(bucket, bucket, Qt.KeepAspectRatio, Qt.SmoothTransformation)
+                target = os.path.join(self.icons_dir, f'{bucket}x{bucket}', 'apps', f'{self.pwa_id}.png')
+                os.makedirs(os.path.dirname(target), exist_ok=True)
+                if scaled.save(target, 'PNG'):
+                    written += 1
+            except Exception as e:
+                print(f"[ERROR] Error al guardar el ícono {bucket}: {e}")
+            finally:
+                self.progress.emit(40 + 55 * done // total, 'Guardando iconos...')
+        if written:
+            # Los temas de iconos revisan la fecha de modificación del directorio raíz
+            try:
+                os.utime(self.icons_dir)
+            except OSError:
+                pass
+        self.progress.emit(100, 'Iconos instalados' if written else 'No se pudieron instalar los iconos')
+        self.finished.emit(self.pwa_id if written else '')
 
 class BrowserTab(QWidget):
     pwaAvailable = pyqtSignal(dict)  # Nueva señal para indicar que hay una PWA disponible
@@ -192,6 +591,366 @@ class BrowserTab(QWidget):
         # La instalación ahora se maneja completamente en MainWindow.install_current_pwa()
         print("[DEBUG] BrowserTab._install_pwa: Delegando instalación a MainWindow")
 
+def atomic_write(path, data):
+    """Escribe un archivo de forma atómica (archivo temporal + rename)"""
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(prefix='.tmp-', dir=directory)
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+class PersistenceScheduler(QObject):
+    """Agrupa las escrituras pendientes y las vuelca desde un hilo de fondo.
+
+    Cada clave (historial, marcadores, configuración...) se marca como sucia
+    junto con una función que, al volcar, toma una instantánea del estado en
+    el hilo principal y devuelve la escritura que se ejecuta en el hilo de
+    persistencia. Varias marcas seguidas de la misma clave producen una sola
+    escritura.
+    """
+
+    def __init__(self, delay_ms=2000, parent=None):
+        super().__init__(parent)
+        self._dirty = {}  # clave: función de instantánea
+        self._futures = []
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='fennex-persist')
+        self._timer = QTimer(self)
+        self._timer.setSingleShot(True)
+        self._timer.setInterval(delay_ms)
+        self._timer.timeout.connect(self.flush)
+
+    def mark_dirty(self, key, snapshot):
+        self._dirty[key] = snapshot
+        if not self._timer.isActive():
+            self._timer.start()
+
+    def flush(self, wait=False):
+        """Vuelca todo lo pendiente; con wait=True espera a que termine"""
+        self._timer.stop()
+        dirty, self._dirty = self._dirty, {}
+        for key, snapshot in dirty.items():
+            try:
+                write = snapshot()
+            except Exception as e:
+                print(f"Error al preparar la escritura de {key}: {e}")
+                continue
+            if write:
+                self._futures.append(self._executor.submit(self._run, key, write))
+        self._futures = [f for f in self._futures if not f.done()]
+        if wait:
+            for future in self._futures:
+                future.result()
+            self._futures = []
+
+    @staticmethod
+    def _run(key, write):
+        try:
+            write()
+        except Exception as e:
+            print(f"Error al guardar {key}: {e}")
+
+class HistoryStore:
+    """Almacén del historial de navegación en SQLite (modo WAL)"""
+
+    SCHEMA = '''
+        CREATE TABLE IF NOT EXISTS urls (
+            id INTEGER PRIMARY KEY,
+            url TEXT NOT NULL UNIQUE,
+            title TEXT NOT NULL DEFAULT '',
+            last_visit TEXT NOT NULL,
+            visit_count INTEGER NOT NULL DEFAULT 1
+        );
+        CREATE TABLE IF NOT EXISTS visits (
+            id INTEGER PRIMARY KEY,
+            url_id INTEGER NOT NULL REFERENCES urls(id) ON DELETE CASCADE,
+            visit_time TEXT NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS visits_url_id ON visits(url_id);
+    '''
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.RLock()  # La conexión se comparte con el hilo de persistencia
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self.conn.execute('PRAGMA foreign_keys=ON')
+        self.conn.executescript(self.SCHEMA)
+        self.conn.commit()
+
+    def import_json(self, json_path):
+        """Importa una sola vez el historial JSON antiguo y lo renombra"""
+        if not os.path.exists(json_path):
+            return 0
+        with open(json_path, 'r') as f:
+            entries = json.load(f).get('history', [])
+        rows = [
+            (e['url'], e.get('title') or e['url'], e.get('timestamp', ''), e.get('visit_count', 1))
+            for e in reversed(entries)  # El JSON guarda primero la entrada más reciente
+            if isinstance(e, dict) and e.get('url')
+        ]
+        with self._lock, self.conn:
+            self.conn.executemany('''
+                INSERT INTO urls (url, title, last_visit, visit_count) VALUES (?, ?, ?, ?)
+                ON CONFLICT(url) DO NOTHING
+            ''', rows)
+            self.conn.execute('''
+                INSERT INTO visits (url_id, visit_time)
+                SELECT id, last_visit FROM urls WHERE id NOT IN (SELECT url_id FROM visits)
+            ''')
+        os.replace(json_path, json_path + '.migrated')
+        print(f"Historial importado a SQLite: {len(rows)} entradas")
+        return len(rows)
+
+    def entries(self, limit):
+        """Devuelve las entradas más recientes con el formato de BrowserContext.history"""
+        with self._lock:
+            rows = self.conn.execute(
+                'SELECT url, title, last_visit, visit_count FROM urls ORDER BY id DESC LIMIT ?',
+                (limit,)
+            ).fetchall()
+        return [
+            {'url': url, 'title': title, 'timestamp': last_visit, 'visit_count': visit_count}
+            for url, title, last_visit, visit_count in rows
+        ]
+
+    def apply(self, ops):
+        """Aplica un lote de operaciones pendientes en una sola transacción:
+        ('upsert', url, título, instante), ('delete', url) o ('clear',)"""
+        with self._lock, self.conn:
+            for op, *args in ops:
+                getattr(self, '_' + op)(*args)
+
+    def _upsert(self, url, title, timestamp):
+        """Registra una visita; usa el índice único de URL (O(log n))"""
+        self.conn.execute('''
+            INSERT INTO urls (url, title, last_visit, visit_count) VALUES (?, ?, ?, 1)
+            ON CONFLICT(url) DO UPDATE SET
+                title = CASE WHEN ? != '' THEN excluded.title ELSE urls.title END,
+                last_visit = excluded.last_visit,
+                visit_count = urls.visit_count + 1
+        ''', (url, title or url, timestamp, title))
+        self.conn.execute(
+            'INSERT INTO visits (url_id, visit_time) SELECT id, ? FROM urls WHERE url = ?',
+            (timestamp, url)
+        )
+
+    def _delete(self, url):
+        self.conn.execute('DELETE FROM urls WHERE url = ?', (url,))
+
+    def _clear(self):
+        self.conn.execute('DELETE FROM urls')
+
+class HistoryModel(QAbstractListModel):
+    """Modelo de lista sobre BrowserContext.history (sin un widget por fila).
+
+    La lista es la misma que usa MainWindow: las altas, bajas y cambios
+    pasan por prepend/pop_last/entry_changed/clear para que las vistas y
+    los proxies reciban las señales de filas correspondientes.
+    """
+    UrlRole = Qt.UserRole + 1
+    InfoRole = Qt.UserRole + 2
+
+    def __init__(self, history=None, parent=None):
+        super().__init__(parent)
+        self._history = history if history is not None else []
+        self._info_cache = {}  # (timestamp, visitas): texto ya formateado
+
+    def set_history(self, history):
+        self.beginResetModel()
+        self._history = history
+        self.endResetModel()
+
+    def prepend(self, entry):
+        self.beginInsertRows(QModelIndex(), 0, 0)
+        self._history.insert(0, entry)
+        self.endInsertRows()
+
+    def pop_last(self):
+        row = len(self._history) - 1
+        self.beginRemoveRows(QModelIndex(), row, row)
+        entry = self._history.pop()
+        self.endRemoveRows()
+        return entry
+
+    def entry_changed(self, entry):
+        """Notifica una entrada modificada en su lugar (nueva visita)"""
+        for row, candidate in enumerate(self._history):
+            if candidate is entry:
+                index = self.index(row)
+                self.dataChanged.emit(index, index)
+                return
+
+    def clear(self):
+        self.beginResetModel()
+        self._history.clear()
+        self.endResetModel()
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self._history)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid() or index.row() >= len(self._history):
+            return None
+        entry = self._history[index.row()]
+        if role == Qt.DisplayRole:
+            return entry.get('title') or entry.get('url', '')
+        if role in (self.UrlRole, Qt.ToolTipRole):
+            return entry.get('url', '')
+        if role == self.InfoRole:
+            return self._info_text(entry)
+        return None
+
+    def _info_text(self, entry):
+        """Formatea la fecha solo para las filas que se pintan"""
+        from datetime import datetime
+        visits = entry.get('visit_count', 1)
+        key = (entry.get('timestamp', ''), visits)
+        text = self._info_cache.get(key)
+        if text is None:
+            try:
+                date_str = datetime.fromisoformat(key[0]).strftime('%d/%m/%Y %H:%M')
+            except ValueError:
+                date_str = key[0]
+            text = f'Visitado: {date_str} - {visits} {"vez" if visits == 1 else "veces"}'
+            self._info_cache[key] = text
+        return text
+
+class HistoryItemDelegate(QStyledItemDelegate):
+    """Pinta título, URL e información de visitas de cada fila visible"""
+    ROW_HEIGHT = 62
+
+    def paint(self, painter, option, index):
+        painter.save()
+        if option.state & QStyle.State_Selected:
+            painter.fillRect(option.rect, QColor('#3a3a3a'))
+        elif option.state & QStyle.State_MouseOver:
+            painter.fillRect(option.rect, QColor('#303030'))
+
+        rect = option.rect.adjusted(10, 5, -10, -5)
+        lines = (
+            (index.data(Qt.DisplayRole), 13, True, '#eee'),
+            (index.data(HistoryModel.UrlRole), 11, False, '#888'),
+            (index.data(HistoryModel.InfoRole), 10, False, '#666'),
+        )
+        y = rect.top()
+        for text, size, bold, color in lines:
+            font = QFont(option.font)
+            font.setPixelSize(size)
+            font.setBold(bold)
+            painter.setFont(font)
+            painter.setPen(QColor(color))
+            metrics = painter.fontMetrics()
+            line_height = metrics.height() + 2
+            elided = metrics.elidedText(text or '', Qt.ElideRight, rect.width())
+            painter.drawText(rect.left(), y, rect.width(), line_height, Qt.AlignLeft | Qt.AlignVCenter, elided)
+            y += line_height
+        painter.restore()
+
+    def sizeHint(self, option, index):
+        return QSize(option.rect.width(), self.ROW_HEIGHT)
+
+def normalize_search_text(text):
+    """Minúsculas, sin acentos y solo caracteres alfanuméricos separados por espacios"""
+    text = unicodedata.normalize('NFKD', text or '').lower()
+    text = ''.join(c for c in text if not unicodedata.combining(c))
+    return re.sub(r'[^0-9a-z]+', ' ', text).strip()
+
+class HistorySearchIndex:
+    """Índice invertido de tokens de título/URL con búsqueda por prefijo, multi-término y difusa.
+
+    Las búsquedas que amplían la anterior (una letra más o un término nuevo)
+    se refinan sobre el resultado previo en lugar de recorrer todo el índice.
+    Los resultados son números de fila de la lista indexada: si la lista
+    cambia, hay que construir un índice nuevo.
+    """
+    FUZZY_CUTOFF = 0.75
+
+    def __init__(self, entries=()):
+        self.build(entries)
+
+    def build(self, entries):
+        self._postings = {}  # token: conjunto de filas
+        for row, entry in enumerate(entries):
+            text = normalize_search_text(f"{entry.get('title', '')} {entry.get('url', '')}")
+            for token in set(text.split()):
+                self._postings.setdefault(token, set()).add(row)
+        self._tokens = sorted(self._postings)
+        self._last_terms = []
+        self._last_result = None
+        self._last_fuzzy = False
+
+    def _prefix_rows(self, term):
+        rows = set()
+        start = bisect.bisect_left(self._tokens, term)
+        for token in self._tokens[start:]:
+            if not token.startswith(term):
+                break
+            rows |= self._postings[token]
+        return rows
+
+    def _term_rows(self, term):
+        """Filas cuyo algún token empieza por term; si no hay, coincidencias aproximadas"""
+        rows = self._prefix_rows(term)
+        if rows:
+            return rows, False
+        for token in difflib.get_close_matches(term, self._tokens, n=5, cutoff=self.FUZZY_CUTOFF):
+            rows |= self._postings[token]
+        return rows, True
+
+    def search(self, query):
+        """Devuelve el conjunto de filas que cumplen todos los términos, o None si no hay consulta"""
+        terms = normalize_search_text(query).split()
+        if not terms:
+            self._last_terms, self._last_result = [], None
+            return None
+
+        prev = self._last_terms
+        extends = (
+            self._last_result is not None and not self._last_fuzzy and prev
+            and len(terms) >= len(prev) and terms[:len(prev) - 1] == prev[:-1]
+            and terms[len(prev) - 1].startswith(prev[-1])
+        )
+        if extends:
+            # Refinar el resultado anterior solo con los términos que cambiaron
+            result = set(self._last_result)
+            changed = terms[len(prev) - 1:]
+        else:
+            result = None
+            changed = terms
+
+        fuzzy = False
+        for term in changed:
+            rows, term_fuzzy = self._term_rows(term)
+            fuzzy = fuzzy or term_fuzzy
+            result = rows if result is None else result & rows
+            if not result:
+                break
+
+        self._last_terms, self._last_result, self._last_fuzzy = terms, result, fuzzy
+        return result
+
+class HistoryFilterProxyModel(QSortFilterProxyModel):
+    """Proxy que muestra solo las filas encontradas por HistorySearchIndex"""
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._matches = None
+
+    def set_matches(self, matches):
+        self._matches = matches
+        self.invalidateFilter()
+
+    def filterAcceptsRow(self, source_row, source_parent):
+        return self._matches is None or source_row in self._matches
+
 class HistoryWindow(QDialog):
     def __init__(self, parent=None):
         super().__init__(parent)
@@ -211,7 +970,7 @@ class HistoryWindow(QDialog):
                 background-color: #232323;
                 color: #eee;
             }
-            QListWidget {
+            QListView {
                 background-color: #2c2c2c;
                 border: 1px solid #444;
                 color: #eee;
@@ -259,71 +1018,70 @@ class HistoryWindow(QDialog):
         top_bar.addWidget(btn_clear)
         layout.addLayout(top_bar)
         
-        # Lista de historial
-        self.list_widget = QListWidget()
-        self.list_widget.itemDoubleClicked.connect(self.open_url)
-        layout.addWidget(self.list_widget)
+        # Lista de historial (modelo/vista: solo se pintan las filas visibles).
+        # El modelo es el de MainWindow, que lo actualiza con cada visita
+        if hasattr(parent, 'history_model'):
+            self.model = parent.history_model()
+        else:
+            self.model = HistoryModel(parent=self)
+        self.model.rowsInserted.connect(self._update_empty_state)
+        self.model.rowsRemoved.connect(self._update_empty_state)
+        self.model.modelReset.connect(self._update_empty_state)
+        self.proxy = HistoryFilterProxyModel(self)
+        self.proxy.setSourceModel(self.model)
+        self.search_index = None  # Se construye en la primera búsqueda
+        self.list_view = QListView()
+        self.list_view.setModel(self.proxy)
+        self.list_view.setItemDelegate(HistoryItemDelegate(self.list_view))
+        self.list_view.setUniformItemSizes(True)
+        self.list_view.setMouseTracking(True)
+        self.list_view.doubleClicked.connect(self.open_url)
+        layout.addWidget(self.list_view)
+        # El índice guarda números de fila: cualquier alta, baja o cambio lo invalida
+        for signal in (self.model.rowsInserted, self.model.rowsRemoved,
+                       self.model.modelReset, self.model.dataChanged):
+            signal.connect(self._invalidate_search_index)
+        
+        # Mensaje cuando no hay historial
+        self.empty_label = QLabel("No hay historial de navegación")
+        self.empty_label.setStyleSheet('color: #888; font-style: italic;')
+        self.empty_label.setAlignment(Qt.AlignCenter)
+        layout.addWidget(self.empty_label)
         
         # Cargar historial inicial
         self.load_history()
     
     def load_history(self):
-        """Carga el historial en la lista"""
-        self.list_widget.clear()
-        if not hasattr(self.parent, 'history') or not self.parent.history:
-            # Mostrar mensaje de no hay historial
-            item = QListWidgetItem()
-            widget = QWidget()
-            layout = QVBoxLayout(widget)
-            layout.setContentsMargins(10, 5, 10, 5)
-            
-            msg_label = QLabel("No hay historial de navegación")
-            msg_label.setStyleSheet('color: #888; font-style: italic;')
-            layout.addWidget(msg_label)
-            
-            item.setSizeHint(widget.sizeHint())
-            self.list_widget.addItem(item)
-            self.list_widget.setItemWidget(item, widget)
-            return
-            
-        for entry in self.parent.history:
-            item = QListWidgetItem()
-            widget = QWidget()
-            layout = QVBoxLayout(widget)
-            layout.setContentsMargins(10, 5, 10, 5)
-            
-            # Título y URL
-            title_label = QLabel(entry['title'])
-            title_label.setStyleSheet('font-size: 13px; font-weight: bold;')
-            url_label = QLabel(entry['url'])
-            url_label.setStyleSheet('font-size: 11px; color: #888;')
-            
-            # Fecha y contador de visitas
-            from datetime import datetime
-            timestamp = datetime.fromisoformat(entry['timestamp'])
-            date_str = timestamp.strftime('%d/%m/%Y %H:%M')
-            visits = entry.get('visit_count', 1)
-            info_label = QLabel(f'Visitado: {date_str} - {visits} {"vez" if visits == 1 else "veces"}')
-            info_label.setStyleSheet('font-size: 10px; color: #666;')
-            
-            layout.addWidget(title_label)
-            layout.addWidget(url_label)
-            layout.addWidget(info_label)
-            
-            item.setSizeHint(widget.sizeHint())
-            self.list_widget.addItem(item)
-            self.list_widget.setItemWidget(item, widget)
+        """Carga el historial en el modelo"""
+        history = getattr(self.parent.context, 'history', None)
+        if history is None:
+            history = []
+        if self.model._history is not history:
+            self.model.set_history(history)
+        self.search_index = None
+        self._update_empty_state()
+        self.filter_history()
+
+    def _invalidate_search_index(self, *args):
+        """Descarta el índice y, si hay una búsqueda activa, la repite sobre las filas nuevas"""
+        self.search_index = None
+        if self.search_box.text().strip():
+            self.filter_history()
+
+    def _update_empty_state(self, *args):
+        has_history = self.model.rowCount() > 0
+        self.list_view.setVisible(has_history)
+        self.empty_label.setVisible(not has_history)
     
     def filter_history(self):
-        """Filtra el historial según el texto de búsqueda"""
-        search_text = self.search_box.text().lower()
-        for i in range(self.list_widget.count()):
-            item = self.list_widget.item(i)
-            widget = self.list_widget.itemWidget(item)
-            text = ''
-            for label in widget.findChildren(QLabel):
-                text += label.text().lower() + ' '
-            item.setHidden(search_text not in text)
+        """Filtra el historial según el texto de búsqueda usando el índice"""
+        search_text = self.search_box.text()
+        if not search_text.strip():
+            self.proxy.set_matches(None)
+            return
+        if self.search_index is None:
+            self.search_index = HistorySearchIndex(self.model._history)
+        self.proxy.set_matches(self.search_index.search(search_text))
     
     def clear_history(self):
         """Limpia todo el historial"""
@@ -337,28 +1095,866 @@ class HistoryWindow(QDialog):
         )
         
         if reply == QMessageBox.Yes:
-            self.parent.history.clear()
-            self.parent.save_history()
+            self.parent.clear_history()
             self.load_history()
     
-    def open_url(self, item):
+    def open_url(self, index):
         """Abre la URL seleccionada en una nueva pestaña"""
-        widget = self.list_widget.itemWidget(item)
-        if widget and widget.findChildren(QLabel):
-            url_label = widget.findChildren(QLabel)[1]  # La URL está en el segundo QLabel
-            if url_label:
-                url = url_label.text()
-                if url and not url.startswith("No hay historial"):
-                    self.parent.add_new_tab(QUrl(url))
+        url = index.data(HistoryModel.UrlRole)
+        if url:
+            self.parent.add_new_tab(QUrl(url))
+
+class DownloadProgressAggregator(QObject):
+    """Muestrea todas las descargas activas a un ritmo fijo de interfaz.
+
+    En lugar de repintar con cada downloadProgress (muchas veces por
+    segundo y descarga), un único temporizador lee los bytes recibidos de
+    cada descarga, calcula la velocidad con una media móvil exponencial
+    (EWMA) y el tiempo restante, y emite todo junto en una sola señal.
+    Sirve cualquier objeto con receivedBytes(), totalBytes() e isPaused().
+    """
+    INTERVAL_MS = 200   # 5 Hz
+    RATE_TAU = 2.0      # Constante de tiempo de la EWMA, en segundos
+    sampled = pyqtSignal(list, dict)  # [(clave, recibido, total, velocidad, eta)], totales
 
-class DownloadsWindow(QDialog):
     def __init__(self, parent=None):
+        super().__init__(parent)
+        self._items = {}  # clave: [descarga, t anterior, bytes anteriores, velocidad]
+        self._timer = QTimer(self)
+        self._timer.setInterval(self.INTERVAL_MS)
+        self._timer.timeout.connect(self.sample)
+
+    def track(self, key, download):
+        self._items[key] = [download, time.monotonic(), download.receivedBytes(), 0.0]
+        if not self._timer.isActive():
+            self._timer.start()
+
+    def untrack(self, key):
+        """Deja de muestrear una descarga (tras una última muestra para mostrar el valor final)"""
+        if key in self._items:
+            self.sample()
+            self._items.pop(key, None)
+        if not self._items:
+            self._timer.stop()
+
+    def sample(self):
+        now = time.monotonic()
+        rows = []
+        total_received = total_size = 0
+        total_rate = 0.0
+        eta_known = True
+        for key, entry in list(self._items.items()):
+            download, last_time, last_received, rate = entry
+            try:
+                received, total = download.receivedBytes(), download.totalBytes()
+                paused = download.isPaused()
+            except RuntimeError:
+                self._items.pop(key, None)  # El objeto de Qt ya no existe
+                continue
+            dt = now - last_time
+            if dt > 0:
+                instant = 0.0 if paused else max(received - last_received, 0) / dt
+                alpha = 1 - math.exp(-dt / self.RATE_TAU)
+                rate = rate + alpha * (instant - rate) if rate else instant
+                entry[1:] = [now, received, rate]
+            eta = (total - received) / rate if total > 0 and rate > 1 else None
+            rows.append((key, received, total, rate, eta))
+            total_received += received
+            total_rate += rate
+            if total > 0:
+                total_size += total
+            else:
+                eta_known = False
+        totals = {
+            'active': len(rows),
+            'received': total_received,
+            'total': total_size,
+            'rate': total_rate,
+            'eta': (total_size - total_received) / total_rate if eta_known and total_rate > 1 else None,
+        }
+        self.sampled.emit(rows, totals)
+
+    @staticmethod
+    def format_bytes(count):
+        for unit in ('B', 'KB', 'MB', 'GB'):
+            if count < 1024 or unit == 'GB':
+                return f'{count:.0f} {unit}' if unit == 'B' else f'{count:.1f} {unit}'
+            count /= 1024
+
+    @staticmethod
+    def format_eta(seconds):
+        if seconds is None:
+            return '--:--'
+        seconds = int(seconds)
+        hours, rest = divmod(seconds, 3600)
+        return f'{hours}:{rest // 60:02d}:{rest % 60:02d}' if hours else f'{rest // 60}:{rest % 60:02d}'
+
+class SegmentedDownload(QObject):
+    """Descarga HTTP por rangos en varios segmentos paralelos, reanudable entre reinicios.
+
+    Comprueba que el servidor admite rangos, reserva el archivo completo
+    (destino + '.part') y cada segmento escribe en su posición con
+    os.pwrite desde su propio hilo. Un diario JSON junto al archivo
+    ('.part.json') guarda cuánto lleva cada segmento, así que la descarga
+    se puede continuar tras un cierre o un fallo. Expone la misma interfaz
+    que QWebEngineDownloadItem que usan DownloadsWindow y el agregador.
+    """
+    # Mismos valores que QWebEngineDownloadItem.DownloadState
+    DownloadRequested, DownloadInProgress, DownloadCompleted, DownloadCancelled, DownloadInterrupted = range(5)
+    MIN_SIZE = 64 * 1024 * 1024  # Por debajo, QtWebEngine es suficiente
+    SEGMENTS = 4
+    CHUNK_SIZE = 256 * 1024
+    JOURNAL_INTERVAL = 1.0
+    RETRIES = 3
+    finished = pyqtSignal()
+    probed = pyqtSignal(bool)
+
+    def __init__(self, url, path, headers=None, segments=SEGMENTS, parent=None):
+        super().__init__(parent)
+        self._url = url
+        self._path = path
+        self.headers = dict(headers or {})
+        self.segment_count = max(1, segments)
+        self.total = -1
+        self.validator = ''
+        self.mime = ''
+        self.segments = None  # [inicio, fin, siguiente byte] por segmento
+        self.error = ''
+        self._state = self.DownloadRequested
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._running = 0  # Hilos vivos de la ejecución actual (protegido por _lock)
+        self._finishing = False  # Un hilo está cerrando la ejecución (protegido por _lock)
+        self._paused = False
+        self._cancelled = False
+        self._resume_pending = False
+        self._fd = None
+        self._last_journal = 0.0
+
+    # Interfaz común con QWebEngineDownloadItem
+    def url(self):
+        return QUrl(self._url)
+
+    def path(self):
+        return self._path
+
+    def downloadFileName(self):
+        return os.path.basename(self._path)
+
+    def mimeType(self):
+        return self.mime
+
+    def state(self):
+        return self._state
+
+    def isPaused(self):
+        return self._paused
+
+    def totalBytes(self):
+        return self.total
+
+    def receivedBytes(self):
+        segments = self.segments
+        if not segments:
+            return 0
+        return sum(min(next_byte, end + 1) - start for start, end, next_byte in segments)
+
+    @staticmethod
+    def part_path(path):
+        return path + '.part'
+
+    @staticmethod
+    def journal_path(path):
+        return path + '.part.json'
+
+    @classmethod
+    def can_resume(cls, path):
+        return bool(path) and os.path.exists(cls.journal_path(path)) and os.path.exists(cls.part_path(path))
+
+    @classmethod
+    def from_journal(cls, path, parent=None):
+        """Reconstruye una descarga interrumpida a partir de su diario"""
+        try:
+            with open(cls.journal_path(path), 'r', encoding='utf-8') as f:
+                journal = json.load(f)
+            download = cls(journal['url'], path, journal.get('headers'), len(journal['segments']), parent)
+            download.total = int(journal['total'])
+            download.validator = journal.get('validator', '')
+            download.mime = journal.get('mime', '')
+            download.segments = [list(map(int, segment)) for segment in journal['segments']]
+            return download
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            print(f"No se pudo leer el diario de descarga de {path}: {e}")
+            return None
+
+    def probe(self, timeout=10):
+        """Pide el primer byte: solo se usa el motor propio si el servidor responde 206"""
+        import requests
+        headers = dict(self.headers, Range='bytes=0-0')
+        with requests.get(self._url, headers=headers, stream=True, timeout=timeout, allow_redirects=True) as response:
+            content_range = response.headers.get('Content-Range', '')
+            if response.status_code != 206 or not content_range.startswith('bytes 0-0/'):
+                return False
+            total = content_range.rsplit('/', 1)[1]
+            if not total.isdigit():
+                return False
+            self.total = int(total)
+            self._url = response.url  # Evitar repetir las redirecciones en cada segmento
+            etag = response.headers.get('ETag', '')
+            # If-Range solo admite ETags fuertes; si no, la fecha de modificación
+            self.validator = etag if etag and not etag.startswith('W/') else response.headers.get('Last-Modified', '')
+            self.mime = response.headers.get('Content-Type', '').split(';')[0].strip()
+        return True
+
+    def probe_async(self):
+        """probe() en un hilo aparte; el resultado llega con la señal probed"""
+        def run():
+            try:
+                ok = self.probe()
+            except Exception as e:
+                print(f"Error al comprobar rangos en {self._url}: {e}")
+                ok = False
+            self.probed.emit(ok)
+        threading.Thread(target=run, daemon=True).start()
+
+    def start(self):
+        if self.total <= 0:
+            raise ValueError('Tamaño desconocido: hay que llamar antes a probe()')
+        with self._lock:
+            if self._running or self._finishing:
+                # Los hilos de la pausa anterior aún no terminaron: _finish la reanudará
+                self._resume_pending = True
+                return
+            self._running = 1  # El hilo de preparación
+        if self.segments is None:
+            size = -(-self.total // self.segment_count)
+            self.segments = [
+                [start, min(start + size, self.total) - 1, start]
+                for start in range(0, self.total, size)
+            ]
+        self._stop.clear()
+        self._paused = self._cancelled = False
+        self.error = ''
+        self._state = self.DownloadInProgress
+        # Reservar varios GB y sincronizar el diario puede tardar: nunca en el hilo de la interfaz
+        threading.Thread(target=self._prepare, daemon=True).start()
+
+    def _prepare(self):
+        """Reserva el archivo, escribe el primer diario y lanza los segmentos pendientes (hilo de trabajo)"""
+        part = self.part_path(self._path)
+        try:
+            os.makedirs(os.path.dirname(os.path.abspath(part)), exist_ok=True)
+            self._fd = os.open(part, os.O_RDWR | os.O_CREAT, 0o644)
+            if os.fstat(self._fd).st_size != self.total:
+                # Reservar el archivo completo de una vez
+                try:
+                    os.posix_fallocate(self._fd, 0, self.total)
+                except (AttributeError, OSError):
+                    os.ftruncate(self._fd, self.total)
+            self._save_journal()
+        except OSError as e:
+            self.error = str(e)
+            self._worker_done()
+            return
+        pending = [i for i, (start, end, next_byte) in enumerate(self.segments) if next_byte <= end]
+        if pending and not self._stop.is_set():
+            with self._lock:
+                self._running += len(pending)
+            for index in pending:
+                threading.Thread(target=self._run_segment, args=(index,), daemon=True).start()
+        self._worker_done()  # Fin de la preparación
+
+    def pause(self):
+        if self._state == self.DownloadInProgress and not self._paused:
+            self._paused = True
+            self._stop.set()
+
+    def resume(self):
+        if self._paused:
+            self.start()
+
+    def cancel(self):
+        if self._state in (self.DownloadCompleted, self.DownloadCancelled):
+            return
+        self._cancelled = True
+        self._stop.set()
+        with self._lock:
+            idle = not self._running and not self._finishing
+            if idle:
+                self._finishing = True
+        if idle:
+            self._finish()  # Si no, lo hará el último hilo (o el _finish en curso)
+
+    def _pwrite(self, data, offset):
+        if hasattr(os, 'pwrite'):
+            while data:
+                written = os.pwrite(self._fd, data, offset)
+                data, offset = data[written:], offset + written
+        else:
+            with self._lock:
+                os.lseek(self._fd, offset, os.SEEK_SET)
+                os.write(self._fd, data)
+
+    def _run_segment(self, index):
+        """Descarga un segmento (hilo de trabajo), con reintentos"""
+        import requests
+        session = requests.Session()
+        segment = self.segments[index]
+        failures = 0
+        while not self._stop.is_set() and segment[2] <= segment[1]:
+            headers = dict(self.headers, Range=f'bytes={segment[2]}-{segment[1]}')
+            if self.validator:
+                headers['If-Range'] = self.validator
+            offset = segment[2]
+            try:
+                with session.get(self._url, headers=headers, stream=True, timeout=30) as response:
+                    # Con If-Range, un 200 significa que el archivo cambió en el servidor
+                    if response.status_code != 206:
+                        raise IOError(f'HTTP {response.status_code}: el servidor no devolvió el rango pedido')
+                    for chunk in response.iter_content(self.CHUNK_SIZE):
+                        if self._stop.is_set():
+                            break
+                        chunk = chunk[:segment[1] - segment[2] + 1]
+                        self._pwrite(chunk, segment[2])
+                        with self._lock:
+                            segment[2] += len(chunk)
+                        failures = 0
+                        self._maybe_save_journal()
+                        if segment[2] > segment[1]:
+                            break
+                if segment[2] == offset and not self._stop.is_set():
+                    raise IOError('la conexión se cerró sin enviar datos')
+            except Exception as e:
+                failures += 1
+                if failures > self.RETRIES:
+                    self.error = str(e)
+                    self._stop.set()
+                    break
+                self._stop.wait(min(2 ** failures, 10))
+        session.close()
+        self._worker_done()
+
+    def _maybe_save_journal(self):
+        now = time.monotonic()
+        with self._lock:
+            if now - self._last_journal < self.JOURNAL_INTERVAL:
+                return
+            self._last_journal = now
+        self._save_journal()
+
+    def _save_journal(self):
+        """Guarda el avance: primero los datos en disco, después el diario"""
+        with self._lock:
+            segments = [list(segment) for segment in self.segments]
+        if self._fd is not None:
+            (getattr(os, 'fdatasync', None) or os.fsync)(self._fd)
+        journal = {
+            'url': self._url, 'total': self.total, 'validator': self.validator,
+            'mime': self.mime, 'headers': self.headers, 'segments': segments,
+        }
+        atomic_write(self.journal_path(self._path), json.dumps(journal).encode('utf-8'))
+
+    def _worker_done(self):
+        with self._lock:
+            self._running -= 1
+            last = self._running == 0
+            if last:
+                self._finishing = True
+        if last:
+            self._finish()
+
+    def _finish(self):
+        """Cierra la ejecución cuando ya no queda ningún hilo trabajando.
+
+        Solo la llama quien puso _finishing bajo el bloqueo, así que nunca
+        corre dos veces a la vez. Si llega un cancel() mientras tanto, se
+        repite para borrar los archivos; si se pidió reanudar una pausa,
+        arranca la siguiente ejecución al terminar.
+        """
+        while True:
+            cancelled = self._cancelled
+            emit = self._close_run(cancelled)
+            with self._lock:
+                again = self._cancelled and not cancelled and self._state != self.DownloadCompleted
+                restart = not again and self._paused and self._resume_pending \
+                    and self._state == self.DownloadInProgress
+                self._resume_pending = False
+                self._finishing = again
+            if emit:
+                self.finished.emit()
+            if not again:
+                break
+        if restart:
+            self._paused = False
+            self.start()
+
+    def _close_run(self, cancelled):
+        """Cierra el archivo y fija el estado final; devuelve False si solo quedó en pausa"""
+        complete = all(next_byte > end for start, end, next_byte in self.segments or [])
+        try:
+            if self._fd is not None:
+                if not cancelled:
+                    self._save_journal()
+                os.close(self._fd)
+                self._fd = None
+            if cancelled:
+                for path in (self.part_path(self._path), self.journal_path(self._path)):
+                    if os.path.exists(path):
+                        os.remove(path)
+                self._state = self.DownloadCancelled
+            elif complete:
+                os.replace(self.part_path(self._path), self._path)
+                os.remove(self.journal_path(self._path))
+                self._state = self.DownloadCompleted
+            elif self._paused:
+                return False
+            else:
+                print(f"Descarga interrumpida ({self._path}): {self.error}")
+                self._state = self.DownloadInterrupted
+        except OSError as e:
+            print(f"Error al cerrar la descarga {self._path}: {e}")
+            self._state = self.DownloadInterrupted
+        return True
+
+class DownloadScheduler(QObject):
+    """Cola de descargas con prioridades y límites de concurrencia global y por host.
+
+    Las descargas de QtWebEngine se aceptan siempre (Qt 5 lo exige dentro
+    del manejador) y se pausan mientras esperan turno; las SegmentedDownload
+    no empiezan hasta que tienen hueco. pause_all/resume_all detienen y
+    reanudan toda la cola; resume_all solo reanuda lo que pausó pause_all,
+    no las descargas que el usuario pausó a mano.
+    """
+    MAX_ACTIVE = 3
+    MAX_PER_HOST = 2
+    stateChanged = pyqtSignal(str, str)  # clave, 'queued' | 'in_progress' | 'paused'
+
+    def __init__(self, max_active=MAX_ACTIVE, max_per_host=MAX_PER_HOST, parent=None):
+        super().__init__(parent)
+        self.max_active = max_active
+        self.max_per_host = max_per_host
+        self.paused = False
+        self.active = {}  # clave: (descarga, host)
+        self.queued = {}  # clave: (-prioridad, orden, descarga, host)
+        self._held = set()  # Claves en curso que pausó pause_all
+        self._order = 0
+
+    def set_limits(self, max_active, max_per_host):
+        self.max_active = max(1, max_active)
+        self.max_per_host = max(1, max_per_host)
+        self.pump()
+
+    def enqueue(self, key, download, priority=0):
+        """Añade una descarga a la cola y la arranca si hay hueco"""
+        host = download.url().host()
+        self._order += 1
+        self.queued[key] = (-priority, self._order, download, host)
+        self._hold(download)
+        self.stateChanged.emit(key, 'queued')
+        self.pump()
+
+    def prioritize(self, key):
+        """Pone una descarga en cola por delante de todas las demás"""
+        if key not in self.queued:
+            return
+        top = min((entry[0] for entry in self.queued.values()), default=0)
+        _, order, download, host = self.queued[key]
+        self.queued[key] = (top - 1, order, download, host)
+        self.pump()
+
+    def release(self, key):
+        """La descarga terminó (o se canceló): libera su hueco"""
+        self.active.pop(key, None)
+        self.queued.pop(key, None)
+        self._held.discard(key)
+        self.pump()
+
+    def pause_all(self):
+        self.paused = True
+        for key, (download, host) in self.active.items():
+            if download.isPaused():
+                continue  # Pausada por el usuario: debe seguir así al reanudar la cola
+            download.pause()
+            self._held.add(key)
+            self.stateChanged.emit(key, 'paused')
+
+    def resume_all(self):
+        self.paused = False
+        held, self._held = self._held, set()
+        for key in held:
+            if key in self.active:
+                self._start(self.active[key][0])
+                self.stateChanged.emit(key, 'in_progress')
+        self.pump()
+
+    def pump(self):
+        """Arranca, por orden de prioridad, todas las descargas en cola que quepan"""
+        if self.paused:
+            return
+        hosts = {}
+        for download, host in self.active.values():
+            hosts[host] = hosts.get(host, 0) + 1
+        for key, (_, _, download, host) in sorted(self.queued.items(), key=lambda item: item[1][:2]):
+            if len(self.active) >= self.max_active:
+                break
+            if hosts.get(host, 0) >= self.max_per_host:
+                continue
+            del self.queued[key]
+            self.active[key] = (download, host)
+            hosts[host] = hosts.get(host, 0) + 1
+            self._start(download)
+            self.stateChanged.emit(key, 'in_progress')
+
+    @staticmethod
+    def _hold(download):
+        # Una descarga de QtWebEngine ya aceptada sigue en curso: pausarla hasta su turno
+        if download.state() == download.DownloadInProgress and not download.isPaused():
+            download.pause()
+
+    @staticmethod
+    def _start(download):
+        if isinstance(download, SegmentedDownload) and download.state() == download.DownloadRequested:
+            download.start()  # Todavía sin empezar
+        else:
+            download.resume()
+
+class DownloadRules:
+    """Reglas de aceptación de descargas: deciden sin diálogos qué hacer con cada archivo.
+
+    Cada regla es un diccionario; todas sus condiciones presentes deben cumplirse:
+      mime        patrones tipo 'image/*' o 'application/pdf'
+      extensions  extensiones ('.iso', 'zip'), sin distinguir mayúsculas
+      origins     hosts con comodines ('*.example.org' también cubre example.org)
+      min_size_mb / max_size_mb  límites de tamaño; con tamaño desconocido no coinciden
+    y su 'action' es 'save' (guardar en 'folder' o en la carpeta de descargas),
+    'ask' (diálogos de siempre) o 'reject'. Gana la primera regla que coincide.
+    """
+
+    ACTIONS = ('save', 'ask', 'reject')
+    ACTION_LABELS = {'save': 'Guardar', 'ask': 'Preguntar', 'reject': 'Rechazar'}
+
+    def __init__(self, rules=None):
+        self.rules = [rule for rule in (self.normalize(r) for r in rules or []) if rule]
+        self._reserved = set()  # Rutas ya asignadas en esta sesión y aún sin archivo en disco
+
+    @classmethod
+    def normalize(cls, rule):
+        """Limpia una regla cargada de la configuración; None si no es válida"""
+        if not isinstance(rule, dict) or rule.get('action') not in cls.ACTIONS:
+            return None
+
+        def patterns(key):
+            value = rule.get(key) or []
+            if isinstance(value, str):
+                value = value.split(',')
+            return [v.strip().lower() for v in value if v and v.strip()]
+
+        clean = {'action': rule['action']}
+        for key in ('mime', 'origins'):
+            if patterns(key):
+                clean[key] = patterns(key)
+        extensions = ['.' + ext.lstrip('.') for ext in patterns('extensions')]
+        if extensions:
+            clean['extensions'] = extensions
+        for key in ('min_size_mb', 'max_size_mb'):
+            try:
+                if rule.get(key) not in (None, ''):
+                    clean[key] = float(rule[key])
+            except (TypeError, ValueError):
+                return None
+        if rule.get('folder'):
+            clean['folder'] = os.path.expanduser(str(rule['folder']))
+        return clean
+
+    @staticmethod
+    def _host_matches(host, pattern):
+        if fnmatch.fnmatchcase(host, pattern):
+            return True
+        return pattern.startswith('*.') and host == pattern[2:]
+
+    def matches(self, rule, mime, filename, host, size):
+        mime = (mime or '').lower()
+        host = (host or '').lower()
+        if 'mime' in rule and not any(fnmatch.fnmatchcase(mime, p) for p in rule['mime']):
+            return False
+        if 'extensions' in rule:
+            if os.path.splitext(filename or '')[1].lower() not in rule['extensions']:
+                return False
+        if 'origins' in rule and not any(self._host_matches(host, p) for p in rule['origins']):
+            return False
+        if 'min_size_mb' in rule or 'max_size_mb' in rule:
+            if size is None or size < 0:
+                return False
+            size_mb = size / (1024 * 1024)
+            if size_mb < rule.get('min_size_mb', 0):
+                return False
+            if 'max_size_mb' in rule and size_mb > rule['max_size_mb']:
+                return False
+        return True
+
+    def match(self, mime, filename, host, size):
+        """Devuelve la primera regla que coincide, o None"""
+        for rule in self.rules:
+            if self.matches(rule, mime, filename, host, size):
+                return rule
+        return None
+
+    def unique_path(self, folder, filename):
+        """Ruta libre en la carpeta: 'nombre (1).ext', 'nombre (2).ext'... Tiene en cuenta
+        archivos existentes, descargas segmentadas a medias (.part) y rutas ya repartidas."""
+        filename = os.path.basename(filename) or 'download'
+        stem, ext = os.path.splitext(filename)
+        candidate = os.path.join(folder, filename)
+        n = 1
+        while (os.path.exists(candidate) or os.path.exists(candidate + '.part')
+               or candidate in self._reserved):
+            candidate = os.path.join(folder, f'{stem} ({n}){ext}')
+            n += 1
+        self._reserved.add(candidate)
+        return candidate
+
+    @classmethod
+    def describe(cls, rule):
+        """Resumen legible de una regla para la configuración"""
+        conditions = []
+        if 'mime' in rule:
+            conditions.append('MIME ' + ', '.join(rule['mime']))
+        if 'extensions' in rule:
+            conditions.append(', '.join(rule['extensions']))
+        if 'origins' in rule:
+            conditions.append('desde ' + ', '.join(rule['origins']))
+        if 'min_size_mb' in rule:
+            conditions.append(f"≥ {rule['min_size_mb']:g} MB")
+        if 'max_size_mb' in rule:
+            conditions.append(f"≤ {rule['max_size_mb']:g} MB")
+        action = cls.ACTION_LABELS[rule['action']]
+        if rule['action'] == 'save' and rule.get('folder'):
+            action += f" en {rule['folder']}"
+        return f"{' y '.join(conditions) or 'Cualquier descarga'} → {action}"
+
+class DownloadStore:
+    """Historial de descargas en SQLite (modo WAL), con la misma estructura que HistoryStore"""
+
+    SCHEMA = '''
+        CREATE TABLE IF NOT EXISTS downloads (
+            id INTEGER PRIMARY KEY,
+            key TEXT NOT NULL UNIQUE,
+            path TEXT NOT NULL DEFAULT '',
+            url TEXT NOT NULL DEFAULT '',
+            mime TEXT NOT NULL DEFAULT '',
+            total_bytes INTEGER NOT NULL DEFAULT -1,
+            received_bytes INTEGER NOT NULL DEFAULT 0,
+            state TEXT NOT NULL,
+            started TEXT NOT NULL,
+            finished TEXT NOT NULL DEFAULT ''
+        );
+    '''
+    FIELDS = ('key', 'path', 'url', 'mime', 'total_bytes', 'received_bytes', 'state', 'started', 'finished')
+    ACTIVE_STATES = ('in_progress', 'paused', 'queued')
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.RLock()  # La conexión se comparte con el hilo de persistencia
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self.conn.executescript(self.SCHEMA)
+        # Las descargas que seguían activas al cerrar el navegador quedaron interrumpidas
+        with self.conn:
+            self.conn.execute(
+                f"UPDATE downloads SET state = 'interrupted' WHERE state IN ({','.join('?' * len(self.ACTIVE_STATES))})",
+                self.ACTIVE_STATES
+            )
+
+    def entries(self, limit):
+        """Devuelve las descargas en orden cronológico (las más recientes al final)"""
+        with self._lock:
+            rows = self.conn.execute(
+                f'SELECT {", ".join(self.FIELDS)} FROM downloads ORDER BY id DESC LIMIT ?', (limit,)
+            ).fetchall()
+        return [dict(zip(self.FIELDS, row)) for row in reversed(rows)]
+
+    def apply(self, ops):
+        """Aplica un lote de operaciones pendientes en una sola transacción:
+        ('upsert', entrada) o ('clear_finished',)"""
+        with self._lock, self.conn:
+            for op, *args in ops:
+                getattr(self, '_' + op)(*args)
+
+    def _upsert(self, entry):
+        values = [entry.get(field) for field in self.FIELDS]
+        self.conn.execute(f'''
+            INSERT INTO downloads ({", ".join(self.FIELDS)}) VALUES ({", ".join("?" * len(self.FIELDS))})
+            ON CONFLICT(key) DO UPDATE SET
+                {", ".join(f"{field} = excluded.{field}" for field in self.FIELDS[1:])}
+        ''', values)
+
+    def _clear_finished(self):
+        self.conn.execute(
+            f"DELETE FROM downloads WHERE state NOT IN ({','.join('?' * len(self.ACTIVE_STATES))})",
+            self.ACTIVE_STATES
+        )
+
+class DownloadModel(QAbstractTableModel):
+    """Modelo de tabla sobre el historial de descargas (sin widgets por fila)"""
+    EntryRole = Qt.UserRole + 1
+    COLUMNS = ('Nombre', 'Progreso', 'Tamaño', 'Fecha', 'Origen')
+    NAME, PROGRESS, SIZE, DATE, ORIGIN = range(5)
+    STATE_LABELS = {
+        'queued': 'En cola',
+        'in_progress': '',
+        'paused': 'Pausado',
+        'completed': 'Completado',
+        'cancelled': 'Cancelado',
+        'interrupted': 'Interrumpido',
+    }
+
+    def __init__(self, entries=None, parent=None):
+        super().__init__(parent)
+        self.set_entries(entries or [])
+
+    def set_entries(self, entries):
+        """entries en orden cronológico: la fila 0 es la más reciente"""
+        self.beginResetModel()
+        self._entries = list(entries)
+        self._positions = {entry['key']: i for i, entry in enumerate(self._entries)}
+        self.endResetModel()
+
+    def entries(self):
+        return self._entries
+
+    def entry(self, key):
+        position = self._positions.get(key)
+        return None if position is None else self._entries[position]
+
+    def row_of(self, key):
+        position = self._positions.get(key)
+        return None if position is None else len(self._entries) - 1 - position
+
+    def prepend(self, entry):
+        self.beginInsertRows(QModelIndex(), 0, 0)
+        self._positions[entry['key']] = len(self._entries)
+        self._entries.append(entry)
+        self.endInsertRows()
+
+    def entry_changed(self, key, first=NAME, last=ORIGIN):
+        row = self.row_of(key)
+        if row is not None:
+            self.dataChanged.emit(self.index(row, first), self.index(row, last))
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self._entries)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.COLUMNS)
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role == Qt.DisplayRole and orientation == Qt.Horizontal:
+            return self.COLUMNS[section]
+        return None
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid() or index.row() >= len(self._entries):
+            return None
+        entry = self._entries[len(self._entries) - 1 - index.row()]
+        if role == self.EntryRole:
+            return entry
+        column = index.column()
+        if role == Qt.ToolTipRole:
+            return entry['path'] if column == self.NAME else entry['url']
+        if role != Qt.DisplayRole:
+            return None
+        if column == self.NAME:
+            return os.path.basename(entry['path']) or entry['url']
+        if column == self.PROGRESS:
+            return self._progress_text(entry)
+        if column == self.SIZE:
+            total = entry.get('total_bytes', -1)
+            return DownloadProgressAggregator.format_bytes(total) if total > 0 else ''
+        if column == self.DATE:
+            return entry.get('started', '')[:16].replace('T', ' ')
+        if column == self.ORIGIN:
+            return urllib.parse.urlparse(entry['url']).netloc
+        return None
+
+    def _progress_text(self, entry):
+        """Texto de la columna de progreso; solo se calcula para las filas visibles"""
+        label = self.STATE_LABELS.get(entry['state'], entry['state'])
+        if entry['state'] != 'in_progress':
+            return label
+        fmt_bytes = DownloadProgressAggregator.format_bytes
+        received, total = entry.get('received_bytes', 0), entry.get('total_bytes', -1)
+        rate = entry.get('rate', 0.0)
+        if total > 0:
+            eta = DownloadProgressAggregator.format_eta(entry.get('eta'))
+            return f"{received * 100 // total}% - {fmt_bytes(received)}/{fmt_bytes(total)} - {fmt_bytes(rate)}/s - {eta}"
+        return f"{fmt_bytes(received)} - {fmt_bytes(rate)}/s"
+
+class DownloadItemDelegate(QStyledItemDelegate):
+    """Pinta la columna de progreso como una barra, con colores precalculados por estado"""
+    ROW_HEIGHT = 30
+    STATE_COLORS = {
+        'queued': QColor('#666666'),
+        'in_progress': QColor('#0a84ff'),
+        'paused': QColor('#0a84ff'),
+        'completed': QColor('#00aa00'),
+        'cancelled': QColor('#aa0000'),
+        'interrupted': QColor('#aaaa00'),
+    }
+
+    def paint(self, painter, option, index):
+        if index.column() != DownloadModel.PROGRESS:
+            super().paint(painter, option, index)
+            return
+        entry = index.data(DownloadModel.EntryRole)
+        painter.save()
+        if option.state & QStyle.State_Selected:
+            painter.fillRect(option.rect, QColor('#3a3a3a'))
+        rect = option.rect.adjusted(4, 4, -4, -4)
+        painter.setPen(QColor('#444'))
+        painter.setBrush(QColor('#2c2c2c'))
+        painter.drawRoundedRect(rect, 3, 3)
+        total = entry.get('total_bytes', -1)
+        if entry['state'] == 'completed':
+            fraction = 1.0
+        elif total > 0:
+            fraction = min(entry.get('received_bytes', 0) / total, 1.0)
+        else:
+            fraction = 0.0
+        if fraction > 0:
+            chunk = rect.adjusted(1, 1, -1, -1)
+            chunk.setWidth(int(chunk.width() * fraction))
+            painter.setPen(Qt.NoPen)
+            painter.setBrush(self.STATE_COLORS.get(entry['state'], self.STATE_COLORS['in_progress']))
+            painter.drawRoundedRect(chunk, 2, 2)
+        painter.setPen(QColor('#eee'))
+        metrics = painter.fontMetrics()
+        text = metrics.elidedText(index.data(Qt.DisplayRole) or '', Qt.ElideRight, rect.width() - 8)
+        painter.drawText(rect, Qt.AlignCenter, text)
+        painter.restore()
+
+    def sizeHint(self, option, index):
+        return QSize(super().sizeHint(option, index).width(), self.ROW_HEIGHT)
+
+class DownloadsWindow(QDialog):
+    """Ventana de descargas: historial persistente en una tabla virtualizada"""
+    HISTORY_LIMIT = 10000
+
+    def __init__(self, parent=None, store=None, persistence=None):
         super().__init__(parent)
         self.setWindowTitle('Descargas')
         self.setWindowModality(Qt.NonModal)
         self.setMinimumWidth(500)  # Ventana más ancha
         self.setMinimumHeight(200)  # Ventana más alta
-        self.resize(700, 400)      # Tamaño inicial preferido
+        self.resize(800, 400)      # Tamaño inicial preferido
+        self.store = store
+        self.persistence = persistence
+        self._pending_ops = []
+        self._live = {}  # clave: QWebEngineDownloadItem de las descargas de esta sesión
+        
+        # Cola con límites de concurrencia: decide cuándo empieza cada descarga
+        self.scheduler = DownloadScheduler(parent=self)
+        self.scheduler.stateChanged.connect(self._on_scheduler_state)
         
         # Aplicar tema oscuro
         self.setStyleSheet('''
@@ -366,10 +1962,17 @@ class DownloadsWindow(QDialog):
                 background-color: #232323;
                 color: #eee;
             }
-            QListWidget {
+            QTableView {
                 background-color: #2c2c2c;
                 border: 1px solid #444;
                 color: #eee;
+                selection-background-color: #3a3a3a;
+            }
+            QHeaderView::section {
+                background-color: #232323;
+                color: #aaa;
+                border: none;
+                padding: 4px;
             }
             QLabel {
                 color: #eee;
@@ -391,17 +1994,6 @@ class DownloadsWindow(QDialog):
                 background-color: #1c1c1c;
                 color: #666;
             }
-            QProgressBar {
-                border: 1px solid #444;
-                border-radius: 3px;
-                background-color: #2c2c2c;
-                color: #eee;
-                text-align: center;
-            }
-            QProgressBar::chunk {
-                background-color: #0a84ff;
-                border-radius: 2px;
-            }
         ''')
         
         # Layout principal
@@ -440,20 +2032,69 @@ class DownloadsWindow(QDialog):
         ''')
         self.clear_button.clicked.connect(self.clear_history)
         
+        # Resumen de las descargas activas (velocidad y tiempo restante totales)
+        self.summary_label = QLabel('')
+        self.summary_label.setStyleSheet('color: #aaa;')
+        
+        self.queue_button = QPushButton('Pausar cola')
+        self.queue_button.clicked.connect(self.toggle_queue)
+        
         top_bar.addWidget(title_label)
         top_bar.addStretch()
+        top_bar.addWidget(self.summary_label)
+        top_bar.addWidget(self.queue_button)
         top_bar.addWidget(self.clear_button)
         self.layout.addLayout(top_bar)
         
-        # Lista de descargas
-        self.list_widget = QListWidget()
-        self.list_widget.setSpacing(5)  # Espacio entre elementos
-        self.layout.addWidget(self.list_widget)
-        
-        self.download_items = {}  # id: widgets
+        # Tabla de descargas: solo se pintan las filas visibles
+        entries = []
+        if self.store is not None:
+            try:
+                entries = self.store.entries(self.HISTORY_LIMIT)
+            except Exception as e:
+                print(f"Error al cargar el historial de descargas: {e}")
+        self.model = DownloadModel(entries, self)
+        self.view = QTableView()
+        self.view.setModel(self.model)
+        self.view.setItemDelegate(DownloadItemDelegate(self.view))
+        self.view.setShowGrid(False)
+        self.view.setWordWrap(False)
+        self.view.setSelectionBehavior(QTableView.SelectRows)
+        self.view.setSelectionMode(QTableView.SingleSelection)
+        self.view.verticalHeader().hide()
+        self.view.verticalHeader().setSectionResizeMode(QHeaderView.Fixed)
+        self.view.verticalHeader().setDefaultSectionSize(DownloadItemDelegate.ROW_HEIGHT)
+        header = self.view.horizontalHeader()
+        header.setSectionResizeMode(DownloadModel.NAME, QHeaderView.Stretch)
+        header.resizeSection(DownloadModel.PROGRESS, 280)
+        self.view.doubleClicked.connect(self.open_file)
+        self.view.setContextMenuPolicy(Qt.CustomContextMenu)
+        self.view.customContextMenuRequested.connect(self.show_context_menu)
+        self.view.selectionModel().currentRowChanged.connect(lambda *_: self._update_buttons())
+        self.layout.addWidget(self.view)
+        
+        # Controles de la descarga seleccionada
+        controls = QHBoxLayout()
+        self.btn_pause = QPushButton('Pausar')
+        self.btn_resume = QPushButton('Continuar')
+        self.btn_cancel = QPushButton('Cancelar')
+        self.btn_folder = QPushButton('Abrir carpeta')
+        self.btn_pause.clicked.connect(lambda: self._control('pause'))
+        self.btn_resume.clicked.connect(lambda: self._control('resume'))
+        self.btn_cancel.clicked.connect(lambda: self._control('cancel'))
+        self.btn_folder.clicked.connect(self.open_folder)
+        controls.addStretch()
+        for button in (self.btn_pause, self.btn_resume, self.btn_cancel, self.btn_folder):
+            controls.addWidget(button)
+        self.layout.addLayout(controls)
+        self._update_buttons()
+        
+        # Un solo temporizador actualiza el progreso de todas las descargas
+        self.progress_aggregator = DownloadProgressAggregator(self)
+        self.progress_aggregator.sampled.connect(self._on_progress_sampled)
 
     def clear_history(self):
-        """Limpia el historial de descargas"""
+        """Limpia el historial de descargas (las activas se conservan)"""
         from PyQt5.QtWidgets import QMessageBox
         
         # Confirmar con el usuario
@@ -466,178 +2107,1247 @@ class DownloadsWindow(QDialog):
         )
         
         if reply == QMessageBox.Yes:
-            # Eliminar todos los items
-            self.list_widget.clear()
-            # Limpiar el diccionario de items
-            self.download_items.clear()
-            
-    def add_download(self, qdownload):
-        # Crear el widget contenedor con fondo oscuro
-        widget = QWidget()
-        widget.setStyleSheet('QWidget { background-color: #2c2c2c; border-radius: 4px; margin: 2px; }')
-        
-        # Layout horizontal con márgenes para mejor apariencia
-        hbox = QHBoxLayout(widget)
-        hbox.setContentsMargins(15, 10, 15, 10)
-        hbox.setSpacing(15)
-        
-        # Etiqueta del archivo con nombre y estado
-        filename = qdownload.downloadFileName()
-        # Truncar el nombre si es muy largo (máximo 40 caracteres)
-        if len(filename) > 40:
-            # Separar el nombre y la extensión
-            import os
-            name, ext = os.path.splitext(filename)
-            # Truncar el nombre dejando espacio para la extensión y los ...
-            truncated = name[:37 - len(ext)] + "..." + ext
-            display_name = truncated
+            active = DownloadStore.ACTIVE_STATES
+            self.model.set_entries([e for e in self.model.entries() if e['state'] in active])
+            self._queue_op('clear_finished')
+            self._update_buttons()
+
+    def _queue_op(self, *op):
+        """Encola una operación del almacén para el próximo volcado"""
+        if self.store is None:
+            return
+        self._pending_ops.append(op)
+        if self.persistence is not None:
+            self.persistence.mark_dirty('downloads', self._snapshot_ops)
         else:
-            display_name = filename
+            ops, self._pending_ops = self._pending_ops, []
+            self.store.apply(ops)
+
+    def _snapshot_ops(self):
+        ops, self._pending_ops = self._pending_ops, []
+        if not ops:
+            return None
+        store = self.store
+        return lambda: store.apply(ops)
+
+    def _save_entry(self, entry):
+        self._queue_op('upsert', {field: entry.get(field) for field in DownloadStore.FIELDS})
             
-        label = QLabel(display_name)
-        label.setStyleSheet('''
-            color: #eee;
-            font-size: 12px;
-        ''')
-        # Configurar tooltip para mostrar el nombre completo al pasar el mouse
-        label.setToolTip(filename)
-        label.setMinimumWidth(250)  # Más espacio para el nombre
-        label.setMaximumWidth(400)  # Limitar el ancho máximo
-        
-        # Barra de progreso con estilo mejorado
-        progress = QProgressBar()
-        progress.setMinimumWidth(250)
-        progress.setMaximumWidth(350)
-        progress.setMinimumHeight(20)  # Altura fija para mejor apariencia
-        progress.setValue(0)
-        progress.setFormat("%p% - %v/%m bytes")  # Mostrar porcentaje y bytes
-        progress.setStyleSheet("""
-            QProgressBar {
-                border: 1px solid #444;
-                border-radius: 3px;
-                text-align: center;
-                color: #eee;
-                background-color: #2c2c2c;
-            }
-            QProgressBar::chunk {
-                background-color: #0a84ff;
-                border-radius: 2px;
-            }
-        """)
-        
-        # Botones de control
-        btn_pause = QPushButton('Pausar')
-        btn_resume = QPushButton('Continuar')
-        btn_cancel = QPushButton('Cancelar')
-        
-        # Estilo para los botones
-        button_style = """
-            QPushButton {
-                background-color: #2c2c2c;
-                color: #eee;
-                border: 1px solid #444;
-                padding: 5px 15px;
-                border-radius: 3px;
-            }
-            QPushButton:hover {
-                background-color: #3a3a3a;
-            }
-            QPushButton:pressed {
-                background-color: #444;
-            }
-            QPushButton:disabled {
-                background-color: #1c1c1c;
-                color: #666;
-            }
+    def add_download(self, qdownload, key=None, priority=0):
+        """Registra una descarga de QtWebEngine o SegmentedDownload.
+
+        Con key, la descarga continúa una entrada existente del historial
+        (una descarga por rangos reanudada desde su diario).
         """
-        btn_pause.setStyleSheet(button_style)
-        btn_resume.setStyleSheet(button_style)
-        btn_cancel.setStyleSheet(button_style)
-        
-        # Agregar widgets al layout
-        hbox.addWidget(label, stretch=1)  # La etiqueta se estirará
-        hbox.addWidget(progress)
-        hbox.addWidget(btn_pause)
-        hbox.addWidget(btn_resume)
-        hbox.addWidget(btn_cancel)
-        
-        # Crear y agregar item a la lista
-        item = QListWidgetItem()
-        self.list_widget.addItem(item)
-        self.list_widget.setItemWidget(item, widget)
-        item.setSizeHint(widget.sizeHint())
-        
-        # Conectar señales de control y manejar estados
-        def on_pause_clicked():
-            qdownload.pause()
-            btn_pause.setEnabled(False)
-            btn_resume.setEnabled(True)
-            label.setText(f"{qdownload.downloadFileName()} (Pausado)")
-            label.setStyleSheet('color: #ffd93d;')  # Amarillo para pausado
-            
-        def on_resume_clicked():
-            qdownload.resume()
-            btn_pause.setEnabled(True)
-            btn_resume.setEnabled(False)
-            label.setText(qdownload.downloadFileName())
-            label.setStyleSheet('color: #eee;')  # Color normal al reanudar
-            
-        btn_pause.clicked.connect(on_pause_clicked)
-        btn_resume.clicked.connect(on_resume_clicked)
-        btn_cancel.clicked.connect(qdownload.cancel)
-        
-        # Actualizar progreso y estado de botones
-        def on_progress(received, total):
-            if total > 0:
-                percent = int(received * 100 / total)
-                progress.setValue(percent)
-                # Mostrar información detallada del progreso
-                mb_received = received / 1024 / 1024  # Convertir a MB
-                mb_total = total / 1024 / 1024
-                progress.setFormat(f"{percent}% - {mb_received:.1f}MB/{mb_total:.1f}MB")
-            else:
-                progress.setValue(0)
-                progress.setFormat("Descargando...")
-            # Asegurarse de que el botón de pausa esté habilitado durante la descarga
-            if qdownload.state() == qdownload.DownloadInProgress:
-                btn_pause.setEnabled(True)
-                btn_resume.setEnabled(False)
+        from datetime import datetime
+        entry = self.model.entry(key) if key else None
+        if entry is None:
+            key = uuid.uuid4().hex
+            entry = {
+                'key': key,
+                'path': qdownload.path(),
+                'url': qdownload.url().toString(),
+                'mime': qdownload.mimeType(),
+                'total_bytes': qdownload.totalBytes(),
+                'received_bytes': qdownload.receivedBytes(),
+                'state': 'in_progress',
+                'started': datetime.now().isoformat(),
+                'finished': '',
+            }
+            self.model.prepend(entry)
+            self.view.selectRow(0)
+        else:
+            entry.update(state='queued', finished='')
+            self.model.entry_changed(key)
+        self._live[key] = qdownload
+        self._save_entry(entry)
         
         # Estado final
         def on_finished():
-            if qdownload.state() == qdownload.DownloadCompleted:
-                label.setText(f"{qdownload.downloadFileName()} (Completado)")
-                label.setStyleSheet('color: #00ff00;')  # Verde para descargas completadas
-                progress.setStyleSheet(progress.styleSheet() + "QProgressBar::chunk { background-color: #00aa00; }")
-            elif qdownload.state() == qdownload.DownloadCancelled:
-                label.setText(f"{qdownload.downloadFileName()} (Cancelado)")
-                label.setStyleSheet('color: #ff6b6b;')  # Rojo para descargas canceladas
-                progress.setStyleSheet(progress.styleSheet() + "QProgressBar::chunk { background-color: #aa0000; }")
-            elif qdownload.state() == qdownload.DownloadInterrupted:
-                label.setText(f"{qdownload.downloadFileName()} (Interrumpido)")
-                label.setStyleSheet('color: #ffd93d;')  # Amarillo para descargas interrumpidas
-                progress.setStyleSheet(progress.styleSheet() + "QProgressBar::chunk { background-color: #aaaa00; }")
-            btn_pause.setEnabled(False)
-            btn_resume.setEnabled(False)
-            btn_cancel.setEnabled(False)
-        
-        # Conectar señales principales
-        qdownload.downloadProgress.connect(on_progress)
+            self.progress_aggregator.untrack(key)
+            self._live.pop(key, None)
+            self.scheduler.release(key)
+            states = {
+                qdownload.DownloadCompleted: 'completed',
+                qdownload.DownloadCancelled: 'cancelled',
+                qdownload.DownloadInterrupted: 'interrupted',
+            }
+            entry['state'] = states.get(qdownload.state(), 'interrupted')
+            entry['received_bytes'] = qdownload.receivedBytes()
+            entry['total_bytes'] = qdownload.totalBytes()
+            entry['path'] = qdownload.path()
+            entry['finished'] = datetime.now().isoformat()
+            self._save_entry(entry)
+            self.model.entry_changed(key)
+            self._update_buttons()
+        
+        # El progreso lo muestrea el agregador; aquí solo el estado final
         qdownload.finished.connect(on_finished)
+        self.progress_aggregator.track(key, qdownload)
+        # La cola decide cuándo empieza (la descarga puede quedar en espera)
+        self.scheduler.enqueue(key, qdownload, priority)
+        return key
+
+    def _on_scheduler_state(self, key, state):
+        entry = self.model.entry(key)
+        if entry is None or entry['state'] == state:
+            return
+        entry['state'] = state
+        self._save_entry(entry)
+        self.model.entry_changed(key)
+        self._update_buttons()
+        self._update_summary()
+
+    def toggle_queue(self):
+        """Pausa o reanuda toda la cola de descargas"""
+        if self.scheduler.paused:
+            self.scheduler.resume_all()
+            self.queue_button.setText('Pausar cola')
+        else:
+            self.scheduler.pause_all()
+            self.queue_button.setText('Reanudar cola')
+        self._update_summary()
+
+    def show_context_menu(self, pos):
+        index = self.view.indexAt(pos)
+        entry = index.data(DownloadModel.EntryRole) if index.isValid() else None
+        if entry is None:
+            return
+        menu = QMenu(self)
+        if entry['key'] in self.scheduler.queued:
+            menu.addAction('Descargar a continuación', lambda: self.scheduler.prioritize(entry['key']))
+        if entry['path']:
+            menu.addAction('Abrir carpeta', self.open_folder)
+        if not menu.isEmpty():
+            menu.exec_(self.view.viewport().mapToGlobal(pos))
+
+    def _selected_entry(self):
+        index = self.view.currentIndex()
+        return index.data(DownloadModel.EntryRole) if index.isValid() else None
+
+    def _update_buttons(self):
+        entry = self._selected_entry()
+        live = entry is not None and entry['key'] in self._live
+        # Las descargas por rangos interrumpidas se pueden continuar desde su diario
+        resumable = (
+            entry is not None and not live and entry['state'] in ('interrupted', 'paused')
+            and SegmentedDownload.can_resume(entry['path'])
+        )
+        active = live and entry['key'] in self.scheduler.active and not self.scheduler.paused
+        self.btn_pause.setEnabled(active and entry['state'] == 'in_progress')
+        self.btn_resume.setEnabled((active and entry['state'] == 'paused') or resumable)
+        self.btn_cancel.setEnabled(live)
+        self.btn_folder.setEnabled(entry is not None and bool(entry['path']))
+
+    def _control(self, action):
+        """Pausa, reanuda o cancela la descarga seleccionada"""
+        entry = self._selected_entry()
+        download = self._live.get(entry['key']) if entry else None
+        if download is None:
+            if action == 'resume' and entry is not None:
+                self.resume_from_journal(entry)
+            return
+        getattr(download, action)()
+        if action in ('pause', 'resume'):
+            entry['state'] = 'paused' if action == 'pause' else 'in_progress'
+            entry['received_bytes'] = download.receivedBytes()
+            self._save_entry(entry)
+            self.model.entry_changed(entry['key'])
+        self._update_buttons()
+
+    def resume_from_journal(self, entry):
+        """Continúa una descarga por rangos de una sesión anterior"""
+        download = SegmentedDownload.from_journal(entry['path'], parent=self)
+        if download is None:
+            return
+        self.add_download(download, entry['key'])
+        self._update_buttons()
+
+    def open_file(self, index):
+        entry = index.data(DownloadModel.EntryRole)
+        if entry and entry['state'] == 'completed' and os.path.exists(entry['path']):
+            from PyQt5.QtGui import QDesktopServices
+            QDesktopServices.openUrl(QUrl.fromLocalFile(entry['path']))
+
+    def open_folder(self):
+        entry = self._selected_entry()
+        if entry and entry['path']:
+            from PyQt5.QtGui import QDesktopServices
+            QDesktopServices.openUrl(QUrl.fromLocalFile(os.path.dirname(entry['path'])))
+
+    def _on_progress_sampled(self, rows, totals):
+        """Actualiza el modelo una vez por muestra; la vista repinta solo las filas visibles"""
+        for key, received, total, rate, eta in rows:
+            entry = self.model.entry(key)
+            if entry is None:
+                continue
+            progress = (received, total, int(rate), eta and int(eta))
+            if progress == entry.get('_sampled'):
+                continue
+            entry['_sampled'] = progress
+            entry.update(received_bytes=received, total_bytes=total, rate=rate, eta=eta)
+            self.model.entry_changed(key, DownloadModel.PROGRESS, DownloadModel.SIZE)
+        self._update_summary(totals)
+
+    def _update_summary(self, totals=None):
+        """Resumen de la cola: activas, en espera, velocidad y tiempo restante totales"""
+        if totals is not None:
+            self._last_totals = totals
+        totals = getattr(self, '_last_totals', None) or {'rate': 0.0, 'eta': None}
+        active, queued = len(self.scheduler.active), len(self.scheduler.queued)
+        if not (active or queued):
+            self.summary_label.setText('')
+            return
+        fmt_bytes = DownloadProgressAggregator.format_bytes
+        fmt_eta = DownloadProgressAggregator.format_eta
+        text = f"{active} activa(s), {queued} en cola"
+        if self.scheduler.paused:
+            text += " (en pausa)"
+        else:
+            text += f" - {fmt_bytes(totals['rate'])}/s - {fmt_eta(totals['eta'])}"
+        self.summary_label.setText(text)
+
+class LocalSuggestionProvider:
+    """Sugerencias locales del historial y marcadores ordenadas por frecencia.
+
+    Mantiene una lista ordenada de claves (URL sin esquema ni "www." y
+    tokens del título) para búsquedas por prefijo con bisect. Las entradas
+    son referencias a los diccionarios de BrowserContext.history, así que las
+    visitas nuevas se reflejan en la puntuación sin reconstruir el índice.
+    """
+    BOOKMARK_BONUS = 75
+    # (antigüedad máxima en días, peso) al estilo de la frecencia de Firefox
+    RECENCY_BUCKETS = ((4, 100), (14, 70), (31, 50), (90, 30))
+    OLD_WEIGHT = 10
+
+    def __init__(self, history=(), bookmarks=()):
+        self.build(history, bookmarks)
+
+    @staticmethod
+    def _strip_url(url):
+        url = url.lower()
+        for prefix in ('https://', 'http://', 'www.'):
+            if url.startswith(prefix):
+                url = url[len(prefix):]
+        return url
+
+    def build(self, history, bookmarks):
+        self._candidates = {}  # url: candidato
+        self._keys = []  # (clave, url) ordenado
+        for entry in history:
+            self._add(entry, bookmarked=False)
+        for bookmark in bookmarks:
+            if not isinstance(bookmark, dict) or not bookmark.get('url'):
+                continue
+            candidate = self._candidates.get(bookmark['url'])
+            if candidate:
+                candidate['bookmarked'] = True
+            else:
+                self._add(bookmark, bookmarked=True)
+        self._keys.sort()
+
+    def _add(self, entry, bookmarked, keep_sorted=False):
+        url = entry['url']
+        tokens = normalize_search_text(f"{entry.get('title', '')} {url}").split()
+        self._candidates[url] = {
+            'entry': entry, 'bookmarked': bookmarked, 'tokens': tokens, 'ts': None, 'epoch': 0
+        }
+        for key in [self._strip_url(url)] + tokens:
+            if keep_sorted:
+                bisect.insort(self._keys, (key, url))
+            else:
+                self._keys.append((key, url))
+
+    def add_entry(self, entry):
+        """Registra una entrada de historial nueva (O(log n) por clave)"""
+        candidate = self._candidates.get(entry['url'])
+        if candidate is None:
+            self._add(entry, bookmarked=False, keep_sorted=True)
+        elif candidate['entry'] is not entry:
+            # Marcador sin historial: puntuar desde ahora con sus visitas
+            candidate.update(entry=entry, ts=None, epoch=0)
+
+    def remove_entry(self, url):
+        """Quita una entrada expulsada del historial sin reconstruir el índice"""
+        candidate = self._candidates.get(url)
+        if candidate is None:
+            return
+        if candidate['bookmarked']:
+            # Sigue siendo un marcador: mismas claves, sin visitas
+            entry = candidate['entry']
+            candidate.update(entry={'url': url, 'title': entry.get('title', '')}, ts=None, epoch=0)
+            return
+        del self._candidates[url]
+        for key in [self._strip_url(url)] + candidate['tokens']:
+            i = bisect.bisect_left(self._keys, (key, url))
+            if i < len(self._keys) and self._keys[i] == (key, url):
+                del self._keys[i]
+
+    def _score(self, candidate, now):
+        from datetime import datetime
+        entry = candidate['entry']
+        timestamp = entry.get('timestamp')
+        if timestamp and candidate['ts'] != timestamp:
+            try:
+                candidate['epoch'] = datetime.fromisoformat(timestamp).timestamp()
+            except ValueError:
+                candidate['epoch'] = 0
+            candidate['ts'] = timestamp
+        age_days = (now - candidate['epoch']) / 86400
+        weight = self.OLD_WEIGHT
+        for max_age, bucket_weight in self.RECENCY_BUCKETS:
+            if age_days <= max_age:
+                weight = bucket_weight
+                break
+        score = entry.get('visit_count', 0) * weight if timestamp else 0
+        if candidate['bookmarked']:
+            score += self.BOOKMARK_BONUS
+        return score
+
+    def _prefix_urls(self, key):
+        """Todas las URLs con alguna clave que empieza por key (se puntúan todas)"""
+        start = bisect.bisect_left(self._keys, (key, ''))
+        end = bisect.bisect_left(self._keys, (key + '\U0010ffff', ''), start)
+        return {url for _key, url in self._keys[start:end]}
+
+    def query(self, text, limit=5):
+        """Devuelve [{'title', 'url'}] ordenados por frecencia"""
+        text = text.strip()
+        terms = normalize_search_text(text).split()
+        if not text or not terms:
+            return []
+        # Buscar por la URL escrita y por el término más selectivo (el más largo)
+        urls = self._prefix_urls(self._strip_url(text)) | self._prefix_urls(max(terms, key=len))
+        matches = []
+        for url in urls:
+            candidate = self._candidates[url]
+            if len(terms) > 1 and not all(
+                any(token.startswith(term) for token in candidate['tokens']) for term in terms
+            ):
+                continue
+            matches.append(candidate)
+        now = time.time()
+        best = heapq.nlargest(limit, matches, key=lambda c: self._score(c, now))
+        return [
+            {'title': c['entry'].get('title') or c['entry']['url'], 'url': c['entry']['url']}
+            for c in best
+        ]
+
+class SuggestionService(QObject):
+    """Sugerencias remotas con un único hilo, sesión HTTP persistente y caché LRU con TTL.
+
+    Cada petición lleva la versión de la consulta; las peticiones que una
+    versión más nueva deja obsoletas se cancelan si aún no empezaron y se
+    abortan antes de leer la respuesta si ya estaban en curso.
+
+    Si la consulta amplía otra ya en caché ("pyth" -> "pytho"), se filtran
+    localmente esas frases y solo se pide a la red cuando quedan menos de
+    reuse_threshold.
+    """
+    ready = pyqtSignal(int, list)  # versión, frases
+    failed = pyqtSignal(int)
+
+    def __init__(self, endpoint='https://duckduckgo.com/ac/', cache_size=256, ttl=300,
+                 timeout=2, reuse_threshold=3, parent=None):
+        super().__init__(parent)
+        self.endpoint = endpoint
+        self.reuse_threshold = reuse_threshold
+        self.cache_size = cache_size
+        self.ttl = ttl
+        self.timeout = timeout
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='fennex-suggest')
+        self._session = None  # Se crea en el hilo de trabajo (importa requests)
+        self._cache = OrderedDict()  # consulta: (expira, frases)
+        self._lock = threading.Lock()
+        self._pending = None
+        self._version = 0
+
+    @staticmethod
+    def cache_key(query):
+        return query.strip().lower()
+
+    def cached(self, query):
+        """Devuelve las frases en caché para la consulta o None"""
+        return self._cache_lookup(self.cache_key(query))
+
+    def _cache_lookup(self, key):
+        with self._lock:
+            hit = self._cache.get(key)
+            if hit is None:
+                return None
+            expires, phrases = hit
+            if expires < time.monotonic():
+                del self._cache[key]
+                return None
+            self._cache.move_to_end(key)
+            return phrases
+
+    def _store(self, query, phrases):
+        with self._lock:
+            self._cache[self.cache_key(query)] = (time.monotonic() + self.ttl, phrases)
+            self._cache.move_to_end(self.cache_key(query))
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+    def extended_from_cache(self, query):
+        """Filtra las frases del prefijo más largo en caché del que query es una extensión"""
+        key = self.cache_key(query)
+        for end in range(len(key) - 1, 0, -1):
+            phrases = self._cache_lookup(key[:end])
+            if phrases is not None:
+                return [phrase for phrase in phrases if phrase.lower().startswith(key)]
+        return None
+
+    def request(self, query, version):
+        """Pide sugerencias; el resultado llega por ready/failed con la misma versión"""
+        self.cancel(version)
+        phrases = self.cached(query)
+        if phrases is None:
+            phrases = self.extended_from_cache(query)
+            if phrases is not None and len(phrases) < self.reuse_threshold:
+                phrases = None  # Muy pocas: merece la pena consultar a la red
+        if phrases is not None:
+            self.ready.emit(version, phrases)
+            return
+        self._pending = self._executor.submit(self._fetch, query, version)
+
+    def cancel(self, version):
+        """Invalida todo lo anterior a version"""
+        self._version = version
+        if self._pending is not None:
+            self._pending.cancel()  # Solo tiene efecto si aún no empezó
+            self._pending = None
+
+    def _get_session(self):
+        if self._session is None:
+            import requests
+            self._session = requests.Session()
+            self._session.headers['Accept'] = 'application/json'
+        return self._session
+
+    def _fetch(self, query, version):
+        if version != self._version:
+            return
+        try:
+            response = self._get_session().get(
+                self.endpoint, params={'q': query}, timeout=self.timeout, stream=True
+            )
+            with response:
+                if version != self._version:
+                    return  # Obsoleta: no leer el cuerpo
+                data = response.json()
+            phrases = [item['phrase'] for item in data if isinstance(item, dict) and 'phrase' in item]
+            self._store(query, phrases)
+            if version == self._version:
+                self.ready.emit(version, phrases)
+        except Exception:
+            if version == self._version:
+                self.failed.emit(version)
+
+    def shutdown(self):
+        self.cancel(-1)
+        self._executor.shutdown(wait=False)
+        if self._session is not None:
+            self._session.close()
+
+class FilterEngine:
+    """Motor de bloqueo compilado a partir de listas de filtros estilo EasyList.
+
+    Las reglas "||dominio^" van a una tabla hash de dominios que se consulta
+    por cada sufijo del host. El resto se indexa por su token alfanumérico
+    más largo, de modo que cada petición solo evalúa las expresiones
+    regulares de los tokens que aparecen en su URL. Las reglas compiladas
+    se serializan a una caché binaria para no reanalizar las listas en
+    cada arranque. Las reglas cosméticas y las opciones no soportadas se
+    ignoran.
+    """
+    FORMAT_VERSION = 2
+    RESOURCE_TYPES = {
+        'script', 'image', 'stylesheet', 'object', 'xmlhttprequest', 'subdocument',
+        'font', 'media', 'ping', 'websocket', 'other',
+    }
+    TOKEN_RE = re.compile(r'[a-z0-9%]{3,}')
+    _SEPARATOR = r'(?:[^a-z0-9_\-.%]|$)'
+
+    def __init__(self):
+        # Para bloqueos y excepciones: dominio -> [opciones], token -> [reglas], reglas sin token
+        self.block = ({}, {}, [])
+        self.allow = ({}, {}, [])
+        self.rule_count = 0
+        self._compiled = {}
+
+    # --- Análisis de listas ---
+
+    @classmethod
+    def from_files(cls, paths, cache_dir=None):
+        """Carga las listas, usando la caché binaria si está al día"""
+        cache_file = None
+        if cache_dir:
+            digest = hashlib.sha1(str(cls.FORMAT_VERSION).encode())
+            for path in sorted(paths):
+                stat = os.stat(path)
+                digest.update(f'{path}:{stat.st_mtime_ns}:{stat.st_size}'.encode())
+            cache_file = os.path.join(cache_dir, f'filters-{digest.hexdigest()[:16]}.bin')
+            try:
+                with open(cache_file, 'rb') as f:
+                    engine = cls()
+                    engine.block, engine.allow, engine.rule_count = pickle.load(f)
+                    return engine
+            except (OSError, pickle.PickleError, EOFError, ValueError):
+                pass
+        engine = cls()
+        for path in paths:
+            with open(path, 'r', encoding='utf-8', errors='replace') as f:
+                for line in f:
+                    engine.add_rule(line)
+        if cache_file:
+            try:
+                os.makedirs(cache_dir, exist_ok=True)
+                for old in os.listdir(cache_dir):
+                    if old.startswith('filters-') and old.endswith('.bin'):
+                        os.remove(os.path.join(cache_dir, old))
+                atomic_write(cache_file, pickle.dumps((engine.block, engine.allow, engine.rule_count)))
+            except OSError as e:
+                print(f"No se pudo guardar la caché de filtros: {e}")
+        return engine
+
+    def add_rule(self, line):
+        """Añade una regla; devuelve False si se ignora"""
+        line = line.strip()
+        if not line or line.startswith(('!', '[')) or '##' in line or '#@#' in line or '#?#' in line:
+            return False
+        target = self.block
+        if line.startswith('@@'):
+            target = self.allow
+            line = line[2:]
+        pattern, options = line, None
+        if '$' in line and not line.startswith('/'):
+            pattern, _, option_text = line.rpartition('$')
+            options = self._parse_options(option_text)
+            if options is None:
+                return False
+        pattern = pattern.lower()
+        if not pattern or pattern in ('*', '|', '||'):
+            return False
+        domains, tokens, generic = target
+
+        # Dominio puro: ||ejemplo.com^
+        match = re.fullmatch(r'\|\|([a-z0-9.-]+)\^?', pattern)
+        if match:
+            domains.setdefault(match.group(1), []).append(options)
+        else:
+            regex = self._to_regex(pattern)
+            token = self._best_token(pattern)
+            rule = (regex, options)
+            if token:
+                tokens.setdefault(token, []).append(rule)
+            else:
+                generic.append(rule)
+        self.rule_count += 1
+        return True
+
+    def _parse_options(self, text):
+        """Devuelve (tercero, tipos, dominios incluidos, excluidos) o None si no es soportada"""
+        third_party = None
+        types, excluded_types = set(), set()
+        include, exclude = (), ()
+        for option in text.lower().split(','):
+            negated = option.startswith('~')
+            name = option.lstrip('~')
+            if name == 'third-party':
+                third_party = not negated
+            elif name in self.RESOURCE_TYPES:
+                (excluded_types if negated else types).add(name)
+            elif name.startswith('domain='):
+                values = name[len('domain='):].split('|')
+                include = tuple(v for v in values if v and not v.startswith('~'))
+                exclude = tuple(v[1:] for v in values if v.startswith('~'))
+            else:
+                return None  # popup, csp, redirect, match-case...
+        if excluded_types and not types:
+            types = self.RESOURCE_TYPES - excluded_types
+        return (third_party, frozenset(types) or None, include, exclude)
+
+    @classmethod
+    def _to_regex(cls, pattern):
+        if len(pattern) > 1 and pattern.startswith('/') and pattern.endswith('/'):
+            return pattern[1:-1]
+        prefix = suffix = ''
+        if pattern.startswith('||'):
+            prefix = r'^[a-z][a-z0-9+.-]*://(?:[^/?#]*\.)?'
+            pattern = pattern[2:]
+        elif pattern.startswith('|'):
+            prefix = '^'
+            pattern = pattern[1:]
+        if pattern.endswith('|'):
+            suffix = '$'
+            pattern = pattern[:-1]
+        body = ''.join(
+            '.*' if c == '*' else cls._SEPARATOR if c == '^' else re.escape(c)
+            for c in pattern
+        )
+        return prefix + body + suffix
+
+    @staticmethod
+    def _best_token(pattern):
+        """Token alfanumérico más largo delimitado por ambos lados.
+
+        En un extremo sin ancla o junto a un comodín el token de la URL puede
+        ser más largo ('adserver' en '/myadservers.js'), así que solo se
+        indexan tokens rodeados de separadores, '^', '|' o '||'.
+        """
+        if pattern.startswith('/') and pattern.endswith('/'):
+            return None
+        best = None
+        for match in re.finditer(r'[a-z0-9%]{3,}', pattern):
+            start, end = match.span()
+            if start == 0 or pattern[start - 1] == '*' or end == len(pattern) or pattern[end] == '*':
+                continue
+            if best is None or len(match.group()) > len(best):
+                best = match.group()
+        return best
+
+    # --- Consulta ---
+
+    @staticmethod
+    def _base_domain(host):
+        return '.'.join(host.rsplit('.', 2)[-2:])
+
+    @staticmethod
+    def _domain_in(host, domains):
+        return any(host == d or host.endswith('.' + d) for d in domains)
+
+    def _options_match(self, options, third_party, resource_type, source_host):
+        if options is None:
+            return True
+        rule_third_party, types, include, exclude = options
+        if rule_third_party is not None and rule_third_party != third_party:
+            return False
+        if types is not None and resource_type not in types:
+            return False
+        if include and not self._domain_in(source_host, include):
+            return False
+        if exclude and self._domain_in(source_host, exclude):
+            return False
+        return True
+
+    def _regex(self, source):
+        compiled = self._compiled.get(source)
+        if compiled is None:
+            try:
+                compiled = re.compile(source)
+            except re.error:
+                compiled = re.compile(r'(?!)')  # Nunca coincide
+            self._compiled[source] = compiled
+        return compiled
+
+    def _matches(self, table, url, host, third_party, resource_type, source_host):
+        domains, tokens, generic = table
+        labels = host.split('.')
+        for i in range(len(labels) - 1):
+            for options in domains.get('.'.join(labels[i:]), ()):
+                if self._options_match(options, third_party, resource_type, source_host):
+                    return True
+        for token in set(self.TOKEN_RE.findall(url)):
+            for regex, options in tokens.get(token, ()):
+                if self._options_match(options, third_party, resource_type, source_host) \
+                        and self._regex(regex).search(url):
+                    return True
+        for regex, options in generic:
+            if self._options_match(options, third_party, resource_type, source_host) \
+                    and self._regex(regex).search(url):
+                return True
+        return False
+
+    def should_block(self, url, host, source_host='', resource_type='other'):
+        """Decide si bloquear una petición (url en cualquier caja; host sin puerto)"""
+        url = url.lower()
+        host = host.lower()
+        source_host = (source_host or host).lower()
+        third_party = self._base_domain(host) != self._base_domain(source_host)
+        args = (url, host, third_party, resource_type, source_host)
+        return self._matches(self.block, *args) and not self._matches(self.allow, *args)
+
+class PerfMonitor(QObject):
+    """Instrumentación de cargas: tiempos por pestaña en búferes circulares.
+
+    Registra loadStarted/loadProgress/loadFinished de cada vista, las
+    peticiones que ve el interceptor y, al terminar la carga, los datos de
+    Navigation Timing, paint y recursos de la página (más LCP/CLS mediante
+    PerformanceObserver). Se muestra en fennex://perf y se exporta a JSONL.
+
+    Las peticiones se guardan por host de primer nivel en orden de llegada;
+    al terminar una carga se cuentan solo las de su host desde el final
+    hasta su inicio, y el resultado queda en el propio registro.
+    """
+    PERF_URL = 'fennex://perf'
+    LOADS_PER_TAB = 50
+    MAX_TABS = 100
+    REQUESTS_PER_HOST = 1000
+    MAX_REQUEST_HOSTS = 100
+    OBSERVER_DELAY_MS = 1500
+
+    NAVIGATION_JS = '''
+    (function() {
+        var nav = performance.getEntriesByType('navigation')[0];
+        var resources = performance.getEntriesByType('resource');
+        var paint = {};
+        performance.getEntriesByType('paint').forEach(function(p) { paint[p.name] = p.startTime; });
+        var transfer = 0;
+        resources.forEach(function(r) { transfer += r.transferSize || 0; });
+        var slowest = resources.slice().sort(function(a, b) { return b.duration - a.duration; })
+            .slice(0, 5).map(function(r) { return {name: r.name, duration: r.duration}; });
+        window.__fennexPerf = {lcp: null, cls: 0};
+        try {
+            new PerformanceObserver(function(list) {
+                var entries = list.getEntries();
+                window.__fennexPerf.lcp = entries[entries.length - 1].startTime;
+            }).observe({type: 'largest-contentful-paint', buffered: true});
+            new PerformanceObserver(function(list) {
+                list.getEntries().forEach(function(e) {
+                    if (!e.hadRecentInput) window.__fennexPerf.cls += e.value;
+                });
+            }).observe({type: 'layout-shift', buffered: true});
+        } catch (e) {}
+        return JSON.stringify({
+            navigation: nav ? nav.toJSON() : null,
+            paint: paint,
+            resource_count: resources.length,
+            transfer_bytes: transfer,
+            slowest_resources: slowest
+        });
+    })();
+    '''
+    OBSERVER_JS = 'JSON.stringify(window.__fennexPerf || null)'
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._tabs = OrderedDict()  # id de pestaña: deque de cargas
+        self._requests = OrderedDict()  # host de primer nivel: deque de (instante, bloqueada)
+        self._requests_lock = threading.Lock()  # El interceptor escribe desde el hilo de E/S
+        self._next_id = 0
+
+    def attach(self, browser):
+        """Conecta las señales de carga de una vista"""
+        self._next_id += 1
+        tab_id = self._next_id
+        state = {'current': None}
+        browser.loadStarted.connect(lambda: self._on_started(tab_id, browser, state))
+        browser.loadProgress.connect(lambda progress: self._on_progress(state, progress))
+        browser.loadFinished.connect(lambda ok: self._on_finished(browser, state, ok))
+
+    def _buffer(self, tab_id):
+        buffer = self._tabs.get(tab_id)
+        if buffer is None:
+            buffer = self._tabs[tab_id] = deque(maxlen=self.LOADS_PER_TAB)
+            while len(self._tabs) > self.MAX_TABS:
+                self._tabs.popitem(last=False)
+        return buffer
+
+    def _on_started(self, tab_id, browser, state):
+        record = {
+            'tab': tab_id,
+            'url': browser.url().toString(),
+            'started': time.time(),
+            '_t0': time.perf_counter(),
+            'first_progress_ms': None,
+        }
+        state['current'] = record
+        self._buffer(tab_id).append(record)
+
+    def _on_progress(self, state, progress):
+        record = state['current']
+        if record is not None and record['first_progress_ms'] is None and progress > 0:
+            record['first_progress_ms'] = (time.perf_counter() - record['_t0']) * 1000
+
+    def _on_finished(self, browser, state, ok):
+        record = state['current']
+        state['current'] = None
+        if record is None:
+            return
+        record['ok'] = ok
+        record['load_ms'] = (time.perf_counter() - record.pop('_t0')) * 1000
+        record['url'] = browser.url().toString()
+        record['finished'] = time.time()
+        self._count_requests(record)
+        if not ok or record['url'].startswith(self.PERF_URL):
+            return
+        page = browser.page()
+        page.runJavaScript(self.NAVIGATION_JS, lambda result: self._merge_json(record, result))
+        def collect_observers():
+            try:
+                page.runJavaScript(self.OBSERVER_JS, lambda result: self._merge_json(record, result, 'observers'))
+            except RuntimeError:
+                pass  # La pestaña se cerró
+        QTimer.singleShot(self.OBSERVER_DELAY_MS, collect_observers)
+
+    @staticmethod
+    def _merge_json(record, result, key=None):
+        try:
+            data = json.loads(result) if result else None
+        except (TypeError, ValueError):
+            return
+        if data is None:
+            return
+        if key:
+            record[key] = data
+        else:
+            record.update(data)
+
+    def record_request(self, url, first_party_host, resource_type, blocked):
+        """Llamado desde el hilo de E/S del interceptor"""
+        with self._requests_lock:
+            bucket = self._requests.get(first_party_host)
+            if bucket is None:
+                bucket = self._requests[first_party_host] = deque(maxlen=self.REQUESTS_PER_HOST)
+                while len(self._requests) > self.MAX_REQUEST_HOSTS:
+                    self._requests.popitem(last=False)
+            else:
+                self._requests.move_to_end(first_party_host)
+            bucket.append((time.time(), blocked))
+
+    def _count_requests(self, record):
+        """Cuenta las peticiones del host de la carga entre su inicio y su fin (o ahora)"""
+        host = QUrl(record.get('url', '')).host()
+        end = record.get('finished', time.time())
+        total = blocked = 0
+        with self._requests_lock:
+            for moment, was_blocked in reversed(self._requests.get(host, ())):
+                if moment < record['started']:
+                    break  # Orden de llegada: las anteriores son de cargas previas
+                if moment <= end:
+                    total += 1
+                    blocked += was_blocked
+        record['requests'] = total
+        record['blocked_requests'] = blocked
+
+    def records(self):
+        """Copia de todas las cargas con las peticiones asociadas ya contadas"""
+        result = []
+        for buffer in list(self._tabs.values()):
+            for record in list(buffer):
+                record = {k: v for k, v in record.items() if not k.startswith('_')}
+                if 'finished' not in record:
+                    self._count_requests(record)  # Carga en curso
+                result.append(record)
+        return result
+
+    def export_jsonl(self, path):
+        with open(path, 'w', encoding='utf-8') as f:
+            for record in self.records():
+                f.write(json.dumps(record) + '\n')
+
+    def render_html(self):
+        """Página HTML de fennex://perf"""
+        import html
+        def ms(value):
+            return '' if value is None else f'{value:.0f}'
+        rows = []
+        for record in reversed(self.records()):
+            nav = record.get('navigation') or {}
+            paint = record.get('paint') or {}
+            observers = record.get('observers') or {}
+            ttfb = nav.get('responseStart', 0) - nav.get('requestStart', 0) if nav else None
+            rows.append(
+                '<tr>' + ''.join(f'<td>{cell}</td>' for cell in (
+                    record['tab'],
+                    f"<span title='{html.escape(record.get('url', ''))}'>"
+                    f"{html.escape(record.get('url', '')[:80])}</span>",
+                    ms(record.get('load_ms')),
+                    ms(ttfb),
+                    ms(nav.get('domContentLoadedEventEnd')),
+                    ms(nav.get('loadEventEnd')),
+                    ms(paint.get('first-contentful-paint')),
+                    ms(observers.get('lcp')),
+                    f"{observers.get('cls', 0):.3f}" if observers else '',
+                    record.get('resource_count', ''),
+                    f"{record.get('transfer_bytes', 0) / 1024:.0f}",
+                    record.get('requests', 0),
+                    record.get('blocked_requests', 0),
+                )) + '</tr>'
+            )
+        headers = ('Pestaña', 'URL', 'Carga (ms)', 'TTFB', 'DOMContentLoaded', 'load', 'FCP', 'LCP',
+                   'CLS', 'Recursos', 'KB', 'Peticiones', 'Bloqueadas')
+        return f'''<!DOCTYPE html>
+<html><head><meta charset="utf-8"><title>Rendimiento</title>
+<style>
+body {{ background: #232323; color: #eee; font-family: sans-serif; font-size: 13px; }}
+table {{ border-collapse: collapse; width: 100%; }}
+th, td {{ border-bottom: 1px solid #444; padding: 4px 6px; text-align: left; }}
+th {{ color: #aaa; }}
+</style></head><body>
+<h2>Rendimiento de carga</h2>
+<p>{len(rows)} cargas registradas. Exporta los datos desde el menú: "Exportar métricas (JSONL)".</p>
+<table><tr>{''.join(f'<th>{h}</th>' for h in headers)}</tr>{''.join(rows)}</table>
+</body></html>'''
+
+class RequestInterceptor(QWebEngineUrlRequestInterceptor):
+    """Interceptor del perfil: bloquea anuncios y rastreadores con FilterEngine"""
+    filtersLoaded = pyqtSignal(int)  # Número de reglas del motor recién cargado
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.engine = FilterEngine()  # Se sustituye cuando terminan de cargar las listas
+        self.enabled = True
+        self.perf_monitor = None
+        self.blocked_count = 0
+        info = QWebEngineUrlRequestInfo
+        names = {
+            'ResourceTypeMainFrame': 'document',
+            'ResourceTypeSubFrame': 'subdocument',
+            'ResourceTypeStylesheet': 'stylesheet',
+            'ResourceTypeScript': 'script',
+            'ResourceTypeImage': 'image',
+            'ResourceTypeFavicon': 'image',
+            'ResourceTypeFontResource': 'font',
+            'ResourceTypeObject': 'object',
+            'ResourceTypeMedia': 'media',
+            'ResourceTypeXhr': 'xmlhttprequest',
+            'ResourceTypePing': 'ping',
+            'ResourceTypeWebSocket': 'websocket',
+        }
+        self._types = {getattr(info, name): value for name, value in names.items() if hasattr(info, name)}
+
+    def interceptRequest(self, info):
+        # Se ejecuta en el hilo de E/S de QtWebEngine: nada de widgets aquí
+        resource_type = self._types.get(info.resourceType(), 'other')
+        url = info.requestUrl()
+        first_party = info.firstPartyUrl().host()
+        blocked = (
+            self.enabled and resource_type != 'document'  # Nunca bloquear la página principal
+            and self.engine.should_block(url.toString(), url.host(), first_party, resource_type)
+        )
+        if blocked:
+            info.block(True)
+            self.blocked_count += 1
+        if self.perf_monitor is not None:
+            self.perf_monitor.record_request(url.toString(), first_party, resource_type, blocked)
+
+class ProfileManager:
+    """Configura una sola vez el QWebEngineProfile compartido por todas las pestañas.
+
+    Los ajustes de QWebEngineSettings se aplican al perfil, del que los
+    heredan todas sus páginas, así que crear una pestaña solo hace el
+    trabajo propio de la vista. La caché HTTP es persistente en disco, en
+    el directorio de caché XDG, con un tamaño máximo configurable.
+    """
+    DEFAULT_CACHE_SIZE_MB = 256
+    FILTERS_DIR = os.path.expanduser('~/.pyqt_chrome_filters')  # Listas *.txt estilo EasyList
+    USER_AGENT = 'Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/94.0.4606.81 Safari/537.36'
+    ACCEPT_LANGUAGE = 'es-ES,es;q=0.9,en;q=0.8'
+    # Plantilla de ajustes: plugins, JavaScript y contenido permisivo
+    SETTINGS_TEMPLATE = (
+        ('PluginsEnabled', True),
+        ('JavascriptEnabled', True),
+        ('JavascriptCanOpenWindows', True),
+        ('AllowRunningInsecureContent', True),
+        ('LocalStorageEnabled', True),
+        ('LocalContentCanAccessRemoteUrls', True),
+        ('AllowGeolocationOnInsecureOrigins', True),
+        ('AllowWindowActivationFromJavaScript', True),
+    )
+    _instance = None
+
+    @classmethod
+    def instance(cls):
+        """Devuelve el gestor único (requiere una QApplication creada)"""
+        if cls._instance is None:
+            cls._instance = cls()
+        return cls._instance
+
+    def __init__(self):
+        self.profile = QWebEngineProfile.defaultProfile()
+        self.download_path = self._resolve_download_path()
         
-        # Guardar referencia
-        self.download_items[id(qdownload)] = (item, widget, progress, btn_pause, btn_resume, btn_cancel)
+        # Configurar las rutas del perfil
+        self.cache_path = self.default_cache_path()
+        os.makedirs(self.cache_path, exist_ok=True)
+        self.profile.setCachePath(self.cache_path)
+        self.profile.setPersistentStoragePath(os.path.join(self.download_path, '.storage'))
+        self.profile.setDownloadPath(self.download_path)
+        
+        self.profile.setHttpUserAgent(self.USER_AGENT)
+        self.profile.setHttpAcceptLanguage(self.ACCEPT_LANGUAGE)
+        # Bloqueo de contenido (las listas se compilan en segundo plano) e instrumentación
+        self.perf = PerfMonitor()
+        self.interceptor = RequestInterceptor()
+        self.interceptor.perf_monitor = self.perf
+        self.profile.setUrlRequestInterceptor(self.interceptor)
+        self.load_filters()
+        self.profile.setPersistentCookiesPolicy(QWebEngineProfile.AllowPersistentCookies)
+        self.profile.setHttpCacheType(QWebEngineProfile.DiskHttpCache)
+        self.set_cache_size(self.DEFAULT_CACHE_SIZE_MB)
+        self.apply_settings(self.profile.settings())
+        print(f"Perfil configurado con ruta de descargas: {self.download_path}")
+
+    @staticmethod
+    def _resolve_download_path():
+        """Carpeta de descargas predeterminada"""
+        from PyQt5.QtCore import QStandardPaths
+        downloads_path = os.path.expanduser('~/Descargas')
+        if not os.path.exists(downloads_path):
+            try:
+                os.makedirs(downloads_path)
+            except Exception:
+                downloads_path = QStandardPaths.writableLocation(QStandardPaths.DownloadLocation)
+                if not downloads_path:
+                    downloads_path = os.path.expanduser('~')
+        return downloads_path
+
+    @staticmethod
+    def default_cache_path():
+        """$XDG_CACHE_HOME/fennex (por defecto ~/.cache/fennex)"""
+        base = os.environ.get('XDG_CACHE_HOME') or os.path.expanduser('~/.cache')
+        return os.path.join(base, 'fennex')
+
+    def set_cache_size(self, size_mb):
+        self.cache_size_mb = size_mb
+        self.profile.setHttpCacheMaximumSize(int(size_mb) * 1024 * 1024)
+
+    def cache_stats(self):
+        """Devuelve (bytes usados, número de archivos) de la caché en disco"""
+        total = files = 0
+        for root, _dirs, names in os.walk(self.profile.cachePath()):
+            for name in names:
+                try:
+                    total += os.path.getsize(os.path.join(root, name))
+                    files += 1
+                except OSError:
+                    pass
+        return total, files
+
+    def clear_cache(self):
+        self.profile.clearHttpCache()
+
+    def filter_files(self):
+        if not os.path.isdir(self.FILTERS_DIR):
+            return []
+        return [
+            os.path.join(self.FILTERS_DIR, name) for name in sorted(os.listdir(self.FILTERS_DIR))
+            if name.endswith('.txt')
+        ]
+
+    def load_filters(self):
+        """Compila (o lee de la caché binaria) las listas de filtros en un hilo aparte"""
+        paths = self.filter_files()
+        if not paths:
+            self.interceptor.engine = FilterEngine()
+            self.interceptor.filtersLoaded.emit(0)
+            return
+        def load():
+            try:
+                start = time.perf_counter()
+                engine = FilterEngine.from_files(paths, cache_dir=self.cache_path)
+                self.interceptor.engine = engine
+                print(f"Filtros cargados: {engine.rule_count} reglas en {time.perf_counter() - start:.2f}s")
+            except Exception as e:
+                print(f"Error al cargar los filtros: {e}")
+            # Avisar también si falla: el motor anterior sigue activo
+            self.interceptor.filtersLoaded.emit(self.interceptor.engine.rule_count)
+        threading.Thread(target=load, daemon=True).start()
+
+    def apply_settings(self, settings):
+        for name, value in self.SETTINGS_TEMPLATE:
+            settings.setAttribute(getattr(QWebEngineSettings, name), value)
+
+    def create_page(self, parent):
+        return QWebEnginePage(self.profile, parent)
+
+    @staticmethod
+    def benchmark_tab_creation(window, runs=20):
+        """Mide la latencia de add_new_tab en milisegundos y cierra las pestañas creadas"""
+        import statistics
+        samples = []
+        for _ in range(runs):
+            start = time.perf_counter()
+            window.add_new_tab(QUrl('about:blank'))
+            samples.append((time.perf_counter() - start) * 1000)
+            window.close_tab(window.tabs.currentIndex())
+        return {
+            'runs': runs,
+            'mean_ms': statistics.mean(samples),
+            'median_ms': statistics.median(samples),
+            'max_ms': max(samples),
+        }
+
+class LazyTab(QWidget):
+    """Pestaña restaurada sin QWebEngineView; MainWindow la sustituye al seleccionarla"""
+
+    def __init__(self, url, title):
+        super().__init__()
+        self.url_str = url
+        self.title = title
+
+    def url(self):
+        return QUrl(self.url_str)
+
+class TabLifecycleManager(QObject):
+    """Congela y descarta las pestañas en segundo plano que llevan tiempo inactivas.
+
+    Una pestaña congelada (Frozen) conserva su renderizador pero no ejecuta
+    nada; una descartada (Discarded) lo libera y QtWebEngine la recarga al
+    volver a activarla. Se guardan URL, título, icono y scroll para que la
+    pestaña se vea igual mientras duerme y recupere su posición al despertar.
+    """
+    CHECK_INTERVAL_MS = 30000
+
+    def __init__(self, tabs, freeze_after=300, discard_after=1800, memory_threshold_mb=1024,
+                 parent=None):
+        super().__init__(parent)
+        self.tabs = tabs
+        self.freeze_after = freeze_after
+        self.discard_after = discard_after
+        self.memory_threshold_mb = memory_threshold_mb
+        self._last_active = {}  # navegador: último instante en primer plano
+        self._pinned = set()
+        self._sleeping = {}  # navegador: estado guardado
+        self._current = None
+        self._states = getattr(QWebEnginePage, 'LifecycleState', None)  # Qt >= 5.14
+        self._timer = QTimer(self)
+        self._timer.timeout.connect(self.check)
+        self._timer.start(self.CHECK_INTERVAL_MS)
+
+    def _browsers(self):
+        for i in range(self.tabs.count()):
+            widget = self.tabs.widget(i)
+            if isinstance(widget, QWebEngineView):
+                yield i, widget
+
+    def is_pinned(self, browser):
+        return browser in self._pinned
+
+    def set_pinned(self, browser, pinned):
+        """Marca una pestaña para que nunca se descarte"""
+        if pinned:
+            self._pinned.add(browser)
+            self.wake(browser)
+        else:
+            self._pinned.discard(browser)
+
+    def is_sleeping(self, browser):
+        return browser in self._sleeping
+
+    def activate(self, browser):
+        """Llamar cuando una pestaña pasa a primer plano"""
+        now = time.monotonic()
+        if self._current is not None:
+            self._last_active[self._current] = now
+        self._current = browser
+        if isinstance(browser, QWebEngineView):
+            self._last_active[browser] = now
+            self.wake(browser)
+
+    def forget(self, browser):
+        self._last_active.pop(browser, None)
+        self._sleeping.pop(browser, None)
+        self._pinned.discard(browser)
+        if self._current is browser:
+            self._current = None
+
+    @staticmethod
+    def available_memory_mb():
+        """Memoria disponible del sistema (Linux) o None si no se puede leer"""
+        try:
+            with open('/proc/meminfo') as f:
+                for line in f:
+                    if line.startswith('MemAvailable:'):
+                        return int(line.split()[1]) // 1024
+        except (OSError, ValueError):
+            pass
+        return None
+
+    def check(self):
+        """Revisa las pestañas en segundo plano y las congela o descarta"""
+        if self._states is None:
+            return
+        now = time.monotonic()
+        available = self.available_memory_mb()
+        under_pressure = available is not None and available < self.memory_threshold_mb
+        for index, browser in self._browsers():
+            if browser is self._current or browser in self._pinned:
+                continue
+            page = browser.page()
+            if page.recentlyAudible():
+                continue
+            idle = now - self._last_active.setdefault(browser, now)
+            if idle >= self.discard_after or (under_pressure and idle >= self.freeze_after):
+                self._sleep(index, browser, self._states.Discarded)
+            elif idle >= self.freeze_after:
+                self._sleep(index, browser, self._states.Frozen)
+
+    def _sleep(self, index, browser, state):
+        page = browser.page()
+        if page.lifecycleState() == state:
+            return
+        if browser not in self._sleeping:
+            self._sleeping[browser] = {
+                'url': page.url(),
+                'title': self.tabs.tabText(index),
+                'icon': self.tabs.tabIcon(index),
+                'scroll': page.scrollPosition(),
+            }
+        # Solo se puede descartar desde Frozen
+        if state == self._states.Discarded and page.lifecycleState() == self._states.Active:
+            page.setLifecycleState(self._states.Frozen)
+        page.setLifecycleState(state)
+
+    def wake(self, browser):
+        """Reactiva una pestaña dormida y restaura título, icono y scroll"""
+        saved = self._sleeping.pop(browser, None)
+        if saved is None or self._states is None:
+            return
+        page = browser.page()
+        was_discarded = page.lifecycleState() == self._states.Discarded
+        page.setLifecycleState(self._states.Active)
+        index = self.tabs.indexOf(browser)
+        if index != -1:
+            self.tabs.setTabText(index, saved['title'])
+            self.tabs.setTabIcon(index, saved['icon'])
+        if was_discarded:
+            # La página se recarga: restaurar el scroll cuando termine
+            scroll = saved['scroll']
+            def restore_scroll(ok):
+                browser.loadFinished.disconnect(restore_scroll)
+                if ok:
+                    page.runJavaScript(f'window.scrollTo({scroll.x()}, {scroll.y()});')
+            browser.loadFinished.connect(restore_scroll)
+
+class BrowserContext:
+    """Estado común a todas las ventanas del navegador: configuración, perfil web,
+    historial, marcadores, contraseñas, la cola de escrituras y la ventana de descargas.
+
+    No pertenece a ninguna ventana, así que cerrar cualquiera de ellas (también la
+    primera) no se lleva nada por delante. Cada MainWindow lo guarda en self.context;
+    los datos se cargan con la primera ventana (ver MainWindow.__init__)."""
+    _instance = None
+
+    @classmethod
+    def instance(cls):
+        """Devuelve el contexto único del proceso"""
+        if cls._instance is None:
+            cls._instance = cls()
+        return cls._instance
+
+    def __init__(self):
+        self.loaded = False  # Configuración y datos ya cargados
+        self.windows = []  # Ventanas principales abiertas, en orden de apertura
+        self.persistence = None
+        self._downloads_window = None
 
 class MainWindow(QMainWindow):
     # Define signals with correct types
     suggestions_ready = pyqtSignal(list)
     suggestions_hide = pyqtSignal()
 
-    def __init__(self):
+    def __init__(self, session=None):
         super().__init__()
+        self.context = BrowserContext.instance()
+        first_window = not self.context.loaded
+        self.context.windows.append(self)
+        # Todas las ventanas se cierran igual: se destruyen y salen de context.windows (ver closeEvent)
+        self.setAttribute(Qt.WA_DeleteOnClose)
         # Inicializar variables de las ventanas
         self._history_window = None
-        self._downloads_window = None
         self._windows = []  # Lista para mantener referencia a todas las ventanas
         
         # Configurar ventana sin bordes
@@ -651,31 +3361,68 @@ class MainWindow(QMainWindow):
         # El tamaño se restaurará en load_config
         self.icons_path = 'icons/'
         
-        # Cargar configuración y datos
-        self.load_config()
-        self.load_encrypted_passwords()
-        self.load_bookmarks()
-        self.load_history()  # Cargar el historial
+        if first_window:
+            # Escrituras a disco agrupadas en segundo plano (una cola para todo el proceso)
+            self.context.persistence = PersistenceScheduler()
+            self.context.loaded = True
+            
+            # Cargar configuración y datos
+            with startup_span('load_config'):
+                self.load_config()
+            
+            # Perfil web compartido, configurado una sola vez
+            with startup_span('ProfileManager'):
+                self.context.profile_manager = ProfileManager.instance()
+                self.context.profile_manager.set_cache_size(self.context.cache_size_mb)
+                self.context.profile_manager.interceptor.enabled = self.context.content_blocking
+                self.context.download_path = self.context.profile_manager.download_path
+            
+            with startup_span('load_bookmarks'):
+                self.load_bookmarks()
+            
+            # El historial y las contraseñas no hacen falta para el primer
+            # pintado: se cargan cuando la ventana ya es visible
+            QTimer.singleShot(0, self._deferred_init)
+        else:
+            # Ventana adicional: la configuración y los datos ya están cargados
+            others = [window for window in self.context.windows if window is not self]
+            if others:
+                self.resize(others[-1].size())
+            QTimer.singleShot(100, self.apply_theme)
         
         # Variables para manejar el arrastre de la ventana
         self._pressed = False
         self._start_pos = None
         self._original_pos = None
         
-        # Asegurar que los diálogos nuevos usen el tema actual
+        # Asegurar que los diálogos nuevos usen el tema actual (una sola vez por proceso)
         from PyQt5.QtWidgets import QDialog
-        original_dialog_init = QDialog.__init__
-        def themed_dialog_init(dialog_self, *args, **kwargs):
-            original_dialog_init(dialog_self, *args, **kwargs)
-            if hasattr(self, 'theme_class'):
-                self.apply_theme_to_widget(dialog_self)
-        QDialog.__init__ = themed_dialog_init
+        if not getattr(QDialog, '_fennex_themed', False):
+            original_dialog_init = QDialog.__init__
+            def themed_dialog_init(dialog_self, *args, **kwargs):
+                original_dialog_init(dialog_self, *args, **kwargs)
+                window = MainWindow.owner_of(dialog_self.parentWidget())
+                if window is not None and hasattr(window.context, 'theme_class'):
+                    window.apply_theme_to_widget(dialog_self)
+            QDialog.__init__ = themed_dialog_init
+            QDialog._fennex_themed = True
         # Configurar el widget de pestañas
         self.tabs = QTabWidget()
         self.tabs.setTabsClosable(True)
         self.tabs.tabCloseRequested.connect(self.close_tab)
         self.tabs.currentChanged.connect(self.on_tab_changed)
         
+        # Congelar/descartar pestañas en segundo plano
+        self.tab_lifecycle = TabLifecycleManager(
+            self.tabs,
+            freeze_after=self.context.tab_freeze_minutes * 60,
+            discard_after=self.context.tab_discard_minutes * 60,
+            memory_threshold_mb=self.context.tab_memory_threshold_mb,
+            parent=self
+        )
+        self.tabs.tabBar().setContextMenuPolicy(Qt.CustomContextMenu)
+        self.tabs.tabBar().customContextMenuRequested.connect(self.show_tab_context_menu)
+        
         # Aplicar estilo al QTabWidget y su contenedor
         self.tabs.setStyleSheet("""
             QTabWidget::pane {
@@ -716,66 +3463,64 @@ class MainWindow(QMainWindow):
                 background-color: transparen;
                 border-radius: 2px;
             }
-        """)
-        self.tabs.setObjectName("tabs")
-        
-        self.setCentralWidget(self.tabs)
-        self.create_toolbar()
-        self.add_new_tab(QUrl(self.homepage), 'Nueva pestaña')
-        self.add_newtab_button_tab()
-        self.set_dark_theme()
-        
-        # Configurar el perfil global de descargas
-        from PyQt5.QtWebEngineWidgets import QWebEngineProfile, QWebEnginePage
-        from PyQt5.QtCore import QStandardPaths
-        
-        # Obtener y configurar el perfil global
-        profile = QWebEngineProfile.defaultProfile()
-        
-        # Establecer la carpeta de descargas predeterminada
-        downloads_path = os.path.expanduser('~/Descargas')
-        if not os.path.exists(downloads_path):
-            try:
-                os.makedirs(downloads_path)
-            except Exception:
-                downloads_path = QStandardPaths.writableLocation(QStandardPaths.DownloadLocation)
-                if not downloads_path:
-                    downloads_path = os.path.expanduser('~')
-        
-        # Configurar las rutas del perfil
-        self.download_path = downloads_path
-        profile.setCachePath(os.path.join(downloads_path, '.cache'))
-        profile.setPersistentStoragePath(os.path.join(downloads_path, '.storage'))
-        profile.setDownloadPath(downloads_path)
+        """)
+        self.tabs.setObjectName("tabs")
         
-        # Habilitar el almacenamiento persistente
-        profile.setPersistentCookiesPolicy(QWebEngineProfile.AllowPersistentCookies)
+        self.setCentralWidget(self.tabs)
+        with startup_span('create_toolbar'):
+            self.create_toolbar()
+        self.add_newtab_button_tab()
+        # Restaurar la sesión anterior (pestañas perezosas) o abrir la página de inicio
+        with startup_span('initial tabs'):
+            if session:
+                restored = self._restore_tabs(session)  # Ventana de una sesión guardada
+            else:
+                restored = first_window and self.context.restore_session_on_start and self.restore_session()
+            if not restored:
+                self.add_new_tab(QUrl(self.context.homepage), 'Nueva pestaña')
+        with startup_span('set_dark_theme'):
+            self.set_dark_theme()
         
-        # Conectar la señal de descarga
-        profile.downloadRequested.connect(self.on_download_requested)
-        print(f"Perfil configurado con ruta de descargas: {downloads_path}")
+        # Conectar la señal de descarga del perfil global (una sola conexión para todas las ventanas)
+        if first_window:
+            self.context.profile_manager.profile.downloadRequested.connect(MainWindow.route_download)
         
         # Connect signals properly
         self.suggestions_ready.connect(self.show_suggestions)
         self.suggestions_hide.connect(self.hide_suggestions)
+        
+        # Servicio de sugerencias remotas (sesión persistente y caché)
+        self.suggestion_service = SuggestionService(parent=self)
+        self.suggestion_service.ready.connect(self._on_remote_suggestions)
+        self.suggestion_service.failed.connect(lambda version: self._on_remote_suggestions(version, []))
+
+    def _deferred_init(self):
+        """Carga lo que no hace falta para el primer pintado (historial y contraseñas)"""
+        if not hasattr(self.context, 'history'):
+            with startup_span('load_history', 'deferred'):
+                self.load_history()
+        with startup_span('load_encrypted_passwords', 'deferred'):
+            self.load_encrypted_passwords()
 
     ENCRYPTED_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'pyqt_chrome_passwords.enc')
     MASTER_KEY_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'pyqt_chrome_masterkey.enc')
     
     def save_master_password(self):
-        # Guarda la contraseña maestra encriptada en archivo
-        if hasattr(self, 'master_password') and self.master_password:
-            try:
-                from cryptography.fernet import Fernet
-                import base64, hashlib
-                key = hashlib.sha256(b'pyqt_chrome_masterkey').digest()
-                key = base64.urlsafe_b64encode(key)
-                f = Fernet(key)
-                enc = f.encrypt(self.master_password.encode())
-                with open(self.MASTER_KEY_FILE, 'wb') as mf:
-                    mf.write(enc)
-            except Exception:
-                pass
+        # Programa el guardado de la contraseña maestra encriptada
+        self.context.persistence.mark_dirty('master_key', self._snapshot_master_password)
+
+    def _snapshot_master_password(self):
+        master_password = getattr(self.context, 'master_password', None)
+        if not master_password:
+            return None
+        def write():
+            from cryptography.fernet import Fernet
+            import base64, hashlib
+            key = hashlib.sha256(b'pyqt_chrome_masterkey').digest()
+            key = base64.urlsafe_b64encode(key)
+            f = Fernet(key)
+            atomic_write(self.MASTER_KEY_FILE, f.encrypt(master_password.encode()))
+        return write
 
     def load_master_password(self):
         # Carga la contraseña maestra encriptada desde archivo
@@ -788,18 +3533,17 @@ class MainWindow(QMainWindow):
                 f = Fernet(key)
                 with open(self.MASTER_KEY_FILE, 'rb') as mf:
                     enc = mf.read()
-                self.master_password = f.decrypt(enc).decode()
+                self.context.master_password = f.decrypt(enc).decode()
         except Exception:
-            self.master_password = None
+            self.context.master_password = None
 
     def delete_master_password(self):
-        # Borra el archivo de la contraseña maestra
-        try:
+        # Borra el archivo de la contraseña maestra (en orden con las escrituras pendientes)
+        self.context.master_password = None
+        def remove():
             if os.path.exists(self.MASTER_KEY_FILE):
                 os.remove(self.MASTER_KEY_FILE)
-            self.master_password = None
-        except Exception:
-            pass
+        self.context.persistence.mark_dirty('master_key', lambda: remove)
 
     def encrypt_data(self, data, password):
         try:
@@ -824,31 +3568,37 @@ class MainWindow(QMainWindow):
             return None
 
     def save_encrypted_passwords(self):
-        # Guarda cuentas en archivo cifrado (sin guardar la clave maestra aquí)
+        # Programa el guardado de las cuentas en archivo cifrado
+        self.context.persistence.mark_dirty('passwords', self._snapshot_encrypted_passwords)
+        self.save_master_password()
+
+    def _snapshot_encrypted_passwords(self):
         import json
-        if hasattr(self, 'master_password') and self.master_password:
-            data = json.dumps({
-                'accounts': getattr(self, 'accounts', [])
-            })
-            enc = self.encrypt_data(data, self.master_password)
+        master_password = getattr(self.context, 'master_password', None)
+        if not master_password:
+            return None
+        data = json.dumps({
+            'accounts': list(getattr(self.context, 'accounts', []))
+        })
+        def write():
+            enc = self.encrypt_data(data, master_password)
             if enc:
-                with open(self.ENCRYPTED_FILE, 'wb') as f:
-                    f.write(enc)
-        self.save_master_password()
+                atomic_write(self.ENCRYPTED_FILE, enc)
+        return write
 
     def load_encrypted_passwords(self):
         # Carga cuentas desde archivo cifrado, y la clave maestra desde su propio archivo
         import json
         self.load_master_password()
-        self.accounts = []
-        self._encrypted_accounts_data = None
+        self.context.accounts = []
+        self.context._encrypted_accounts_data = None
         if os.path.exists(self.ENCRYPTED_FILE):
             try:
                 with open(self.ENCRYPTED_FILE, 'rb') as f:
                     enc = f.read()
-                self._encrypted_accounts_data = enc
+                self.context._encrypted_accounts_data = enc
             except Exception:
-                self._encrypted_accounts_data = None
+                self.context._encrypted_accounts_data = None
 
     def prompt_save_credentials(self, browser):
         # Inyecta JS para detectar envío de formulario de login y pregunta si guardar credenciales
@@ -876,8 +3626,8 @@ class MainWindow(QMainWindow):
                 if ok and dominio:
                     import base64
                     encoded = base64.b64encode(password.encode('utf-8')).decode('utf-8')
-                    if not any(a['usuario'] == usuario and a['dominio'] == dominio for a in self.outer.accounts):
-                        self.outer.accounts.append({'usuario': usuario, 'password': encoded, 'dominio': dominio})
+                    if not any(a['usuario'] == usuario and a['dominio'] == dominio for a in self.outer.context.accounts):
+                        self.outer.context.accounts.append({'usuario': usuario, 'password': encoded, 'dominio': dominio})
         browser.page().setWebChannel(None)
         try:
             from PyQt5.QtWebChannel import QWebChannel
@@ -894,7 +3644,7 @@ class MainWindow(QMainWindow):
         from urllib.parse import urlparse
         import base64
         domain = urlparse(url.toString()).netloc
-        for acc in getattr(self, 'accounts', []):
+        for acc in getattr(self.context, 'accounts', []):
             if domain and acc.get('dominio') and acc['dominio'] in domain:
                 password = base64.b64decode(acc['password']).decode('utf-8')
                 js = (
@@ -912,34 +3662,80 @@ class MainWindow(QMainWindow):
     import os, json
     CONFIG_FILE = os.path.expanduser('~/.pyqt_chrome_config.json')
     HISTORY_FILE = os.path.expanduser('~/.pyqt_chrome_history.json')
+    HISTORY_DB = os.path.expanduser('~/.pyqt_chrome_history.db')
+    DOWNLOADS_DB = os.path.expanduser('~/.pyqt_chrome_downloads.db')
+    HISTORY_LIMIT = 1000
     
     def load_history(self):
-        """Carga el historial de navegación desde el archivo"""
-        self.history = []
-        if os.path.exists(self.HISTORY_FILE):
-            try:
-                with open(self.HISTORY_FILE, 'r') as f:
-                    data = json.load(f)
-                    self.history = data.get('history', [])
-            except Exception as e:
-                print(f"Error al cargar el historial: {e}")
-                self.history = []
-    
-    def save_history(self):
-        """Guarda el historial de navegación en el archivo"""
+        """Carga el historial de navegación desde la base de datos"""
+        self.context.history = []
+        self.context._history_index = {}
+        try:
+            self.context.history_store = HistoryStore(self.HISTORY_DB)
+        except Exception as e:
+            print(f"Error al abrir la base de datos del historial: {e}")
+            self.context.history_store = None
+            return
+        try:
+            # Migración única desde el antiguo archivo JSON
+            self.context.history_store.import_json(self.HISTORY_FILE)
+        except Exception as e:
+            print(f"Error al importar el historial JSON: {e}")
         try:
-            with open(self.HISTORY_FILE, 'w') as f:
-                json.dump({'history': self.history}, f)
+            self.context.history = self.context.history_store.entries(self.HISTORY_LIMIT)
         except Exception as e:
-            print(f"Error al guardar el historial: {e}")
+            print(f"Error al cargar el historial: {e}")
+            self.context.history = []
+        self._rebuild_history_index()
+        # Unas sugerencias pedidas antes de la carga diferida se construyeron sobre []
+        self.context._suggestion_provider = None
+        if getattr(self.context, '_history_model', None) is not None:
+            self.context._history_model.set_history(self.context.history)
+
+    def history_model(self):
+        """Modelo compartido sobre self.context.history; toda modificación de la lista pasa por él"""
+        if getattr(self.context, '_history_model', None) is None:
+            if getattr(self.context, 'history', None) is None:
+                self.load_history()
+            self.context._history_model = HistoryModel(self.context.history)
+        return self.context._history_model
+
+    def _rebuild_history_index(self):
+        """Reconstruye el índice URL -> entrada del historial"""
+        self.context._history_index = {entry['url']: entry for entry in self.context.history}
+    
+    def clear_history(self):
+        """Borra todo el historial de navegación"""
+        self.history_model().clear()
+        self.context._history_index.clear()
+        self.context._suggestion_provider = None
+        self._queue_history_op('clear')
+
+    def _queue_history_op(self, *op):
+        """Encola una operación del historial para el próximo volcado"""
+        if not getattr(self.context, 'history_store', None):
+            return
+        if not hasattr(self.context, '_pending_history_ops'):
+            self.context._pending_history_ops = []
+        self.context._pending_history_ops.append(op)
+        self.context.persistence.mark_dirty('history', self._snapshot_history)
+
+    def _snapshot_history(self):
+        ops, self.context._pending_history_ops = self.context._pending_history_ops, []
+        if not ops:
+            return None
+        store = self.context.history_store
+        return lambda: store.apply(ops)
     
     def add_to_history(self, url, title=''):
         """Añade una entrada al historial"""
         from datetime import datetime
         
-        # Asegurarse de que self.history es una lista
-        if not hasattr(self, 'history') or self.history is None:
-            self.history = []
+        # Asegurarse de que el historial está cargado (normalmente lo hace _deferred_init)
+        if not hasattr(self.context, 'history') or self.context.history is None:
+            self.load_history()
+        if not hasattr(self.context, '_history_index'):
+            self._rebuild_history_index()
         
         # Ignorar páginas about: y URLs vacías
         if not url or url.toString().startswith('about:'):
@@ -953,40 +3749,36 @@ class MainWindow(QMainWindow):
             'visit_count': 1
         }
         
-        # Buscar si la URL ya existe
-        found = False
-        for i, existing in enumerate(self.history):
-            # Verificar que existing sea un diccionario
-            if not isinstance(existing, dict):
-                continue
-                
-            if existing.get('url') == entry['url']:
-                # Actualizar entrada existente
-                self.history[i] = {
-                    'url': existing['url'],
-                    'title': title or existing.get('title', ''),
-                    'timestamp': entry['timestamp'],
-                    'visit_count': existing.get('visit_count', 0) + 1
-                }
-                found = True
-                break
-        
-        if not found:
+        # Buscar si la URL ya existe (O(1) mediante el índice)
+        existing = self.context._history_index.get(entry['url'])
+        model = self.history_model()  # Las vistas abiertas reciben las señales de filas
+        removed = []
+        if existing is not None:
+            # Actualizar la entrada existente en su lugar
+            existing['title'] = title or existing.get('title', '')
+            existing['timestamp'] = entry['timestamp']
+            existing['visit_count'] = existing.get('visit_count', 0) + 1
+            model.entry_changed(existing)
+        else:
             # Si no existe, añadir al principio
-            self.history.insert(0, entry)
+            model.prepend(entry)
+            self.context._history_index[entry['url']] = entry
+            provider = getattr(self.context, '_suggestion_provider', None)
+            if provider:
+                provider.add_entry(entry)
             
-            # Limitar el historial a 1000 entradas
-            while len(self.history) > 1000:
-                self.history.pop()
-        
-        # Limpiar entradas inválidas
-        self.history = [h for h in self.history if isinstance(h, dict) and 'url' in h]
+            # Limitar el historial a HISTORY_LIMIT entradas
+            while len(self.context.history) > self.HISTORY_LIMIT:
+                old = model.pop_last()
+                self.context._history_index.pop(old['url'], None)
+                removed.append(old)
+                if provider:
+                    provider.remove_entry(old['url'])
             
-        # Guardar el historial actualizado
-        try:
-            self.save_history()
-        except Exception as e:
-            print(f"Error al guardar el historial: {e}")
+        # Registrar la visita en la base de datos en el próximo volcado
+        self._queue_history_op('upsert', entry['url'], title, entry['timestamp'])
+        for old in removed:
+            self._queue_history_op('delete', old['url'])
 
     def load_config(self):
         # Cargar la configuración del archivo
@@ -1002,10 +3794,24 @@ class MainWindow(QMainWindow):
             config = {}
 
         # Cargar valores con fallback a configuración predeterminada
-        self.homepage = config.get('homepage', 'https://duckduckgo.com')
-        self.search_engine = 'https://duckduckgo.com/?q='
-        self.proxy_host = config.get('proxy_host', '')
-        self.proxy_port = config.get('proxy_port', '')
+        self.context.homepage = config.get('homepage', 'https://duckduckgo.com')
+        self.context.search_engine = 'https://duckduckgo.com/?q='
+        self.context.proxy_host = config.get('proxy_host', '')
+        self.context.proxy_port = config.get('proxy_port', '')
+        
+        self.context.restore_session_on_start = config.get('restore_session', True)
+        self.context.cache_size_mb = config.get('cache_size_mb', ProfileManager.DEFAULT_CACHE_SIZE_MB)
+        self.context.content_blocking = config.get('content_blocking', True)
+        self.context.segmented_downloads = config.get('segmented_downloads', True)
+        self.context.download_segments = config.get('download_segments', SegmentedDownload.SEGMENTS)
+        self.context.max_downloads = config.get('max_downloads', DownloadScheduler.MAX_ACTIVE)
+        self.context.max_downloads_per_host = config.get('max_downloads_per_host', DownloadScheduler.MAX_PER_HOST)
+        self.context.download_rules = DownloadRules(config.get('download_rules', []))
+        
+        # Pestañas en segundo plano: minutos hasta congelar/descartar y umbral de memoria
+        self.context.tab_freeze_minutes = config.get('tab_freeze_minutes', 5)
+        self.context.tab_discard_minutes = config.get('tab_discard_minutes', 30)
+        self.context.tab_memory_threshold_mb = config.get('tab_memory_threshold_mb', 1024)
 
         # Restaurar tamaño de ventana
         w = config.get('window_width', 1200)
@@ -1018,12 +3824,12 @@ class MainWindow(QMainWindow):
         
         if saved_theme and saved_theme_class:
             print(f"Cargando tema guardado: {saved_theme} ({saved_theme_class})")
-            self.current_theme = saved_theme
-            self.theme_class = saved_theme_class
+            self.context.current_theme = saved_theme
+            self.context.theme_class = saved_theme_class
         else:
             print("Usando tema predeterminado")
-            self.current_theme = 'Oscuro'
-            self.theme_class = 'theme-dark'
+            self.context.current_theme = 'Oscuro'
+            self.context.theme_class = 'theme-dark'
 
         # Asegurar que el tema se aplique después de que la interfaz se haya inicializado
         QTimer.singleShot(100, self.apply_theme)
@@ -1031,29 +3837,39 @@ class MainWindow(QMainWindow):
     def save_config(self):
         # Recopilar la configuración actual
         config = {
-            'homepage': getattr(self, 'homepage', 'https://duckduckgo.com'),
+            'homepage': getattr(self.context, 'homepage', 'https://duckduckgo.com'),
             'search_engine': 'https://duckduckgo.com/?q=',  # Motor de búsqueda fijo
-            'proxy_host': getattr(self, 'proxy_host', ''),
-            'proxy_port': getattr(self, 'proxy_port', ''),
+            'proxy_host': getattr(self.context, 'proxy_host', ''),
+            'proxy_port': getattr(self.context, 'proxy_port', ''),
+            'restore_session': getattr(self.context, 'restore_session_on_start', True),
+            'cache_size_mb': getattr(self.context, 'cache_size_mb', ProfileManager.DEFAULT_CACHE_SIZE_MB),
+            'content_blocking': getattr(self.context, 'content_blocking', True),
+            'segmented_downloads': getattr(self.context, 'segmented_downloads', True),
+            'download_segments': getattr(self.context, 'download_segments', SegmentedDownload.SEGMENTS),
+            'max_downloads': getattr(self.context, 'max_downloads', DownloadScheduler.MAX_ACTIVE),
+            'max_downloads_per_host': getattr(self.context, 'max_downloads_per_host', DownloadScheduler.MAX_PER_HOST),
+            'download_rules': getattr(self.context, 'download_rules', DownloadRules()).rules,
+            'tab_freeze_minutes': getattr(self.context, 'tab_freeze_minutes', 5),
+            'tab_discard_minutes': getattr(self.context, 'tab_discard_minutes', 30),
+            'tab_memory_threshold_mb': getattr(self.context, 'tab_memory_threshold_mb', 1024),
             # Guardar tamaño de ventana
             'window_width': self.width(),
             'window_height': self.height()
         }
         
         # Guardar configuración del tema
-        if hasattr(self, 'current_theme') and hasattr(self, 'theme_class'):
+        if hasattr(self.context, 'current_theme') and hasattr(self.context, 'theme_class'):
             config.update({
-                'theme': self.current_theme,
-                'theme_class': self.theme_class
+                'theme': self.context.current_theme,
+                'theme_class': self.context.theme_class
             })
-            print(f"Guardando tema en configuración: {self.current_theme} ({self.theme_class})")
+            print(f"Guardando tema en configuración: {self.context.current_theme} ({self.context.theme_class})")
         
-        try:
-            with open(self.CONFIG_FILE, 'w') as f:
-                json.dump(config, f)
+        data = json.dumps(config).encode('utf-8')
+        def write():
+            atomic_write(self.CONFIG_FILE, data)
             print("Configuración guardada exitosamente")
-        except Exception as e:
-            print(f"Error al guardar la configuración: {e}")
+        self.context.persistence.mark_dirty('config', lambda: write)
 
     def add_newtab_button_tab(self):
         # Añade una pestaña especial con el icono de nueva pestaña y menos ancho
@@ -1164,6 +3980,8 @@ class MainWindow(QMainWindow):
         """Muestra la ventana de historial"""
         if not self._history_window:
             self._history_window = HistoryWindow(self)
+        else:
+            self._history_window.load_history()
         self._history_window.show()
         self._history_window.raise_()
         self._history_window.activateWindow()
@@ -1392,7 +4210,7 @@ class MainWindow(QMainWindow):
 
         # Selección de sugerencia
         def on_suggestion_clicked(item):
-            text = item.text()
+            text = item.data(Qt.UserRole) or item.text()
             print(f"[DEBUG] Suggestion clicked: {text}")
             self.urlbar.setText(text)
             self.hide_suggestions()
@@ -1415,7 +4233,7 @@ class MainWindow(QMainWindow):
 
         # Selección de sugerencia
         def on_suggestion_clicked(item):
-            text = item.text()
+            text = item.data(Qt.UserRole) or item.text()
             print(f"[DEBUG] Suggestion clicked: {text}")
             self.urlbar.setText(text)
             self.hide_suggestions()
@@ -1473,6 +4291,9 @@ class MainWindow(QMainWindow):
         
         menu.addAction(QIcon(self.icons_path + 'bookmarks.png'), 'Marcadores', self.show_bookmarks)
         menu.addAction(QIcon(self.icons_path + 'settings.png'), 'Configuración', self.show_settings)
+        menu.addAction('Buscar aplicación web en este sitio', self.probe_current_pwa)
+        menu.addAction('Rendimiento (fennex://perf)', lambda: self.show_perf_page(new_tab=True))
+        menu.addAction('Exportar métricas (JSONL)', self.export_perf_metrics)
         menu.addAction(QIcon(self.icons_path + 'about.png'), 'Acerca de', self.show_about)
         menu.addSeparator()
         menu.addAction(QIcon(self.icons_path + 'exit.png'), 'Salir', self.close)
@@ -1538,17 +4359,14 @@ class MainWindow(QMainWindow):
         toolbar.addWidget(control_widget)
     def show_downloads(self):
         try:
-            if not hasattr(self, '_downloads_window') or self._downloads_window is None:
-                self._downloads_window = DownloadsWindow(self)
-                if hasattr(self, 'theme_class'):
-                    self.apply_theme_to_widget(self._downloads_window)
-            self._downloads_window.show()
-            self._downloads_window.raise_()
-            self._downloads_window.activateWindow()
+            self.downloads_window()
+            self.context._downloads_window.show()
+            self.context._downloads_window.raise_()
+            self.context._downloads_window.activateWindow()
         except Exception as e:
             print(f"Error al mostrar ventana de descargas: {e}")
             # Intentar recrear la ventana si hubo un error
-            self._downloads_window = None
+            self.context._downloads_window = None
             self.show_downloads()
 
     def _urlbar_keypress_event(self, event):
@@ -1568,7 +4386,7 @@ class MainWindow(QMainWindow):
             elif event.key() == Qt.Key_Return and self.suggest_list.currentRow() >= 0:
                 item = self.suggest_list.currentItem()
                 if item:
-                    self.urlbar.setText(item.text())
+                    self.urlbar.setText(item.data(Qt.UserRole) or item.text())
                     self.hide_suggestions()
                     self.urlbar.setFocus()
                     self.navigate_to_url()
@@ -1580,7 +4398,6 @@ class MainWindow(QMainWindow):
         self._suggest_timer.start(200)
 
     def on_entry_changed(self, text):
-        import threading
         text = text.strip()
         if not hasattr(self, '_suggest_query_version'):
             self._suggest_query_version = 0
@@ -1588,36 +4405,52 @@ class MainWindow(QMainWindow):
         my_version = self._suggest_query_version
 
         if not text:
+            self.suggestion_service.cancel(my_version)
             self.suggestions_hide.emit()
             return
 
         # Permitir siempre nuevas sugerencias al escribir
         self._last_suggest_text = text
 
-        def fetch_suggestions(version):
-            try:
-                import requests
-                url = f"https://duckduckgo.com/ac/?q={requests.utils.quote(text)}"
-                res = requests.get(url, timeout=2)
-                data = res.json()
-                suggestions = [item['phrase'] for item in data if isinstance(item, dict) and 'phrase' in item]
-                # Solo mostrar/ocultar si es la última consulta
-                if self._suggest_query_version == version:
-                    self.suggestions_ready.emit(suggestions)
-            except Exception:
-                if self._suggest_query_version == version:
-                    self.suggestions_hide.emit()
-        threading.Thread(target=fetch_suggestions, args=(my_version,), daemon=True).start()
+        # Sugerencias locales inmediatas; las remotas se mezclan al llegar
+        self._local_suggestions = self.local_suggestions(text)
+        self.show_suggestions([])
+
+        self.suggestion_service.request(text, my_version)
+
+    def _on_remote_suggestions(self, version, suggestions):
+        # Solo mostrar si es la última consulta (si falla, se mantienen las locales)
+        if version == getattr(self, '_suggest_query_version', 0):
+            self.suggestions_ready.emit(suggestions)
     
+    def local_suggestions(self, text):
+        """Sugerencias del historial y marcadores (índice construido bajo demanda)"""
+        if getattr(self.context, '_suggestion_provider', None) is None:
+            self.context._suggestion_provider = LocalSuggestionProvider(
+                getattr(self.context, 'history', []), getattr(self.context, 'bookmarks', [])
+            )
+        return self.context._suggestion_provider.query(text)
+
     @pyqtSlot(list)
     def show_suggestions(self, data):
         self.suggest_list.clear()
-        if not isinstance(data, list) or not data:
+        local = getattr(self, '_local_suggestions', [])
+        if not isinstance(data, list):
+            data = []
+        if not data and not local:
             self.hide_suggestions()
             return
         
+        # Primero las locales (título y URL), luego las frases remotas
+        shown = set()
+        for suggestion in local:
+            item = QListWidgetItem(f"{suggestion['title']} — {suggestion['url']}")
+            item.setData(Qt.UserRole, suggestion['url'])
+            self.suggest_list.addItem(item)
+            shown.add(suggestion['url'])
         for phrase in data:
-            self.suggest_list.addItem(phrase)
+            if phrase not in shown:
+                self.suggest_list.addItem(phrase)
         
         self.suggest_list.setCurrentRow(-1)
         
@@ -1642,14 +4475,72 @@ class MainWindow(QMainWindow):
         if hasattr(self, 'suggest_popup') and self.suggest_popup:
             self.suggest_popup.hide()
 
-    def open_new_window(self):
-        import subprocess, sys, os
-        subprocess.Popen([sys.executable, os.path.abspath(__file__)])
+    def open_new_window(self, session=None):
+        """Abre otra ventana en el mismo proceso, con el perfil y los datos compartidos.
+        Con session (un elemento de la sesión guardada) restaura sus pestañas."""
+        window = MainWindow(session or None)
+        window.show()
+        return window
+
+    def closeEvent(self, event):
+        """Cierra esta ventana (se destruye por WA_DeleteOnClose); al cerrar la última
+        se guardan la configuración y la sesión y se sale de la aplicación"""
+        windows = self.context.windows
+        last = windows == [self]
+        if last:
+            # Guardar ahora: al salir ya no quedan ventanas de las que leer las pestañas
+            self.save_config()
+            self.save_session()
+        self.suggestion_service.shutdown()
+        if self in windows:
+            windows.remove(self)
+        super().closeEvent(event)
+        if last:
+            if self.context._downloads_window is not None:
+                self.context._downloads_window.close()
+            # Las PWA abiertas siguen funcionando; Qt sale cuando se cierre la última
+            if not open_app_window.windows:
+                QApplication.quit()
+
+    @staticmethod
+    def owner_of(widget):
+        """Ventana principal que contiene widget (o la más reciente si no hay ninguna)"""
+        while widget is not None and not isinstance(widget, MainWindow):
+            widget = widget.parentWidget()
+        windows = BrowserContext.instance().windows
+        if widget is None and windows:
+            widget = windows[-1]
+        return widget
+
+    @staticmethod
+    def route_download(download):
+        """Entrega la descarga del perfil a la ventana activa"""
+        window = MainWindow.owner_of(QApplication.activeWindow())
+        if window is not None:
+            window.on_download_requested(download)
+
+    def downloads_window(self):
+        """Ventana de descargas compartida: sin padre, pertenece al contexto y no a una ventana"""
+        if self.context._downloads_window is None:
+            try:
+                store = DownloadStore(self.DOWNLOADS_DB)
+            except Exception as e:
+                print(f"Error al abrir la base de datos de descargas: {e}")
+                store = None
+            self.context._downloads_window = DownloadsWindow(None, store, self.context.persistence)
+            self.context._downloads_window.scheduler.set_limits(
+                getattr(self.context, 'max_downloads', DownloadScheduler.MAX_ACTIVE),
+                getattr(self.context, 'max_downloads_per_host', DownloadScheduler.MAX_PER_HOST)
+            )
+            self.apply_theme_to_widget(self.context._downloads_window)
+        return self.context._downloads_window
 
     def show_history(self):
         """Muestra la ventana de historial"""
         if not self._history_window:
             self._history_window = HistoryWindow(self)
+        else:
+            self._history_window.load_history()
         self._history_window.show()
         self._history_window.raise_()
         self._history_window.activateWindow()
@@ -1663,7 +4554,7 @@ class MainWindow(QMainWindow):
         label = QLabel('Marcadores:')
         layout.addWidget(label)
         list_widget = QListWidget()
-        for url in getattr(self, 'bookmarks', []):
+        for url in getattr(self.context, 'bookmarks', []):
             list_widget.addItem(url)
         layout.addWidget(list_widget)
         add_btn = QPushButton('Agregar marcador actual')
@@ -1676,10 +4567,10 @@ class MainWindow(QMainWindow):
 
     def add_bookmark(self, list_widget):
         url = self.current_webview().url().toString()
-        if not hasattr(self, 'bookmarks'):
-            self.bookmarks = []
-        if url not in self.bookmarks:
-            self.bookmarks.append(url)
+        if not hasattr(self.context, 'bookmarks'):
+            self.context.bookmarks = []
+        if url not in self.context.bookmarks:
+            self.context.bookmarks.append(url)
             list_widget.addItem(url)
 
     def show_settings(self):
@@ -1698,8 +4589,11 @@ class MainWindow(QMainWindow):
         general_layout.addWidget(home_label)
         home_edit = QLineEdit()
         home_edit.setPlaceholderText('Ejemplo: https://duckduckgo.com')
-        home_edit.setText(getattr(self, 'homepage', 'https://duckduckgo.com'))
+        home_edit.setText(getattr(self.context, 'homepage', 'https://duckduckgo.com'))
         general_layout.addWidget(home_edit)
+        restore_check = QCheckBox('Restaurar las pestañas de la sesión anterior al iniciar')
+        restore_check.setChecked(getattr(self.context, 'restore_session_on_start', True))
+        general_layout.addWidget(restore_check)
         tabs.addTab(general_tab, 'General')
 
         # Pestaña Descargas
@@ -1709,7 +4603,7 @@ class MainWindow(QMainWindow):
         downloads_layout.addWidget(downloads_label)
         downloads_edit = QLineEdit()
         downloads_edit.setPlaceholderText('Ejemplo: /home/usuario/Descargas')
-        downloads_edit.setText(getattr(self, 'download_path', os.path.expanduser('~/Descargas')))
+        downloads_edit.setText(getattr(self.context, 'download_path', os.path.expanduser('~/Descargas')))
         downloads_layout.addWidget(downloads_edit)
         browse_btn = QPushButton('Seleccionar carpeta')
         def browse_folder():
@@ -1719,6 +4613,104 @@ class MainWindow(QMainWindow):
                 downloads_edit.setText(folder)
         browse_btn.clicked.connect(browse_folder)
         downloads_layout.addWidget(browse_btn)
+        segmented_check = QCheckBox(
+            f'Descargar archivos grandes (más de {SegmentedDownload.MIN_SIZE // (1024 * 1024)} MB) '
+            'en segmentos paralelos reanudables'
+        )
+        segmented_check.setChecked(getattr(self.context, 'segmented_downloads', True))
+        downloads_layout.addWidget(segmented_check)
+        segments_row = QHBoxLayout()
+        segments_row.addWidget(QLabel('Segmentos por descarga:'))
+        segments_spin = QSpinBox()
+        segments_spin.setRange(1, 16)
+        segments_spin.setValue(getattr(self.context, 'download_segments', SegmentedDownload.SEGMENTS))
+        segments_row.addWidget(segments_spin)
+        segments_row.addStretch()
+        downloads_layout.addLayout(segments_row)
+        limits_row = QHBoxLayout()
+        limits_row.addWidget(QLabel('Descargas simultáneas:'))
+        max_downloads_spin = QSpinBox()
+        max_downloads_spin.setRange(1, 20)
+        max_downloads_spin.setValue(getattr(self.context, 'max_downloads', DownloadScheduler.MAX_ACTIVE))
+        limits_row.addWidget(max_downloads_spin)
+        limits_row.addWidget(QLabel('Por servidor:'))
+        per_host_spin = QSpinBox()
+        per_host_spin.setRange(1, 20)
+        per_host_spin.setValue(getattr(self.context, 'max_downloads_per_host', DownloadScheduler.MAX_PER_HOST))
+        limits_row.addWidget(per_host_spin)
+        limits_row.addStretch()
+        downloads_layout.addLayout(limits_row)
+        # Reglas de aceptación: se evalúan en orden y la primera que coincide decide
+        downloads_layout.addWidget(QLabel('Reglas de descarga (la primera que coincide decide; sin regla, se pregunta):'))
+        rules_list = QListWidget()
+        edited_rules = list(getattr(self.context, 'download_rules', DownloadRules()).rules)
+        def refresh_rules():
+            rules_list.clear()
+            for rule in edited_rules:
+                rules_list.addItem(DownloadRules.describe(rule))
+        refresh_rules()
+        downloads_layout.addWidget(rules_list)
+        def add_rule():
+            rule_dialog = QDialog(dialog)
+            rule_dialog.setWindowTitle('Nueva regla de descarga')
+            rule_layout = QVBoxLayout(rule_dialog)
+            fields = {}
+            for key, label, placeholder in (
+                ('mime', 'Tipos MIME:', 'image/*, application/pdf'),
+                ('extensions', 'Extensiones:', '.iso, .zip'),
+                ('origins', 'Orígenes:', '*.example.org'),
+                ('min_size_mb', 'Tamaño mínimo (MB):', ''),
+                ('max_size_mb', 'Tamaño máximo (MB):', ''),
+                ('folder', 'Carpeta de destino:', getattr(self.context, 'download_path', '')),
+            ):
+                rule_layout.addWidget(QLabel(label))
+                fields[key] = QLineEdit()
+                fields[key].setPlaceholderText(placeholder)
+                rule_layout.addWidget(fields[key])
+            action_combo = QComboBox()
+            for action in DownloadRules.ACTIONS:
+                action_combo.addItem(DownloadRules.ACTION_LABELS[action], action)
+            rule_layout.addWidget(QLabel('Acción:'))
+            rule_layout.addWidget(action_combo)
+            rule_buttons = QHBoxLayout()
+            accept_rule_btn = QPushButton('Añadir')
+            cancel_rule_btn = QPushButton('Cancelar')
+            accept_rule_btn.clicked.connect(rule_dialog.accept)
+            cancel_rule_btn.clicked.connect(rule_dialog.reject)
+            rule_buttons.addWidget(accept_rule_btn)
+            rule_buttons.addWidget(cancel_rule_btn)
+            rule_layout.addLayout(rule_buttons)
+            if rule_dialog.exec_() != QDialog.Accepted:
+                return
+            raw = {key: field.text().strip() for key, field in fields.items()}
+            raw['action'] = action_combo.currentData()
+            rule = DownloadRules.normalize(raw)
+            if rule is None:
+                from PyQt5.QtWidgets import QMessageBox
+                QMessageBox.warning(dialog, 'Regla no válida', 'Los tamaños deben ser números.')
+                return
+            edited_rules.append(rule)
+            refresh_rules()
+        def remove_rule():
+            row = rules_list.currentRow()
+            if row >= 0:
+                del edited_rules[row]
+                refresh_rules()
+        def move_rule(offset):
+            row = rules_list.currentRow()
+            target = row + offset
+            if row >= 0 and 0 <= target < len(edited_rules):
+                edited_rules[row], edited_rules[target] = edited_rules[target], edited_rules[row]
+                refresh_rules()
+                rules_list.setCurrentRow(target)
+        rules_buttons = QHBoxLayout()
+        for text, slot in (('Añadir regla', add_rule), ('Eliminar', remove_rule),
+                           ('Subir', lambda: move_rule(-1)), ('Bajar', lambda: move_rule(1))):
+            btn = QPushButton(text)
+            btn.clicked.connect(slot)
+            rules_buttons.addWidget(btn)
+        rules_buttons.addStretch()
+        downloads_layout.addLayout(rules_buttons)
         tabs.addTab(downloads_tab, 'Descargas')
 
         # Pestaña Contraseñas guardadas con protección por contraseña maestra
@@ -1727,9 +4719,9 @@ class MainWindow(QMainWindow):
         passwords_label = QLabel('Contraseñas guardadas por dominio:')
         passwords_layout.addWidget(passwords_label)
         import base64
-        self.accounts = getattr(self, 'accounts', [])
+        self.context.accounts = getattr(self.context, 'accounts', [])
         from PyQt5.QtWidgets import QInputDialog, QMessageBox
-        master_key = getattr(self, 'master_password', None)
+        master_key = getattr(self.context, 'master_password', None)
         # Opción para borrar la contraseña maestra
         delete_master_btn = QPushButton('Borrar contraseña maestra')
         def delete_master():
@@ -1741,7 +4733,7 @@ class MainWindow(QMainWindow):
         if master_key is None:
             master, ok = QInputDialog.getText(dialog, 'Establecer contraseña maestra', 'Crea una contraseña maestra:', QLineEdit.Password)
             if ok and master:
-                self.master_password = master
+                self.context.master_password = master
                 self.save_master_password()
             else:
                 passwords_layout.addWidget(QLabel('No se estableció contraseña maestra.'))
@@ -1749,7 +4741,7 @@ class MainWindow(QMainWindow):
                 goto_next_tab = True
         else:
             pw, ok = QInputDialog.getText(dialog, 'Contraseña maestra', 'Introduce la contraseña maestra:', QLineEdit.Password)
-            if not (ok and pw and pw == self.master_password):
+            if not (ok and pw and pw == self.context.master_password):
                 QMessageBox.warning(dialog, 'Acceso denegado', 'Contraseña maestra incorrecta.')
                 passwords_layout.addWidget(QLabel('Acceso denegado.'))
                 tabs.addTab(passwords_tab, 'Contraseñas guardadas')
@@ -1758,7 +4750,7 @@ class MainWindow(QMainWindow):
                 goto_next_tab = False
         if not 'goto_next_tab' in locals() or not goto_next_tab:
             passwords_list = QListWidget()
-            for acc in self.accounts:
+            for acc in self.context.accounts:
                 passwords_list.addItem(f"{acc['usuario']}@{acc['dominio']}")
             passwords_layout.addWidget(passwords_list)
             add_password_btn = QPushButton('Agregar contraseña')
@@ -1773,8 +4765,8 @@ class MainWindow(QMainWindow):
                 if not (ok3 and dominio):
                     return
                 encoded = base64.b64encode(password.encode('utf-8')).decode('utf-8')
-                if not any(a['usuario'] == usuario and a['dominio'] == dominio for a in self.accounts):
-                    self.accounts.append({'usuario': usuario, 'password': encoded, 'dominio': dominio})
+                if not any(a['usuario'] == usuario and a['dominio'] == dominio for a in self.context.accounts):
+                    self.context.accounts.append({'usuario': usuario, 'password': encoded, 'dominio': dominio})
                     passwords_list.addItem(f"{usuario}@{dominio}")
                     self.save_encrypted_passwords()
             add_password_btn.clicked.connect(add_password)
@@ -1785,14 +4777,14 @@ class MainWindow(QMainWindow):
                 if selected >= 0:
                     item = passwords_list.item(selected).text()
                     usuario, dominio = item.split('@', 1)
-                    self.accounts = [a for a in self.accounts if not (a['usuario'] == usuario and a['dominio'] == dominio)]
+                    self.context.accounts = [a for a in self.context.accounts if not (a['usuario'] == usuario and a['dominio'] == dominio)]
                     passwords_list.takeItem(selected)
                     self.save_encrypted_passwords()
             remove_password_btn.clicked.connect(remove_password)
             passwords_layout.addWidget(remove_password_btn)
             clear_data_btn = QPushButton('Borrar todas las contraseñas')
             def clear_data():
-                self.accounts = []
+                self.context.accounts = []
                 passwords_list.clear()
                 self.save_encrypted_passwords()
             clear_data_btn.clicked.connect(clear_data)
@@ -1818,7 +4810,7 @@ class MainWindow(QMainWindow):
             themes_layout.addWidget(btn)
             theme_group.addButton(btn)
             # Si el tema actual coincide con este tema, seleccionarlo
-            current_theme = getattr(self, 'current_theme', 'Oscuro')
+            current_theme = getattr(self.context, 'current_theme', 'Oscuro')
             if current_theme == name:
                 btn.setChecked(True)
             # Guardar el nombre de la clase CSS como propiedad del botón
@@ -1827,6 +4819,96 @@ class MainWindow(QMainWindow):
         # Agregar la pestaña de temas
         tabs.addTab(themes_tab, 'Temas')
 
+        # Pestaña Pestañas (congelar/descartar en segundo plano)
+        tabs_tab = QWidget()
+        tabs_layout = QVBoxLayout(tabs_tab)
+        tabs_layout.addWidget(QLabel('Congelar pestañas en segundo plano tras (minutos):'))
+        freeze_spin = QSpinBox()
+        freeze_spin.setRange(1, 1440)
+        freeze_spin.setValue(getattr(self.context, 'tab_freeze_minutes', 5))
+        tabs_layout.addWidget(freeze_spin)
+        tabs_layout.addWidget(QLabel('Descartar pestañas en segundo plano tras (minutos):'))
+        discard_spin = QSpinBox()
+        discard_spin.setRange(1, 1440)
+        discard_spin.setValue(getattr(self.context, 'tab_discard_minutes', 30))
+        tabs_layout.addWidget(discard_spin)
+        tabs_layout.addWidget(QLabel('Descartar antes si la memoria libre baja de (MB):'))
+        memory_spin = QSpinBox()
+        memory_spin.setRange(0, 65536)
+        memory_spin.setSingleStep(256)
+        memory_spin.setValue(getattr(self.context, 'tab_memory_threshold_mb', 1024))
+        tabs_layout.addWidget(memory_spin)
+        tabs_layout.addStretch()
+        tabs.addTab(tabs_tab, 'Pestañas')
+
+        # Pestaña Caché (caché HTTP en disco)
+        cache_tab = QWidget()
+        cache_layout = QVBoxLayout(cache_tab)
+        cache_layout.addWidget(QLabel('Tamaño máximo de la caché en disco (MB):'))
+        cache_spin = QSpinBox()
+        cache_spin.setRange(16, 16384)
+        cache_spin.setSingleStep(64)
+        cache_spin.setValue(getattr(self.context, 'cache_size_mb', ProfileManager.DEFAULT_CACHE_SIZE_MB))
+        cache_layout.addWidget(cache_spin)
+        cache_stats_label = QLabel()
+        cache_stats_label.setWordWrap(True)
+        cache_layout.addWidget(cache_stats_label)
+        def refresh_cache_stats():
+            used, files = self.context.profile_manager.cache_stats()
+            cache_stats_label.setText(
+                f'Ubicación: {self.context.profile_manager.profile.cachePath()}\n'
+                f'En uso: {used / (1024 * 1024):.1f} MB de {self.context.profile_manager.cache_size_mb} MB '
+                f'({files} archivos)'
+            )
+        refresh_cache_stats()
+        clear_cache_btn = QPushButton('Vaciar caché')
+        # El borrado es asíncrono: actualizar las estadísticas un poco después
+        cache_stats_timer = QTimer(cache_tab)
+        cache_stats_timer.setSingleShot(True)
+        cache_stats_timer.timeout.connect(refresh_cache_stats)
+        def clear_cache():
+            self.context.profile_manager.clear_cache()
+            cache_stats_timer.start(1000)
+        clear_cache_btn.clicked.connect(clear_cache)
+        cache_layout.addWidget(clear_cache_btn)
+        cache_layout.addStretch()
+        tabs.addTab(cache_tab, 'Caché')
+
+        # Pestaña Bloqueo de contenido
+        blocking_tab = QWidget()
+        blocking_layout = QVBoxLayout(blocking_tab)
+        blocking_check = QCheckBox('Bloquear anuncios y rastreadores')
+        blocking_check.setChecked(getattr(self.context, 'content_blocking', True))
+        blocking_layout.addWidget(blocking_check)
+        blocking_info = QLabel()
+        blocking_info.setWordWrap(True)
+        blocking_layout.addWidget(blocking_info)
+        def refresh_blocking_info():
+            interceptor = self.context.profile_manager.interceptor
+            blocking_info.setText(
+                f'Listas de filtros (*.txt estilo EasyList): {ProfileManager.FILTERS_DIR}\n'
+                f'Reglas activas: {interceptor.engine.rule_count}\n'
+                f'Peticiones bloqueadas en esta sesión: {interceptor.blocked_count}'
+            )
+        refresh_blocking_info()
+        reload_filters_btn = QPushButton('Recargar listas de filtros')
+        def on_filters_loaded(_count):
+            reload_filters_btn.setEnabled(True)
+            refresh_blocking_info()
+        # La carga termina en otro hilo: la señal llega encolada al hilo de la interfaz
+        self.context.profile_manager.interceptor.filtersLoaded.connect(on_filters_loaded)
+        dialog.finished.connect(
+            lambda _result: self.context.profile_manager.interceptor.filtersLoaded.disconnect(on_filters_loaded)
+        )
+        def reload_filters():
+            reload_filters_btn.setEnabled(False)
+            blocking_info.setText('Cargando listas de filtros...')
+            self.context.profile_manager.load_filters()
+        reload_filters_btn.clicked.connect(reload_filters)
+        blocking_layout.addWidget(reload_filters_btn)
+        blocking_layout.addStretch()
+        tabs.addTab(blocking_tab, 'Bloqueo')
+
         # Pestaña Proxy
         proxy_tab = QWidget()
         proxy_layout = QVBoxLayout(proxy_tab)
@@ -1834,11 +4916,11 @@ class MainWindow(QMainWindow):
         proxy_layout.addWidget(proxy_label)
         proxy_host = QLineEdit()
         proxy_host.setPlaceholderText('Host (ej: 127.0.0.1)')
-        proxy_host.setText(getattr(self, 'proxy_host', ''))
+        proxy_host.setText(getattr(self.context, 'proxy_host', ''))
         proxy_layout.addWidget(proxy_host)
         proxy_port = QLineEdit()
         proxy_port.setPlaceholderText('Puerto (ej: 8080)')
-        proxy_port.setText(getattr(self, 'proxy_port', ''))
+        proxy_port.setText(getattr(self.context, 'proxy_port', ''))
         proxy_layout.addWidget(proxy_port)
         remove_proxy_btn = QPushButton('Quitar proxy')
         def remove_proxy():
@@ -1855,30 +4937,53 @@ class MainWindow(QMainWindow):
         # Botón guardar
         save_btn = QPushButton('Guardar cambios')
         def save_settings():
-            self.homepage = home_edit.text() or 'https://duckduckgo.com'
+            self.context.homepage = home_edit.text() or 'https://duckduckgo.com'
+            self.context.restore_session_on_start = restore_check.isChecked()
             # Tema seleccionado
             checked_theme = theme_group.checkedButton()
             if checked_theme:
-                old_theme = getattr(self, 'current_theme', None)
-                old_theme_class = getattr(self, 'theme_class', None)
+                old_theme = getattr(self.context, 'current_theme', None)
+                old_theme_class = getattr(self.context, 'theme_class', None)
                 
                 try:
-                    self.current_theme = checked_theme.text()
-                    self.theme_class = checked_theme.theme_class
-                    print(f"Cambiando de tema {old_theme} a {self.current_theme}")
-                    self.apply_theme()
+                    self.context.current_theme = checked_theme.text()
+                    self.context.theme_class = checked_theme.theme_class
+                    print(f"Cambiando de tema {old_theme} a {self.context.current_theme}")
+                    # El tema es común: aplicarlo en todas las ventanas abiertas
+                    for window in self.context.windows:
+                        window.apply_theme()
                 except Exception as e:
                     print(f"Error al cambiar el tema: {e}")
                     # Restaurar tema anterior si hay error
                     if old_theme and old_theme_class:
-                        self.current_theme = old_theme
-                        self.theme_class = old_theme_class
+                        self.context.current_theme = old_theme
+                        self.context.theme_class = old_theme_class
                         self.apply_theme()
             # Proxy
-            self.proxy_host = proxy_host.text()
-            self.proxy_port = proxy_port.text()
+            self.context.proxy_host = proxy_host.text()
+            self.context.proxy_port = proxy_port.text()
             # Descargas
-            self.download_path = downloads_edit.text() or os.path.expanduser('~/Descargas')
+            self.context.download_path = downloads_edit.text() or os.path.expanduser('~/Descargas')
+            self.context.segmented_downloads = segmented_check.isChecked()
+            self.context.download_segments = segments_spin.value()
+            self.context.max_downloads = max_downloads_spin.value()
+            self.context.max_downloads_per_host = per_host_spin.value()
+            if self.context._downloads_window is not None:
+                self.context._downloads_window.scheduler.set_limits(self.context.max_downloads, self.context.max_downloads_per_host)
+            self.context.download_rules = DownloadRules(edited_rules)
+            # Bloqueo de contenido
+            self.context.content_blocking = blocking_check.isChecked()
+            self.context.profile_manager.interceptor.enabled = self.context.content_blocking
+            # Caché
+            self.context.cache_size_mb = cache_spin.value()
+            self.context.profile_manager.set_cache_size(self.context.cache_size_mb)
+            # Pestañas en segundo plano
+            self.context.tab_freeze_minutes = freeze_spin.value()
+            self.context.tab_discard_minutes = discard_spin.value()
+            self.context.tab_memory_threshold_mb = memory_spin.value()
+            self.tab_lifecycle.freeze_after = self.context.tab_freeze_minutes * 60
+            self.tab_lifecycle.discard_after = self.context.tab_discard_minutes * 60
+            self.tab_lifecycle.memory_threshold_mb = self.context.tab_memory_threshold_mb
             # Sesiones
             if hasattr(self, 'session_checkboxes'):
                 self.sessions = {name: cb.isChecked() for name, cb in self.session_checkboxes.items()}
@@ -1897,18 +5002,46 @@ class MainWindow(QMainWindow):
         """Maneja el cambio de pestaña y actualiza la barra de URL"""
         if index >= 0 and index < self.tabs.count() - 1:  # Excluir el botón de nueva pestaña
             current_widget = self.tabs.widget(index)
+            # Las pestañas restauradas crean su vista solo al seleccionarlas
+            if isinstance(current_widget, LazyTab):
+                current_widget = self._materialize_lazy_tab(index)
+            # Despertar la pestaña si estaba congelada o descartada
+            self.tab_lifecycle.activate(current_widget)
             if hasattr(current_widget, 'url'):
                 self.update_urlbar(current_widget.url())
             elif hasattr(current_widget, 'page'):
                 self.update_urlbar(current_widget.page().url())
+            self._update_pwa_action(getattr(current_widget, 'current_manifest', None))
+
+    def _on_manifest_found(self, browser, manifest):
+        """Guarda el manifest detectado en la pestaña y actualiza el botón de instalación"""
+        browser.current_manifest = manifest or None
+        if browser is self.current_webview():
+            self._update_pwa_action(browser.current_manifest)
+
+    def _update_pwa_action(self, manifest):
+        if not hasattr(self, 'pwa_action'):
+            return
+        self.pwa_action.setEnabled(bool(manifest))
+        self.pwa_action.setVisible(bool(manifest))
+        if manifest:
+            self.pwa_action.setToolTip('Instalar este sitio como aplicación')
+        else:
+            self.pwa_action.setToolTip('Este sitio no se puede instalar como aplicación')
+
+    def probe_current_pwa(self):
+        """Busca el manifest en las rutas habituales aunque la página no lo declare"""
+        browser = self.current_webview()
+        if hasattr(browser, 'pwa_handler'):
+            browser.pwa_handler.check_pwa_support(probe=True)
 
     def apply_theme(self):
         """Aplica el tema actual a toda la interfaz"""
-        if not hasattr(self, 'theme_class') or not hasattr(self, 'current_theme'):
+        if not hasattr(self.context, 'theme_class') or not hasattr(self.context, 'current_theme'):
             print("No hay tema configurado")
             return
             
-        print(f"Aplicando tema: {self.current_theme} ({self.theme_class})")
+        print(f"Aplicando tema: {self.context.current_theme} ({self.context.theme_class})")
         
         # Definir los temas directamente en el código para asegurar su disponibilidad
         themes = {
@@ -1958,13 +5091,13 @@ class MainWindow(QMainWindow):
         
         try:
             # Obtener las variables del tema actual
-            theme_vars = themes.get(self.theme_class)
+            theme_vars = themes.get(self.context.theme_class)
             if not theme_vars:
-                raise ValueError(f"Tema no encontrado: {self.theme_class}")
+                raise ValueError(f"Tema no encontrado: {self.context.theme_class}")
             
             # Construir el CSS con las variables del tema
             css = f"""
-                /* Tema: {self.current_theme} */
+                /* Tema: {self.context.current_theme} */
                 QMainWindow, QDialog, QWidget {{
                     background-color: {theme_vars['--background']};
                     color: {theme_vars['--text']};
@@ -2059,7 +5192,7 @@ class MainWindow(QMainWindow):
             # Aplicar el estilo a todas las ventanas existentes
             for window in [
                 self._history_window,
-                self._downloads_window,
+                self.context._downloads_window,
                 getattr(self, 'suggest_popup', None)
             ]:
                 if window:
@@ -2070,7 +5203,7 @@ class MainWindow(QMainWindow):
                 for i in range(self.tabs.count() - 1):
                     browser = self.tabs.widget(i)
                     if isinstance(browser, QWebEngineView):
-                        is_dark = 'dark' in self.theme_class
+                        is_dark = 'dark' in self.context.theme_class
                         browser.page().runJavaScript(f'''
                             document.documentElement.style.setProperty('color-scheme', 
                                 '{is_dark and "dark" or "light"}');
@@ -2081,13 +5214,13 @@ class MainWindow(QMainWindow):
         except Exception as e:
             print(f"Error al aplicar el tema: {e}")
             # Aplicar tema oscuro por defecto
-            self.current_theme = 'Oscuro'
-            self.theme_class = 'theme-dark'
+            self.context.current_theme = 'Oscuro'
+            self.context.theme_class = 'theme-dark'
             self.apply_theme()
 
     def apply_theme_to_widget(self, widget):
         """Aplica el tema actual a un widget específico"""
-        if not hasattr(self, 'theme_class') or not widget:
+        if not hasattr(self.context, 'theme_class') or not widget:
             return
         
         try:
@@ -2130,54 +5263,47 @@ class MainWindow(QMainWindow):
         if browser and browser != self.current_webview():
             return
             
-        # Guardar historial
-        if not hasattr(self, 'history'):
-            self.history = []
-            
         if qurl is None:
             qurl = self.current_webview().url()
             
         # Verificar que qurl es un QUrl válido
+        # (el historial se registra en add_to_history al terminar la carga)
         if hasattr(qurl, 'toString'):
             url_str = qurl.toString()
-            if url_str and (not self.history or self.history[-1] != url_str):
-                self.history.append(url_str)
             self.urlbar.setText(url_str)
             self.urlbar.setCursorPosition(0)
 
     def add_new_tab(self, qurl=None, label='Nueva pestaña'):
         if qurl is None:
             qurl = QUrl('https://duckduckgo.com/')
-            
-        # Crear un nuevo QWebEngineView
-        browser = QWebEngineView()
+        browser = self.create_browser(qurl)
         
-        # Usar el perfil global para todas las pestañas
-        from PyQt5.QtWebEngineWidgets import QWebEngineProfile, QWebEnginePage
-        profile = QWebEngineProfile.defaultProfile()
-        page = QWebEnginePage(profile, browser)
+        # Insertar antes de la pestaña de nueva pestaña
+        i = self.tabs.insertTab(self.tabs.count() - 1, browser, label)
+        self.tabs.setCurrentIndex(i)
+        return browser
+
+    def create_browser(self, qurl):
+        """Crea y configura el QWebEngineView de una pestaña y empieza a cargar qurl"""
+        # Crear un nuevo QWebEngineView con una página del perfil compartido
+        # (el perfil y sus ajustes ya están configurados en ProfileManager)
+        browser = QWebEngineView()
+        page = self.context.profile_manager.create_page(browser)
         browser.setPage(page)
         
         # Conectar la señal de cambio de título
         browser.titleChanged.connect(lambda title: self.update_tab_title(browser, title))
         
-        # Configurar el perfil
-        profile.setHttpUserAgent('Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/94.0.4606.81 Safari/537.36')
-        profile.setHttpAcceptLanguage('es-ES,es;q=0.9,en;q=0.8')
-        
-        # Habilitar plugins y JavaScript
-        settings = browser.settings()
-        settings.setAttribute(settings.PluginsEnabled, True)
-        settings.setAttribute(settings.JavascriptEnabled, True)
-        settings.setAttribute(settings.JavascriptCanOpenWindows, True)
-        settings.setAttribute(settings.AllowRunningInsecureContent, True)
-        settings.setAttribute(settings.LocalStorageEnabled, True)
-        settings.setAttribute(settings.LocalContentCanAccessRemoteUrls, True)
-        settings.setAttribute(settings.AllowGeolocationOnInsecureOrigins, True)
-        settings.setAttribute(settings.AllowWindowActivationFromJavaScript, True)
-        
-        # Configurar política de seguridad de contenido más permisiva
-        page = browser.page()
+        # Tiempos de carga para fennex://perf
+        self.context.profile_manager.perf.attach(browser)
+        
+        # Detección de PWA: una vez por origen gracias a la caché de manifests
+        browser.current_manifest = None
+        browser.pwa_handler = PWAHandler(page)
+        browser.pwa_handler.manifestFound.connect(
+            lambda manifest, browser=browser: self._on_manifest_found(browser, manifest)
+        )
+        browser.loadFinished.connect(lambda ok, browser=browser: ok and browser.pwa_handler.check_pwa_support())
         
         # Configurar permisos de características
         def permission_handler(origin, feature):
@@ -2186,18 +5312,11 @@ class MainWindow(QMainWindow):
             lambda origin, feature: page.setFeaturePermission(origin, feature, permission_handler(origin, feature))
         )
         
-        # Establecer CSP más permisiva
-        page.profile().setUrlRequestInterceptor(None)  # Deshabilitar interceptor de solicitudes
-        
         # Configurar manejador de mensajes de consola JavaScript
         def ignore_js_console(level, message, line, source):
             pass
         page.javaScriptConsoleMessage = ignore_js_console
         
-        # Configurar permisos adicionales
-        page.profile().setPersistentCookiesPolicy(page.profile().AllowPersistentCookies)
-        page.profile().setHttpCacheType(page.profile().MemoryHttpCache)
-        
         # Establecer la URL
         browser.setUrl(qurl)
         
@@ -2214,21 +5333,10 @@ class MainWindow(QMainWindow):
         
         # Conectar señal para actualizar la barra de URL
         browser.urlChanged.connect(lambda qurl, browser=browser: self.update_urlbar(qurl, browser))
-        
-        # Insertar antes de la pestaña de nueva pestaña
-        i = self.tabs.insertTab(self.tabs.count() - 1, browser, label)
-        self.tabs.setCurrentIndex(i)
+        return browser
 
-    def on_download_requested(self, download):
-        """Maneja las solicitudes de descarga"""
-        print(f"Solicitud de descarga recibida: {download.downloadFileName()}")
-        
-        # Obtener el nombre sugerido del archivo
-        suggested_filename = download.downloadFileName()
-        if not suggested_filename:
-            suggested_filename = "download"
-            
-        # Crear un diálogo de selección de archivo
+    def _ask_download_path(self, download, suggested_filename):
+        """Pide confirmación y ubicación con diálogos modales; None si el usuario cancela"""
         from PyQt5.QtWidgets import QFileDialog, QMessageBox
         
         # Mostrar diálogo de confirmación con detalles del archivo
@@ -2254,24 +5362,49 @@ class MainWindow(QMainWindow):
         msg.setStandardButtons(QMessageBox.Yes | QMessageBox.No)
         
         if msg.exec_() != QMessageBox.Yes:
-            download.cancel()
-            return
+            return None
             
         # Mostrar diálogo para seleccionar ubicación
         full_path, _ = QFileDialog.getSaveFileName(
             self,
             'Guardar archivo',
-            os.path.join(self.download_path, suggested_filename),
+            os.path.join(self.context.download_path, suggested_filename),
             'Todos los archivos (*.*)'
         )
         
-        # Si el usuario cancela el diálogo
-        if not full_path:
+        # Cadena vacía si el usuario cancela el diálogo
+        return full_path or None
+
+    def on_download_requested(self, download):
+        """Maneja las solicitudes de descarga"""
+        print(f"Solicitud de descarga recibida: {download.downloadFileName()}")
+        
+        # Obtener el nombre sugerido del archivo
+        suggested_filename = download.downloadFileName()
+        if not suggested_filename:
+            suggested_filename = "download"
+            
+        from PyQt5.QtWidgets import QMessageBox
+        
+        # Las reglas de descarga deciden sin diálogos; sin regla, se pregunta como siempre
+        rules = getattr(self.context, 'download_rules', None) or DownloadRules()
+        rule = rules.match(download.mimeType(), suggested_filename,
+                           download.url().host(), download.totalBytes())
+        action = rule['action'] if rule else 'ask'
+        if action == 'reject':
+            print(f"Descarga rechazada por regla: {DownloadRules.describe(rule)}")
             download.cancel()
             return
-            
-        # Actualizar la ruta de descarga predeterminada
-        self.download_path = os.path.dirname(full_path)
+        if action == 'save':
+            folder = rule.get('folder') or self.context.download_path
+            full_path = rules.unique_path(folder, suggested_filename)
+        else:
+            full_path = self._ask_download_path(download, suggested_filename)
+            if not full_path:
+                download.cancel()
+                return
+            # Actualizar la ruta de descarga predeterminada
+            self.context.download_path = os.path.dirname(full_path)
         
         print(f"Iniciando descarga en: {full_path}")
         
@@ -2282,19 +5415,22 @@ class MainWindow(QMainWindow):
             # Configurar la descarga
             download.setPath(full_path)
             
-            # Mostrar la ventana de descargas
-            if self._downloads_window is None:
-                self._downloads_window = DownloadsWindow(self)
-            
-            self._downloads_window.show()
-            self._downloads_window.raise_()
-            self._downloads_window.activateWindow()
+            # Archivos grandes: motor propio por rangos si el servidor lo admite
+            if getattr(self.context, 'segmented_downloads', True) and download.totalBytes() >= SegmentedDownload.MIN_SIZE:
+                self._start_segmented_download(download, full_path, focus=action == 'ask')
+                return
             
-            # Agregar la descarga a la ventana antes de iniciarla
-            self._downloads_window.add_download(download)
+            # Mostrar la ventana de descargas; las aceptadas por regla no roban el foco
+            self.downloads_window()
+            self.context._downloads_window.show()
+            if action == 'ask':
+                self.context._downloads_window.raise_()
+                self.context._downloads_window.activateWindow()
             
-            # Iniciar la descarga
+            # Aceptar la descarga (Qt 5 lo exige aquí) y dejar que la cola
+            # decida si empieza ya o queda pausada esperando turno
             download.accept()
+            self.context._downloads_window.add_download(download)
             print(f"Descarga aceptada: {full_path}")
             
         except Exception as e:
@@ -2306,6 +5442,39 @@ class MainWindow(QMainWindow):
             download.cancel()
             print(f"Error al iniciar la descarga: {e}")
 
+    def _start_segmented_download(self, download, full_path, focus=True):
+        """Usa SegmentedDownload si el servidor admite rangos; si no, sigue con QtWebEngine.
+
+        En Qt 5 la descarga se cancela si no se acepta dentro del manejador de
+        downloadRequested, así que se acepta y se pausa mientras se comprueba
+        el servidor en segundo plano. Con focus=False (aceptada por una regla)
+        la ventana de descargas se muestra sin quitar el foco.
+        """
+        window = self.downloads_window()
+        download.accept()
+        download.pause()
+        headers = {'User-Agent': ProfileManager.USER_AGENT}
+        page = download.page() if hasattr(download, 'page') else None
+        if page is not None:
+            headers['Referer'] = page.url().toString()
+        segmented = SegmentedDownload(
+            download.url().toString(), full_path, headers, getattr(self.context, 'download_segments', 4), parent=window
+        )
+        def on_probed(ok):
+            # La cola de descargas decide cuándo empieza cada una
+            if ok:
+                download.cancel()
+                window.add_download(segmented)
+            else:
+                segmented.deleteLater()
+                window.add_download(download)
+            window.show()
+            if focus:
+                window.raise_()
+                window.activateWindow()
+        segmented.probed.connect(on_probed)
+        segmented.probe_async()
+
     def add_blank_tab(self):
         self.add_new_tab(QUrl('https://duckduckgo.com/'), 'Nueva pestaña')
 
@@ -2314,7 +5483,10 @@ class MainWindow(QMainWindow):
         if i == self.tabs.count() - 1:
             return
         if self.tabs.count() > 2:  # Al menos una pestaña normal y el botón de nueva pestaña
+            browser = self.tabs.widget(i)
             self.tabs.removeTab(i)
+            self.tab_lifecycle.forget(browser)
+            browser.deleteLater()  # Liberar la vista y su renderizador
             # Si la pestaña seleccionada es el botón de nueva pestaña, selecciona la anterior
             if self.tabs.currentIndex() == self.tabs.count() - 1:
                 self.tabs.setCurrentIndex(self.tabs.count() - 2)
@@ -2323,6 +5495,9 @@ class MainWindow(QMainWindow):
         """Actualiza el título de la pestaña con el título de la página"""
         index = self.tabs.indexOf(browser)
         if index != -1:  # Si se encuentra la pestaña
+            # Una pestaña dormida conserva el título guardado
+            if self.tab_lifecycle.is_sleeping(browser):
+                return
             # Si el título está vacío, usa 'Nueva pestaña'
             if not title:
                 title = 'Nueva pestaña'
@@ -2331,11 +5506,99 @@ class MainWindow(QMainWindow):
                 title = title[:17] + '...'
             self.tabs.setTabText(index, title)
 
+    SESSION_FILE = os.path.expanduser('~/.pyqt_chrome_session.json')
+
+    def save_session(self):
+        """Programa el guardado de las pestañas de todas las ventanas abiertas"""
+        windows = [window.session_state() for window in self.context.windows]
+        data = json.dumps({'windows': windows}).encode('utf-8')
+        self.context.persistence.mark_dirty('session', lambda: lambda: atomic_write(self.SESSION_FILE, data))
+
+    def session_state(self):
+        """Pestañas abiertas de esta ventana y su orden"""
+        tabs = []
+        for i in range(self.tabs.count() - 1):  # Excluir el botón de nueva pestaña
+            widget = self.tabs.widget(i)
+            if isinstance(widget, LazyTab):
+                tabs.append({'url': widget.url_str, 'title': widget.title})
+            elif isinstance(widget, QWebEngineView):
+                url = widget.url().toString()
+                if url:
+                    tabs.append({'url': url, 'title': widget.title() or self.tabs.tabText(i)})
+        return {'tabs': tabs, 'current': self.tabs.currentIndex()}
+
+    def restore_session(self):
+        """Restaura la primera ventana guardada aquí y abre otra ventana por cada una de las
+        demás; devuelve True si restauró alguna pestaña"""
+        try:
+            with open(self.SESSION_FILE, 'r', encoding='utf-8') as f:
+                session = json.load(f)
+        except (OSError, ValueError):
+            return False
+        if not isinstance(session, dict):
+            return False
+        # Formato anterior: una sola ventana sin la lista 'windows'
+        windows = [w for w in session.get('windows', [session]) if isinstance(w, dict) and w.get('tabs')]
+        if not windows or not self._restore_tabs(windows[0]):
+            return False
+        if windows[1:]:
+            # Después de mostrar esta ventana, para que las demás queden encima en orden
+            QTimer.singleShot(0, lambda: [self.open_new_window(state) for state in windows[1:]])
+        return True
+
+    def _restore_tabs(self, session):
+        """Crea pestañas perezosas para una ventana guardada; devuelve True si creó alguna"""
+        tabs = [t for t in session.get('tabs', []) if isinstance(t, dict) and t.get('url')]
+        if not tabs:
+            return False
+        current = min(max(session.get('current', 0), 0), len(tabs) - 1)
+        self.tabs.blockSignals(True)
+        for tab in tabs:
+            title = tab.get('title') or 'Nueva pestaña'
+            label = title if len(title) <= 20 else title[:17] + '...'
+            self.tabs.insertTab(self.tabs.count() - 1, LazyTab(tab['url'], title), label)
+        self.tabs.setCurrentIndex(current)
+        self.tabs.blockSignals(False)
+        self.on_tab_changed(current)  # Solo la pestaña activa empieza a cargar
+        return True
+
+    def _materialize_lazy_tab(self, index):
+        """Sustituye la pestaña perezosa del índice por un navegador real"""
+        placeholder = self.tabs.widget(index)
+        browser = self.create_browser(placeholder.url())
+        label = self.tabs.tabText(index)
+        self.tabs.blockSignals(True)
+        self.tabs.removeTab(index)
+        self.tabs.insertTab(index, browser, label)
+        self.tabs.setCurrentIndex(index)
+        self.tabs.blockSignals(False)
+        placeholder.deleteLater()
+        return browser
+
+    def show_tab_context_menu(self, pos):
+        """Menú contextual de la barra de pestañas"""
+        tabbar = self.tabs.tabBar()
+        index = tabbar.tabAt(pos)
+        browser = self.tabs.widget(index) if index != -1 else None
+        if not isinstance(browser, QWebEngineView):
+            return
+        menu = QMenu(self)
+        pin_action = menu.addAction('No descartar nunca esta pestaña')
+        pin_action.setCheckable(True)
+        pin_action.setChecked(self.tab_lifecycle.is_pinned(browser))
+        pin_action.toggled.connect(lambda checked: self.tab_lifecycle.set_pinned(browser, checked))
+        menu.addAction('Cerrar pestaña', lambda: self.close_tab(self.tabs.indexOf(browser)))
+        menu.exec_(tabbar.mapToGlobal(pos))
+
     def current_webview(self):
         return self.tabs.currentWidget()
 
     def navigate_to_url(self):
         text = self.urlbar.text().strip()
+        # Página interna de rendimiento
+        if text == PerfMonitor.PERF_URL:
+            self.show_perf_page()
+            return
         # Si parece URL, navega directo; si no, busca en DuckDuckGo
         if text.startswith('http://') or text.startswith('https://') or '.' in text:
             q = QUrl(text)
@@ -2347,6 +5610,26 @@ class MainWindow(QMainWindow):
             search_url = f'https://duckduckgo.com/?q={text}'
             self.current_webview().setUrl(QUrl(search_url))
 
+    def show_perf_page(self, new_tab=False):
+        """Muestra fennex://perf con las métricas recogidas"""
+        browser = self.add_new_tab(QUrl('about:blank'), 'Rendimiento') if new_tab else self.current_webview()
+        browser.setHtml(self.context.profile_manager.perf.render_html(), QUrl(PerfMonitor.PERF_URL))
+        self.urlbar.setText(PerfMonitor.PERF_URL)
+
+    def export_perf_metrics(self):
+        """Exporta las métricas de carga a un archivo JSONL"""
+        from PyQt5.QtWidgets import QFileDialog, QMessageBox
+        path, _ = QFileDialog.getSaveFileName(
+            self, 'Exportar métricas', os.path.expanduser('~/fennex-perf.jsonl'),
+            'JSON Lines (*.jsonl);;Todos los archivos (*.*)'
+        )
+        if not path:
+            return
+        try:
+            self.context.profile_manager.perf.export_jsonl(path)
+        except Exception as e:
+            QMessageBox.critical(self, 'Error', f'Error al exportar las métricas: {str(e)}')
+
     def navigate_home(self):
         self.current_webview().setUrl(QUrl('https://duckduckgo.com'))
 
@@ -2356,20 +5639,23 @@ class MainWindow(QMainWindow):
         title = self.current_webview().page().title()
 
         # Verifica si el marcador ya existe
-        if not hasattr(self, 'bookmarks'):
-            self.bookmarks = []
+        if not hasattr(self.context, 'bookmarks'):
+            self.context.bookmarks = []
+            self.context._bookmark_index = {}
 
         # Si el marcador ya existe, muestra un mensaje
-        if any(b.get('url') == url for b in self.bookmarks):
+        if url in self.context._bookmark_index:
             from PyQt5.QtWidgets import QMessageBox
             QMessageBox.information(self, 'Marcador', 'Esta página ya está en marcadores')
             return
 
         # Agrega el nuevo marcador
-        self.bookmarks.append({
+        bookmark = {
             'title': title,
             'url': url
-        })
+        }
+        self.context.bookmarks.append(bookmark)
+        self.context._bookmark_index[url] = bookmark
 
         # Guarda los marcadores en un archivo
         self.save_bookmarks()
@@ -2379,27 +5665,38 @@ class MainWindow(QMainWindow):
         QMessageBox.information(self, 'Marcador', 'Página agregada a marcadores')
 
     def save_bookmarks(self):
-        # Guarda los marcadores en un archivo JSON
+        # Programa el guardado de los marcadores en un archivo JSON
+        self.context._suggestion_provider = None  # Las sugerencias locales se reconstruyen al usarse
+        self.context.persistence.mark_dirty('bookmarks', self._snapshot_bookmarks)
+
+    def _snapshot_bookmarks(self):
         import json
         bookmarks_file = os.path.expanduser('~/.pyqt_chrome_bookmarks.json')
-        try:
-            with open(bookmarks_file, 'w') as f:
-                json.dump({'bookmarks': self.bookmarks}, f)
-        except Exception:
-            pass
+        bookmarks = list(self.context.bookmarks)
+        def write():
+            data = json.dumps({'bookmarks': bookmarks}).encode('utf-8')
+            atomic_write(bookmarks_file, data)
+        return write
 
     def load_bookmarks(self):
         # Carga los marcadores desde el archivo JSON
         import json
         bookmarks_file = os.path.expanduser('~/.pyqt_chrome_bookmarks.json')
-        self.bookmarks = []
+        self.context.bookmarks = []
         if os.path.exists(bookmarks_file):
             try:
                 with open(bookmarks_file, 'r') as f:
                     data = json.load(f)
-                    self.bookmarks = data.get('bookmarks', [])
+                    self.context.bookmarks = data.get('bookmarks', [])
             except Exception:
                 pass
+        self._rebuild_bookmark_index()
+
+    def _rebuild_bookmark_index(self):
+        """Reconstruye el índice URL -> marcador"""
+        self.context._bookmark_index = {
+            b['url']: b for b in self.context.bookmarks if isinstance(b, dict) and 'url' in b
+        }
 
     def translate_page(self):
         import urllib.parse
@@ -2421,8 +5718,8 @@ class MainWindow(QMainWindow):
 
     def install_current_pwa(self):
         """Instala la PWA detectada creando un acceso directo .desktop"""
-        current_tab = self.current_webview().parent()
-        if not current_tab or not hasattr(current_tab, "current_manifest") or not current_tab.current_manifest:
+        current_tab = self.current_webview()
+        if not current_tab or not getattr(current_tab, "current_manifest", None):
             print("[ERROR] No hay PWA para instalar")
             from PyQt5.QtWidgets import QMessageBox
             QMessageBox.warning(
@@ -2432,71 +5729,6 @@ class MainWindow(QMainWindow):
             )
             return
 
-        manifest = current_tab.current_manifest
-        name = manifest.get("name", "PWA")
-        url = manifest.get("start_url", manifest.get("currentUrl", self.current_webview().url().toString()))
-        icon = None
-
-        # Si la PWA tiene iconos, usar el más grande
-        icons = manifest.get("icons", [])
-        if icons:
-            # Ordenar por tamaño (si está disponible)
-            icons.sort(
-                key=lambda i: int(str(i.get("sizes", "0x0")).split("x")[0]),
-                reverse=True
-            )
-            icon = icons[0].get("src")
-            
-            # Si la URL del ícono es relativa, convertirla a absoluta
-            if icon and not icon.startswith(('http://', 'https://')):
-                from urllib.parse import urljoin
-                icon = urljoin(url, icon)
-
-        # Crear un ID único para la PWA basado en la URL
-        pwa_id = "foxpy." + hashlib.md5(url.encode()).hexdigest()[:8]
-
-        # Crear directorio para aplicaciones instaladas si no existe
-        apps_dir = os.path.expanduser("~/.local/share/applications")
-        os.makedirs(apps_dir, exist_ok=True)
-
-        # Preparar el archivo .desktop con metadatos adicionales
-        desktop_entry = f"""[Desktop Entry]
-    Name={name}
-    Comment=Aplicación web: {manifest.get('description', name)}
-    Exec=python3 {os.path.abspath(__file__)} --app="{url}"
-    Icon={icon if icon else "web-browser"}
-    Type=Application
-    Categories=Network;WebBrowser;
-    Terminal=false
-    StartupWMClass={pwa_id}
-    """
-        # Guardar el archivo .desktop
-        filepath = os.path.join(apps_dir, f"{pwa_id}.desktop")
-
-        try:
-            with open(filepath, "w") as f:
-                f.write(desktop_entry)
-            os.chmod(filepath, 0o755)
-            print(f"[INFO] PWA instalada: {filepath}")
-
-            # Mostrar mensaje de éxito
-            from PyQt5.QtWidgets import QMessageBox
-            QMessageBox.information(
-                self,
-                "PWA Instalada",
-                f'La aplicación "{name}" se ha instalado correctamente.\nLa encontrarás en tu menú de aplicaciones.'
-            )
-
-        except Exception as e:
-            print(f"[ERROR] No se pudo instalar la PWA: {e}")
-            QMessageBox.critical(
-                self,
-                "Error",
-                "Esta página web no se puede instalar como aplicación.\n"
-                "Asegúrate de que el sitio soporte PWAs."
-            )
-            return
-
         manifest = current_tab.current_manifest
         print("[INFO] Instalando PWA:", manifest)
 
@@ -2505,7 +5737,6 @@ class MainWindow(QMainWindow):
         short_name = manifest.get('short_name', name)
         description = manifest.get('description', '')
         start_url = manifest.get('start_url', '') or manifest.get('currentUrl', current_tab.url().toString())
-        icon_list = manifest.get('icons', [])
         
         # Crear diálogo de confirmación personalizado con tema oscuro
         from PyQt5.QtWidgets import QDialog, QVBoxLayout, QLabel, QPushButton, QHBoxLayout
@@ -2624,103 +5855,63 @@ class MainWindow(QMainWindow):
             print("[INFO] Instalación cancelada por el usuario")
             return
 
-        try:
-            # Crear directorios necesarios
-            apps_dir = os.path.expanduser("~/.local/share/applications")
-            icons_dir = os.path.expanduser("~/.local/share/icons/hicolor")
-            os.makedirs(apps_dir, exist_ok=True)
-            os.makedirs(icons_dir, exist_ok=True)
-
-            # Generar ID único para la PWA
-            pwa_id = "foxpy." + hashlib.md5(start_url.encode()).hexdigest()[:8]
+        # Generar ID único para la PWA
+        pwa_id = "foxpy." + hashlib.md5(start_url.encode()).hexdigest()[:8]
 
-            # Procesar y guardar el ícono
-            icon_path = "web-browser"  # Ícono por defecto
-            if icon_list:
-                try:
-                    # Ordenar íconos por tamaño (preferir el más grande)
-                    icons_by_size = sorted(
-                        icon_list,
-                        key=lambda i: int(str(i.get('sizes', '0x0')).split('x')[0]),
-                        reverse=True
-                    )
-                    
-                    best_icon = icons_by_size[0]
-                    icon_url = best_icon.get('src', '')
-                    
-                    # Convertir URL relativa a absoluta si es necesario
-                    if icon_url and not icon_url.startswith(('http://', 'https://')):
-                        from urllib.parse import urljoin
-                        icon_url = urljoin(start_url, icon_url)
-                    
-                    if icon_url:
-                        # Determinar el tamaño del ícono
-                        icon_size = best_icon.get('sizes', '128x128').split('x')[0]
-                        icon_dir = os.path.join(icons_dir, f"{icon_size}x{icon_size}")
-                        os.makedirs(icon_dir, exist_ok=True)
-                        
-                        # Procesar nombre y extensión del ícono
-                        from urllib.parse import urlparse
-                        from os.path import splitext
-                        icon_ext = splitext(urlparse(icon_url).path)[1] or '.png'
-                        icon_filename = f"{pwa_id}{icon_ext}"
-                        icon_save_path = os.path.join(icon_dir, icon_filename)
-                        
-                        # Descargar y guardar el ícono
-                        import requests
-                        response = requests.get(icon_url, timeout=5)
-                        response.raise_for_status()
-                        
-                        with open(icon_save_path, 'wb') as f:
-                            f.write(response.content)
-                        
-                        # Actualizar la ruta del ícono
-                        icon_path = os.path.splitext(icon_filename)[0]
-                        print(f"[INFO] Ícono guardado: {icon_save_path}")
+        # Los iconos se descargan y escriben en segundo plano
+        from PyQt5.QtWidgets import QProgressDialog
+        progress = QProgressDialog(f'Instalando {name}...', None, 0, 100, self)
+        progress.setWindowTitle('Instalar aplicación web')
+        progress.setStyleSheet('background-color: #232323; color: #eee;')
+        progress.setMinimumDuration(500)
+        progress.setAutoClose(False)
+        progress.setValue(0)
 
-                except Exception as e:
-                    print(f"[ERROR] Error al procesar el ícono: {e}")
-                    # Continuar con el ícono por defecto
-            
-            # Crear archivo .desktop
-            desktop_entry = f"""[Desktop Entry]
+        installer = PWAIconInstaller(current_tab.page(), manifest, pwa_id, parent=self)
+        def on_progress(value, message):
+            progress.setLabelText(message)
+            progress.setValue(value)
+        def on_finished(icon_name):
+            progress.close()
+            installer.deleteLater()
+            self._write_pwa_desktop_entry(name, short_name, start_url, pwa_id, icon_name or "web-browser")
+        installer.progress.connect(on_progress)
+        installer.finished.connect(on_finished)
+        installer.start()
+
+    def _write_pwa_desktop_entry(self, name, short_name, start_url, pwa_id, icon_name):
+        """Crea el archivo .desktop de la PWA cuando los iconos ya están instalados"""
+        from PyQt5.QtWidgets import QMessageBox
+        desktop_entry = f"""[Desktop Entry]
 Name={name}
 Comment=Web App for {short_name}
 Exec=python3 {os.path.abspath(__file__)} --app="{start_url}"
-Icon={icon_path}
+Icon={icon_name}
 Type=Application
 Categories=Network;WebBrowser;
 StartupWMClass={pwa_id}
 """
 
-            # Guardar el archivo .desktop
-            desktop_file = os.path.join(apps_dir, f"{pwa_id}.desktop")
-            try:
-                with open(desktop_file, "w") as f:
-                    f.write(desktop_entry)
-                os.chmod(desktop_file, 0o755)
-                print(f"[INFO] PWA instalada en: {desktop_file}")
+        # Guardar el archivo .desktop
+        apps_dir = os.path.expanduser("~/.local/share/applications")
+        desktop_file = os.path.join(apps_dir, f"{pwa_id}.desktop")
+        try:
+            os.makedirs(apps_dir, exist_ok=True)
+            with open(desktop_file, "w") as f:
+                f.write(desktop_entry)
+            os.chmod(desktop_file, 0o755)
+            print(f"[INFO] PWA instalada en: {desktop_file}")
 
-                # Mostrar mensaje de éxito
-                from PyQt5.QtWidgets import QMessageBox
-                QMessageBox.information(
-                    self,
-                    'PWA Instalada',
-                    f'La aplicación {name} ha sido instalada correctamente.\n'
-                    'Puedes encontrarla en tu menú de aplicaciones.'
-                )
+            # Mostrar mensaje de éxito
+            QMessageBox.information(
+                self,
+                'PWA Instalada',
+                f'La aplicación {name} ha sido instalada correctamente.\n'
+                'Puedes encontrarla en tu menú de aplicaciones.'
+            )
 
-            except Exception as e:
-                print(f"[ERROR] Error al guardar el archivo .desktop: {e}")
-                QMessageBox.critical(
-                    self,
-                    'Error',
-                    f'Error al instalar la PWA:\n{str(e)}'
-                )
-                
         except Exception as e:
-            print(f"[ERROR] Error general en la instalación: {e}")
-            from PyQt5.QtWidgets import QMessageBox
+            print(f"[ERROR] Error al guardar el archivo .desktop: {e}")
             QMessageBox.critical(
                 self,
                 'Error',
@@ -2759,7 +5950,7 @@ StartupWMClass={pwa_id}
 
         def refresh_bookmarks_list():
             bookmarks_list.clear()
-            for bookmark in self.bookmarks:
+            for bookmark in self.context.bookmarks:
                 bookmarks_list.addItem(f"{bookmark['title']} - {bookmark['url']}")
 
         # Agrega los marcadores a la lista
@@ -2796,7 +5987,7 @@ StartupWMClass={pwa_id}
 <H1>Marcadores</H1>
 <DL><p>
 '''
-                for bookmark in self.bookmarks:
+                for bookmark in self.context.bookmarks:
                     date_added = datetime.now().timestamp()
                     html_content += f'''    <DT><A HREF="{html.escape(bookmark['url'])}" ADD_DATE="{int(date_added)}">{html.escape(bookmark['title'])}</A>\n'''
                 
@@ -2834,9 +6025,11 @@ StartupWMClass={pwa_id}
                     url = html.unescape(match.group(1))
                     title = html.unescape(match.group(2))
                     
-                    # Verificar si el marcador ya existe
-                    if not any(b['url'] == url for b in self.bookmarks):
-                        self.bookmarks.append({'url': url, 'title': title})
+                    # Verificar si el marcador ya existe (O(1) mediante el índice)
+                    if url not in self.context._bookmark_index:
+                        bookmark = {'url': url, 'title': title}
+                        self.context.bookmarks.append(bookmark)
+                        self.context._bookmark_index[url] = bookmark
                         imported += 1
                 
                 if imported > 0:
@@ -2873,8 +6066,10 @@ StartupWMClass={pwa_id}
         def delete_bookmark():
             current_row = bookmarks_list.currentRow()
             if current_row >= 0:
-                # Elimina el marcador de la lista y del arreglo
-                self.bookmarks.pop(current_row)
+                # Elimina el marcador de la lista, del arreglo y del índice
+                removed = self.context.bookmarks.pop(current_row)
+                if isinstance(removed, dict):
+                    self.context._bookmark_index.pop(removed.get('url'), None)
                 bookmarks_list.takeItem(current_row)
                 self.save_bookmarks()
         delete_btn.clicked.connect(delete_bookmark)
@@ -2887,14 +6082,259 @@ StartupWMClass={pwa_id}
         layout.addLayout(button_layout)
         dialog.exec_()
 
+class SingleInstance(QObject):
+    """Servidor local que hace que solo haya un proceso del navegador por usuario.
+
+    El primer proceso escucha en un QLocalServer; los siguientes envían sus
+    argumentos (--app, URLs) como una línea JSON con forward_to_running_instance
+    al principio del módulo, antes de cargar QtWebEngine, y salen. El proceso
+    en marcha recibe el mensaje con la señal messageReceived.
+    """
+    messageReceived = pyqtSignal(dict)
+    CONNECT_TIMEOUT_MS = 500
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.server = None
+        self._buffers = {}
+
+    @staticmethod
+    def server_name():
+        return single_instance_name()
+
+    @classmethod
+    def send(cls, message):
+        """Envía message al proceso en marcha; devuelve False si no hay ninguno"""
+        return forward_to_running_instance(message, cls.CONNECT_TIMEOUT_MS)
+
+    @classmethod
+    def is_running(cls):
+        """True si otro proceso acepta conexiones en el socket (aunque tarde en responder)"""
+        from PyQt5.QtNetwork import QLocalSocket
+        socket = QLocalSocket()
+        socket.connectToServer(cls.server_name())
+        connected = socket.waitForConnected(cls.CONNECT_TIMEOUT_MS)
+        socket.abort()
+        return connected
+
+    def listen(self):
+        """Empieza a escuchar; solo elimina el socket si nadie lo atiende (proceso que terminó mal).
+        Devuelve False si no puede escuchar, por ejemplo porque otro proceso se adelantó."""
+        from PyQt5.QtNetwork import QLocalServer
+        self.server = QLocalServer(self)
+        self.server.setSocketOptions(QLocalServer.UserAccessOption)
+        self.server.newConnection.connect(self._on_new_connection)
+        if not self.server.listen(self.server_name()):
+            if self.is_running():
+                print("Ya hay otro proceso del navegador escuchando")
+                return False
+            QLocalServer.removeServer(self.server_name())
+            if not self.server.listen(self.server_name()):
+                print(f"No se pudo iniciar el servidor de instancia única: {self.server.errorString()}")
+                return False
+        return True
+
+    def _on_new_connection(self):
+        while self.server.hasPendingConnections():
+            socket = self.server.nextPendingConnection()
+            self._buffers[socket] = b''
+            socket.readyRead.connect(lambda socket=socket: self._on_ready_read(socket))
+            socket.disconnected.connect(lambda socket=socket: self._on_disconnected(socket))
+
+    def _on_ready_read(self, socket):
+        self._buffers[socket] = self._buffers.get(socket, b'') + bytes(socket.readAll())
+        if b'\n' in self._buffers[socket]:
+            line = self._buffers.pop(socket).split(b'\n', 1)[0]
+            try:
+                message = json.loads(line.decode('utf-8'))
+            except ValueError as e:
+                print(f"Mensaje de instancia única no válido: {e}")
+                return
+            if isinstance(message, dict):
+                self.messageReceived.emit(message)
+
+    def _on_disconnected(self, socket):
+        self._buffers.pop(socket, None)
+        socket.deleteLater()
+
+def open_app_window(url):
+    """Abre una PWA en una ventana sin controles del navegador"""
+    # Crear una ventana simple para la PWA
+    window = QMainWindow()
+    window.setWindowTitle('Aplicación Web')
+    window.setMinimumSize(800, 600)
+    
+    # Crear vista web sin controles (con el perfil compartido ya configurado)
+    profile_manager = ProfileManager.instance()
+    webview = QWebEngineView()
+    webview.setPage(profile_manager.create_page(webview))
+    window.setCentralWidget(webview)
+    webview.titleChanged.connect(lambda title: window.setWindowTitle(title or 'Aplicación Web'))
+    
+    # Cargar la URL
+    webview.setUrl(QUrl(url))
+    
+    # Aplicar estilo sin bordes y configuración para PWA
+    window.setWindowFlags(Qt.Window)
+    window.setAttribute(Qt.WA_DeleteOnClose)
+    
+    # Mantener una referencia mientras la ventana esté abierta
+    open_app_window.windows.append(window)
+    window.destroyed.connect(
+        lambda: open_app_window.windows.remove(window) if window in open_app_window.windows else None
+    )
+    
+    # Mostrar la ventana
+    window.show()
+    return window
+
+open_app_window.windows = []
+
+def process_rss_mb(pid='self'):
+    """RSS de un proceso y de todos sus descendientes (los procesos de QtWebEngine), en MB"""
+    def rss(p):
+        try:
+            with open(f'/proc/{p}/status') as f:
+                for line in f:
+                    if line.startswith('VmRSS:'):
+                        return int(line.split()[1]) / 1024
+        except OSError:
+            pass
+        return 0.0
+    def children(p):
+        result = []
+        try:
+            for tid in os.listdir(f'/proc/{p}/task'):
+                with open(f'/proc/{p}/task/{tid}/children') as f:
+                    result.extend(f.read().split())
+        except OSError:
+            pass
+        return result
+    own = rss(pid)
+    total, pending = own, children(pid)
+    while pending:
+        child = pending.pop()
+        total += rss(child)
+        pending.extend(children(child))
+    return round(own, 1), round(total, 1)
+
+def attach_startup_probe(webview):
+    """Modo --startup-probe: mide ventana visible y primera carga, imprime JSON y sale"""
+    t0 = float(os.environ.get('FENNEX_BENCH_T0') or time.time())
+    result = {}
+    def on_window():
+        result['time_to_window_ms'] = round((time.time() - t0) * 1000, 1)
+    def on_load(ok):
+        if 'time_to_first_load_ms' in result:
+            return
+        result['time_to_first_load_ms'] = round((time.time() - t0) * 1000, 1)
+        result['load_ok'] = ok
+        result['rss_mb'], result['rss_total_mb'] = process_rss_mb()
+        print('FENNEX_BENCH ' + json.dumps(result), flush=True)
+        QApplication.instance().quit()
+    QTimer.singleShot(0, on_window)  # Primera vuelta del bucle de eventos: ventana ya mostrada
+    webview.loadFinished.connect(on_load)
+
+def run_startup_benchmark(runs=5, timeout=60):
+    """Lanza el navegador y el modo --app N veces con caché fría y caliente.
+
+    Cada ejecución es un proceso nuevo con QT_QPA_PLATFORM=offscreen y un
+    HOME temporal, que carga una página estática servida en local. 'cold'
+    usa un HOME (perfil, caché HTTP, configuración) recién creado en cada
+    ejecución; 'warm' reutiliza uno que se ha calentado antes con una
+    ejecución descartada. La caché de páginas del sistema operativo no se
+    vacía. Devuelve un diccionario listo para volcar a JSON.
+    """
+    import http.server
+    import statistics
+
+    site = tempfile.mkdtemp(prefix='fennex-bench-site-')
+    with open(os.path.join(site, 'style.css'), 'w') as f:
+        f.write('body { font-family: sans-serif; } ' * 200)
+    with open(os.path.join(site, 'index.html'), 'w') as f:
+        f.write('<!DOCTYPE html><html><head><title>Fennex bench</title>'
+                '<link rel="stylesheet" href="style.css"></head><body>'
+                + '<p>Lorem ipsum dolor sit amet.</p>' * 500 + '</body></html>')
+
+    class QuietHandler(http.server.SimpleHTTPRequestHandler):
+        def __init__(self, *args, **kwargs):
+            super().__init__(*args, directory=site, **kwargs)
+        def log_message(self, *args):
+            pass
+
+    server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), QuietHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f'http://127.0.0.1:{server.server_address[1]}/index.html'
+
+    def make_home():
+        home = tempfile.mkdtemp(prefix='fennex-bench-home-')
+        with open(os.path.join(home, '.pyqt_chrome_config.json'), 'w') as f:
+            json.dump({'homepage': url, 'restore_session': False}, f)
+        return home
+
+    def launch(mode, home):
+        env = dict(os.environ, HOME=home, XDG_CACHE_HOME=os.path.join(home, '.cache'),
+                   QT_QPA_PLATFORM='offscreen', FENNEX_BENCH_T0=repr(time.time()))
+        cmd = [sys.executable, os.path.abspath(__file__), '--new-instance', '--startup-probe']
+        if mode == 'app':
+            cmd.append(f'--app={url}')
+        try:
+            proc = subprocess.run(cmd, env=env, capture_output=True, text=True, timeout=timeout)
+        except subprocess.TimeoutExpired:
+            return {'error': 'timeout'}
+        for line in proc.stdout.splitlines():
+            if line.startswith('FENNEX_BENCH '):
+                return json.loads(line[len('FENNEX_BENCH '):])
+        return {'error': f'exit code {proc.returncode}', 'stderr': proc.stderr[-2000:]}
+
+    metrics = ('time_to_window_ms', 'time_to_first_load_ms', 'rss_mb', 'rss_total_mb')
+    results = {'url': url, 'runs': runs, 'python': sys.version.split()[0], 'results': {}}
+    homes = []
+    try:
+        for mode in ('browser', 'app'):
+            for cache in ('cold', 'warm'):
+                if cache == 'warm':
+                    warm_home = make_home()
+                    homes.append(warm_home)
+                    launch(mode, warm_home)  # Calentamiento, se descarta
+                samples = []
+                for _ in range(runs):
+                    if cache == 'cold':
+                        home = make_home()
+                        homes.append(home)
+                    else:
+                        home = warm_home
+                    samples.append(launch(mode, home))
+                ok = [s for s in samples if 'error' not in s]
+                summary = {}
+                for metric in metrics:
+                    values = [s[metric] for s in ok if s.get(metric) is not None]
+                    if values:
+                        summary[metric] = {
+                            'median': statistics.median(values),
+                            'min': min(values),
+                            'max': max(values),
+                        }
+                results['results'][f'{mode}/{cache}'] = {
+                    'summary': summary, 'failures': len(samples) - len(ok), 'samples': samples
+                }
+    finally:
+        server.shutdown()
+        for path in homes + [site]:
+            shutil.rmtree(path, ignore_errors=True)
+    return results
+
 if __name__ == '__main__':
     import os, json
-    import argparse
 
-    # Parsear argumentos de línea de comandos
-    parser = argparse.ArgumentParser(description='FoxPy Browser')
-    parser.add_argument('--app', type=str, help='URL de la aplicación web a cargar en modo PWA')
-    args = parser.parse_args()
+    # Argumentos ya leídos al principio del módulo (ver forward_to_running_instance)
+    args = ARGUMENTS
+    profiler = StartupProfiler.active
+    
+    # Con --benchmark-startup este proceso solo lanza y mide los demás
+    if args.benchmark_startup:
+        print(json.dumps(run_startup_benchmark(args.benchmark_startup), indent=2))
+        sys.exit(0)
 
     def get_proxy_env():
         config_file = os.path.expanduser('~/.pyqt_chrome_config.json')
@@ -2914,34 +6354,99 @@ if __name__ == '__main__':
     if proxy_url:
         os.environ['QTWEBENGINE_HTTP_PROXY'] = proxy_url
 
-    app = QApplication(sys.argv)
+    with startup_span('QApplication'):
+        app = QApplication(sys.argv)
     
-    # Si se especifica --app, iniciar en modo PWA
-    if args.app:
-        # Crear una ventana simple para la PWA
-        window = QMainWindow()
-        window.setWindowTitle('Aplicación Web')
-        window.setMinimumSize(800, 600)
-        
-        # Crear vista web sin controles
-        webview = QWebEngineView()
-        window.setCentralWidget(webview)
-        
-        # Cargar la URL
-        webview.setUrl(QUrl(args.app))
-        
-        # Aplicar estilo sin bordes y configuración para PWA
-        window.setWindowFlags(Qt.Window)
-        window.setAttribute(Qt.WA_DeleteOnClose)
-        
-        # Mostrar la ventana
+    # Instancia única: este proceso pasa a ser el que atiende a los siguientes. Si otro
+    # se adelantó desde la comprobación inicial, reenviarle los argumentos y salir
+    single_instance = None
+    if uses_single_instance(args):
+        single_instance = SingleInstance()
+        if not single_instance.listen():
+            if SingleInstance.send({'app': args.app, 'urls': args.urls}):
+                sys.exit(0)
+            single_instance = None
+
+    def open_urls(window, urls):
+        for url in urls:
+            window.add_new_tab(QUrl.fromUserInput(url), 'Nueva pestaña')
+
+    def handle_message(message):
+        """Atiende los argumentos reenviados por otra invocación"""
+        if message.get('app'):
+            open_app_window(message['app'])
+            return
+        urls = [url for url in message.get('urls') or [] if isinstance(url, str)]
+        windows = BrowserContext.instance().windows
+        if not windows:
+            window = MainWindow()
+            window.show()
+        elif urls:
+            window = MainWindow.owner_of(QApplication.activeWindow())
+        else:
+            window = windows[-1].open_new_window()
+        open_urls(window, urls)
+        window.showNormal()
+        window.raise_()
+        window.activateWindow()
+
+    def on_close():
+        context = BrowserContext.instance()
+        if not context.loaded:
+            return
+        if context.windows:
+            # Salida con ventanas abiertas (al cerrar la última ya se guardó en closeEvent)
+            window = context.windows[0]
+            window.save_config()
+            window.save_session()  # Guarda las pestañas de todas las ventanas
+            for open_window in context.windows:
+                open_window.suggestion_service.shutdown()
+        # Volcado final de todo lo pendiente antes de salir
+        context.persistence.flush(wait=True)
+
+    # Con --benchmark-tabs, medir la creación de pestañas y salir
+    if args.benchmark_tabs:
+        window = MainWindow()
         window.show()
+        def run_benchmark():
+            print(json.dumps(ProfileManager.benchmark_tab_creation(window, args.benchmark_tabs)))
+            app.quit()
+        QTimer.singleShot(0, run_benchmark)
+    # Si se especifica --app, iniciar en modo PWA
+    elif args.app:
+        app_window = open_app_window(args.app)
+        if args.startup_probe:
+            attach_startup_probe(app_window.centralWidget())
     else:
         # Modo navegador normal
-        window = MainWindow()
-        window.show()
-        def on_close():
-            window.save_config()
+        with startup_span('MainWindow'):
+            window = MainWindow()
+            open_urls(window, args.urls)
+        with startup_span('show'):
+            window.show()
+        if args.startup_probe:
+            attach_startup_probe(window.current_webview())
+    
+    # Con --profile-startup, guardar la traza al terminar la primera carga (o a los 15 s)
+    if profiler is not None:
+        trace_state = {'written': False}
+        def write_trace(*loaded):
+            if trace_state['written']:
+                return
+            trace_state['written'] = True
+            profiler.instant('first load finished' if loaded else 'timeout')
+            profiler.write(args.profile_startup)
+        QTimer.singleShot(0, lambda: profiler.instant('event loop running'))
+        QTimer.singleShot(15000, write_trace)
+        windows = BrowserContext.instance().windows
+        if windows:
+            current = windows[0].current_webview()
+            if isinstance(current, QWebEngineView):
+                current.loadFinished.connect(write_trace)
+    
+    if single_instance is not None:
+        single_instance.messageReceived.connect(handle_message)
+    if not args.benchmark_tabs:
         app.aboutToQuit.connect(on_close)
     
-    sys.exit(app.exec_())
\ No newline at end of file
+    sys.exit(app.exec_())
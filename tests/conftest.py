@@ -0,0 +1,49 @@
+import os
+import sys
+import time
+
+import pytest
+
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+os.environ.setdefault('QTWEBENGINE_CHROMIUM_FLAGS', '--no-sandbox')
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+try:
+    import PyQt5.QtWebEngineWidgets  # noqa: F401
+except ImportError:
+    # Sin PyQt5/QtWebEngine no se puede ni importar el navegador
+    collect_ignore_glob = ['test_*.py']
+
+
+@pytest.fixture(scope='session')
+def qapp():
+    import chrome_browser  # noqa: F401  Importa QtWebEngine antes de crear la aplicación
+    from PyQt5.QtWidgets import QApplication
+    app = QApplication.instance() or QApplication(['fennex-tests'])
+    yield app
+
+
+@pytest.fixture
+def wait_until(qapp):
+    """Procesa eventos de Qt hasta que se cumpla la condición o se agote el tiempo"""
+    def wait(predicate, timeout=15):
+        deadline = time.monotonic() + timeout
+        while not predicate():
+            if time.monotonic() > deadline:
+                raise AssertionError('Tiempo de espera agotado')
+            qapp.processEvents()
+            time.sleep(0.01)
+    return wait
+
+
+@pytest.fixture
+def page(qapp, wait_until):
+    """Página de QtWebEngine ya cargada con un documento vacío"""
+    from PyQt5.QtWebEngineWidgets import QWebEnginePage
+    page = QWebEnginePage()
+    loaded = []
+    page.loadFinished.connect(loaded.append)
+    page.setHtml('<html><body></body></html>')
+    wait_until(lambda: loaded)
+    yield page
+    page.deleteLater()
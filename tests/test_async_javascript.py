@@ -0,0 +1,20 @@
+from chrome_browser import run_async_javascript
+
+
+def test_resolves_multiline_async_expression(page, wait_until):
+    results = []
+    run_async_javascript(page, '''
+    (async function() {
+        await new Promise(resolve => setTimeout(resolve, 10));
+        return {answer: 42};
+    })()
+    ''', results.append)
+    wait_until(lambda: results)
+    assert results == [{'answer': 42}]
+
+
+def test_rejected_promise_gives_none(page, wait_until):
+    results = []
+    run_async_javascript(page, 'Promise.reject(new Error("boom"));', results.append)
+    wait_until(lambda: results)
+    assert results == [None]
@@ -0,0 +1,22 @@
+import pytest
+
+from chrome_browser import FilterEngine
+
+
+@pytest.mark.parametrize('rule, url', [
+    ('adserver', 'http://a.com/myadserver/1.js'),
+    ('adserver', 'http://a.com/adservers.js'),
+    ('tracking.js', 'http://a.com/mytracking.js'),
+    ('/banner/*/img^', 'http://a.com/banner/x/img?id=1'),
+])
+def test_index_keeps_every_regex_match(rule, url):
+    engine = FilterEngine()
+    engine.add_rule(rule)
+    assert engine.should_block(url, 'a.com')
+
+
+def test_only_bounded_tokens_are_indexed():
+    assert FilterEngine._best_token('adserver') is None
+    assert FilterEngine._best_token('tracking.js') is None
+    assert FilterEngine._best_token('/banner/*/img^') == 'banner'
+    assert FilterEngine._best_token('|http://x.com/pixel|') == 'pixel'
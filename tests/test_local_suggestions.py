@@ -0,0 +1,25 @@
+from datetime import datetime, timedelta
+
+from chrome_browser import LocalSuggestionProvider
+
+
+def _entry(url, title, days_ago, visits):
+    timestamp = (datetime.now() - timedelta(days=days_ago)).isoformat()
+    return {'url': url, 'title': title, 'timestamp': timestamp, 'visit_count': visits}
+
+
+def test_short_prefix_ranks_every_match():
+    history = [_entry(f'https://a{i:04d}.example.com/', f'alpha {i}', 200, 1) for i in range(1000)]
+    history.append(_entry('https://zzz.org/', 'apple news', 0, 500))
+    provider = LocalSuggestionProvider(history)
+    assert provider.query('a')[0]['url'] == 'https://zzz.org/'
+
+
+def test_removed_entry_leaves_the_index():
+    history = [_entry('https://one.example/', 'first', 0, 1), _entry('https://two.example/', 'second', 0, 1)]
+    provider = LocalSuggestionProvider(history, [{'url': 'https://two.example/', 'title': 'second'}])
+    provider.remove_entry('https://one.example/')
+    provider.remove_entry('https://two.example/')
+    assert provider.query('first') == []
+    # Los marcadores siguen sugiriéndose aunque salgan del historial
+    assert [s['url'] for s in provider.query('second')] == ['https://two.example/']
@@ -0,0 +1,87 @@
+import http.server
+import threading
+
+import pytest
+
+from PyQt5.QtCore import QUrl
+
+from chrome_browser import PWAIconInstaller
+
+
+@pytest.fixture
+def icon_server(tmp_path, qapp):
+    """Servidor local: '/' fija una cookie y el icono solo se sirve con ella"""
+    from PyQt5.QtGui import QImage, QColor
+    icon_path = tmp_path / 'icon.png'
+    image = QImage(64, 64, QImage.Format_ARGB32)
+    image.fill(QColor('#3366cc'))
+    image.save(str(icon_path), 'PNG')
+    icon = icon_path.read_bytes()
+    log = []
+
+    class Handler(http.server.BaseHTTPRequestHandler):
+        def do_GET(self):
+            cookie = self.headers.get('Cookie', '')
+            log.append((self.path, cookie))
+            if self.path == '/':
+                body = b'<html><head><title>PWA</title></head><body></body></html>'
+                self.send_response(200)
+                self.send_header('Set-Cookie', 'session=ok; Path=/')
+                self.send_header('Content-Type', 'text/html')
+            elif self.path == '/icon.png' and 'session=ok' in cookie:
+                body = icon
+                self.send_response(200)
+                self.send_header('Content-Type', 'image/png')
+            else:
+                body = b''
+                self.send_response(403)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f'http://127.0.0.1:{server.server_address[1]}', log
+    server.shutdown()
+
+
+def test_icons_are_fetched_through_the_page_profile(page, wait_until, icon_server, tmp_path):
+    base, log = icon_server
+    loaded = []
+    page.loadFinished.connect(loaded.append)
+    page.load(QUrl(base + '/'))
+    wait_until(lambda: loaded)
+
+    manifest = {
+        'start_url': base + '/',
+        'manifestUrl': base + '/manifest.json',
+        'icons': [{'src': '/icon.png', 'sizes': '64x64', 'type': 'image/png'}],
+    }
+    icons_dir = tmp_path / 'icons'
+    installer = PWAIconInstaller(page, manifest, 'fennex-test', icons_dir=str(icons_dir))
+    finished = []
+    installer.finished.connect(finished.append)
+    installer.start()
+    wait_until(lambda: finished, timeout=30)
+
+    assert finished == ['fennex-test']
+    assert (icons_dir / '64x64' / 'apps' / 'fennex-test.png').exists()
+    assert (icons_dir / '128x128' / 'apps' / 'fennex-test.png').exists()
+    # Solo fetch() desde la página lleva la cookie; el respaldo con requests daría 403
+    icon_requests = [cookie for path, cookie in log if path == '/icon.png']
+    assert icon_requests and all('session=ok' in cookie for cookie in icon_requests)
+
+
+def test_select_icons_prefers_smallest_larger_icon():
+    icons = [
+        {'src': 'a.png', 'sizes': '48x48'},
+        {'src': 'b.png', 'sizes': '192x192'},
+        {'src': 'c.png', 'sizes': '512x512', 'purpose': 'maskable'},
+    ]
+    selection = PWAIconInstaller.select_icons(icons, 'https://example.org/app/')
+    assert selection[32] == 'https://example.org/app/a.png'
+    assert selection[128] == 'https://example.org/app/b.png'
+    assert selection[512] == 'https://example.org/app/c.png'
@@ -0,0 +1,138 @@
+import http.server
+import json
+import os
+import re
+import threading
+import time
+
+import pytest
+
+pytest.importorskip('requests')
+
+from chrome_browser import SegmentedDownload
+
+PAYLOAD = os.urandom(3 * 1024 * 1024 + 123)
+ETAG = '"fennex-test"'
+
+
+@pytest.fixture
+def range_server():
+    """Servidor local: /file admite rangos con ETag; /plain ignora la cabecera Range"""
+    ranges = []
+
+    class Handler(http.server.BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def do_GET(self):
+            header = self.headers.get('Range')
+            match = re.fullmatch(r'bytes=(\d+)-(\d*)', header or '')
+            if self.path == '/file' and match:
+                start = int(match.group(1))
+                end = int(match.group(2) or len(PAYLOAD) - 1)
+                ranges.append((start, end))
+                body = PAYLOAD[start:end + 1]
+                self.send_response(206)
+                self.send_header('Content-Range', f'bytes {start}-{end}/{len(PAYLOAD)}')
+            else:
+                body = PAYLOAD
+                self.send_response(200)
+            self.send_header('ETag', ETAG)
+            self.send_header('Content-Type', 'application/octet-stream')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f'http://127.0.0.1:{server.server_address[1]}', ranges
+    server.shutdown()
+
+
+def _run(download, wait_until):
+    finished = []
+    download.finished.connect(lambda: finished.append(download.state()))
+    download.start()
+    wait_until(lambda: finished, timeout=30)
+    return finished[0]
+
+
+def test_probe_requires_range_support(qapp, range_server, tmp_path):
+    base, _ranges = range_server
+    download = SegmentedDownload(base + '/file', str(tmp_path / 'file.bin'))
+    assert download.probe()
+    assert download.totalBytes() == len(PAYLOAD)
+    assert download.validator == ETAG
+    assert download.mimeType() == 'application/octet-stream'
+    assert not SegmentedDownload(base + '/plain', str(tmp_path / 'plain.bin')).probe()
+
+
+def test_segments_reassemble_the_file(qapp, wait_until, range_server, tmp_path):
+    base, ranges = range_server
+    target = tmp_path / 'file.bin'
+    download = SegmentedDownload(base + '/file', str(target), segments=4)
+    assert download.probe()
+    assert _run(download, wait_until) == SegmentedDownload.DownloadCompleted
+    assert target.read_bytes() == PAYLOAD
+    assert not os.path.exists(SegmentedDownload.part_path(str(target)))
+    assert not os.path.exists(SegmentedDownload.journal_path(str(target)))
+    assert len([r for r in ranges if r != (0, 0)]) == 4
+
+
+def test_resume_from_journal_fetches_only_missing_ranges(qapp, wait_until, range_server, tmp_path):
+    base, ranges = range_server
+    target = str(tmp_path / 'file.bin')
+    half = len(PAYLOAD) // 2
+    # Primer segmento completo, el segundo sin empezar
+    with open(SegmentedDownload.part_path(target), 'wb') as f:
+        f.write(PAYLOAD[:half] + bytes(len(PAYLOAD) - half))
+    journal = {
+        'url': base + '/file', 'total': len(PAYLOAD), 'validator': ETAG, 'mime': '',
+        'headers': {}, 'segments': [[0, half - 1, half], [half, len(PAYLOAD) - 1, half]],
+    }
+    with open(SegmentedDownload.journal_path(target), 'w') as f:
+        json.dump(journal, f)
+
+    assert SegmentedDownload.can_resume(target)
+    download = SegmentedDownload.from_journal(target)
+    assert download.receivedBytes() == half
+    assert _run(download, wait_until) == SegmentedDownload.DownloadCompleted
+    assert ranges == [(half, len(PAYLOAD) - 1)]
+    with open(target, 'rb') as f:
+        assert f.read() == PAYLOAD
+
+
+def test_cancel_finishes_exactly_once(qapp, wait_until, range_server, tmp_path):
+    base, _ranges = range_server
+    target = str(tmp_path / 'file.bin')
+    download = SegmentedDownload(base + '/file', target, segments=4)
+    assert download.probe()
+    finished = []
+    download.finished.connect(lambda: finished.append(download.state()))
+    download.start()
+    download.cancel()
+    download.cancel()
+    wait_until(lambda: finished)
+    # Dar tiempo a que llegase una segunda emisión si la hubiera
+    deadline = time.monotonic() + 0.5
+    wait_until(lambda: time.monotonic() > deadline)
+    assert finished == [SegmentedDownload.DownloadCancelled]
+    assert not os.path.exists(SegmentedDownload.part_path(target))
+    assert not os.path.exists(SegmentedDownload.journal_path(target))
+
+
+def test_resume_while_pausing_restarts_once(qapp, wait_until, range_server, tmp_path):
+    base, _ranges = range_server
+    target = tmp_path / 'file.bin'
+    download = SegmentedDownload(base + '/file', str(target), segments=4)
+    assert download.probe()
+    finished = []
+    download.finished.connect(lambda: finished.append(download.state()))
+    download.start()
+    download.pause()
+    download.resume()  # Los hilos de la pausa pueden seguir vivos: queda pendiente
+    wait_until(lambda: finished, timeout=30)
+    assert finished == [SegmentedDownload.DownloadCompleted]
+    assert target.read_bytes() == PAYLOAD
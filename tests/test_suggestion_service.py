@@ -0,0 +1,88 @@
+import http.server
+import json
+import threading
+import time
+import urllib.parse
+
+import pytest
+
+pytest.importorskip('requests')
+
+from chrome_browser import SuggestionService
+
+
+@pytest.fixture
+def suggest_server():
+    """Servidor local con keep-alive: responde con frases derivadas de q.
+    Las consultas que empiezan por 'slow' esperan hasta que se abre la compuerta."""
+    log = []  # (consulta, puerto del cliente)
+    gate = threading.Event()
+
+    class Handler(http.server.BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def do_GET(self):
+            query = urllib.parse.parse_qs(urllib.parse.urlparse(self.path).query).get('q', [''])[0]
+            log.append((query, self.client_address[1]))
+            if query.startswith('slow'):
+                gate.wait(10)
+            body = json.dumps([{'phrase': f'{query} {n}'} for n in range(5)]).encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f'http://127.0.0.1:{server.server_address[1]}/ac/', log, gate
+    gate.set()
+    server.shutdown()
+
+
+@pytest.fixture
+def service(qapp, suggest_server):
+    endpoint, _log, _gate = suggest_server
+    service = SuggestionService(endpoint=endpoint)
+    ready = []
+    service.ready.connect(lambda version, phrases: ready.append((version, phrases)))
+    yield service, ready
+    service.shutdown()
+
+
+def test_repeated_prefix_is_served_from_cache(service, suggest_server, wait_until):
+    service, ready = service
+    _endpoint, log, _gate = suggest_server
+    service.request('pyth', 1)
+    wait_until(lambda: ready)
+    service.request('pyth', 2)
+    wait_until(lambda: len(ready) == 2)
+    assert [query for query, _port in log] == ['pyth']
+    assert ready[1] == (2, ready[0][1])
+
+
+def test_superseded_version_is_never_emitted(service, suggest_server, wait_until):
+    service, ready = service
+    _endpoint, log, gate = suggest_server
+    service.request('slow', 1)
+    wait_until(lambda: log)  # La primera petición ya está en curso
+    service.request('fast', 2)
+    gate.set()
+    wait_until(lambda: ready)
+    # Dar tiempo a que llegase la respuesta obsoleta si se emitiera
+    deadline = time.monotonic() + 0.5
+    wait_until(lambda: time.monotonic() > deadline)
+    assert [version for version, _phrases in ready] == [2]
+
+
+def test_one_keep_alive_session_is_reused(service, suggest_server, wait_until):
+    service, ready = service
+    _endpoint, log, _gate = suggest_server
+    for version, query in enumerate(('alpha', 'beta', 'gamma'), 1):
+        service.request(query, version)
+        wait_until(lambda: len(ready) == version)
+    assert [query for query, _port in log] == ['alpha', 'beta', 'gamma']
+    assert len({port for _query, port in log}) == 1